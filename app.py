@@ -13,142 +13,779 @@ are from the most up to data csv (based on whether matches are equal).
 """
 
 # ----------- Import packages -----------
+# pandas, plotly and the modules built on them are imported lazily (on first use, see lazy_imports.py) so a worker
+# can start, and serve pages like / that don't need them, straight away. The data is loaded by warm_up().
+import functools
+import multiprocessing
 import os
-import pandas as pd
-from flask import Flask, redirect, render_template, request, url_for, send_file, jsonify
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import Flask, abort, g, has_request_context, redirect, render_template, request, url_for, send_file, jsonify
 # import matplotlib.pyplot as plt
 import io
 import base64
 import json
-# for development using styles.css
-from datetime import datetime
+
+from lazy_imports import lazy_import, load_now
+pd = lazy_import('pandas')
 
 # ----------- Import files -----------
-import functions
+functions = lazy_import('functions')
+raw_data_processing = lazy_import('raw_data_processing')
+data_visualisations = lazy_import('data_visualisations')
+predictions = lazy_import('predictions')
+storage = lazy_import('storage')
+ingest = lazy_import('ingest')
+stats_table = lazy_import('stats_table')
+luck = lazy_import('luck')
+rolling_metrics = lazy_import('rolling_metrics')
+synergy = lazy_import('synergy')
+sqlite_store = lazy_import('sqlite_store')
 import display
-import raw_data_processing
-import data_visualisations
 import config
+from figure_cache import figure_cache
+from http_cache import http_cache, dataset_fingerprint
+import groups
+from groups import DEFAULT_GROUP, Group, GroupRegistry, default_paths
+from jobs import RecalculationWorker
+import player_directory
 from error_classes import MissingFileError, JsonLoadError, EmptyFileError, DataProcessingError
+import instrumentation
 
 app = Flask(__name__)
 app.secret_key = "abc"
+instrumentation.init_app(app) # first, so request timings include warm_up()
 
 # ----------- Global variable -----------
-initialised = False
-player_stats_df = pd.DataFrame()
-player_form_dict = {}
-player_keys_dict = {}
-initialisation_errors = []
+imports_lock = threading.Lock() # lazily imported modules are loaded by one thread at a time, see load_now()
 
-# ----------- File paths -----------
-MATCH_DATA_PATH = config.MATCH_DATA_PATH
-PLAYER_KEYS_PATH = config.PLAYER_KEYS_PATH
-MATCH_COUNT_PATH = config.MATCH_COUNT_PATH
-PLAYER_STATS_PATH = config.PLAYER_STATS_PATH
-PLAYER_FORM_DICT_PATH = config.PLAYER_FORM_DICT_PATH
 
+def setup_group(group):
+    group.recalculation_worker = RecalculationWorker(lambda mode: recalculate(group, mode), config.RECALCULATION_DEBOUNCE_SECONDS)
+
+
+# the datasets served: the default group at the unprefixed urls, the others under /groups/<name>/ (see groups.py)
+dataset_groups = GroupRegistry(config.GROUPS_DIR, Group(DEFAULT_GROUP, default_paths(), figure_cache), setup_group)
+
+
+def current_group():
+    """The group the current request is for (see pull_group()), the default group outside a request."""
+    return g.get('group', dataset_groups.default) if has_request_context() else dataset_groups.default
+
+
+def dataset_validators():
+    """The current data's fingerprint and last modified time, for ETags and Last-Modified (see http_cache)."""
+    group = current_group()
+    snapshot = group.dataset.get()
+    player_index = group.players.get() # pages show the names, which can change without a recalculation
+    if not snapshot:
+        return None, None
+    return f"{snapshot.fingerprint}-{player_index.file_stamp}", max(snapshot.last_modified or 0, (player_index.file_stamp or (0, 0))[1] / 1e9)
+
+
+http_cache.init_app(app, dataset_validators)
+
+# routes that don't touch the calculated data, so they are served without waiting for warm_up()
+COLD_ENDPOINTS = {'home', 'upload', 'static', 'metrics', 'groups_index', 'recalculate_groups', 'groups_recalculation_status'}
+# routes for the whole app rather than one group, so they aren't also served under /groups/<name>/
+APP_ENDPOINTS = {'static', 'metrics', 'groups_index', 'recalculate_groups', 'groups_recalculation_status'}
+
+
+def shared_components(group):
+    """Derived artifacts in the shared snapshot: name -> (artifact, attribute holding its data, class to rebuild it from arrays)."""
+    return {
+        "ratings": (group.player_ratings, 'model', predictions.RatingModel),
+        "rolling_metrics": (group.player_rolling_metrics, 'metrics', rolling_metrics.RollingMetrics),
+        "synergy": (group.player_synergy, 'matrix', synergy.SynergyMatrix)
+    }
+
+
+def load_shared_snapshot(group, version):
+    """Serve shared snapshot version from this process, its arrays mapped rather than copied."""
+    player_stats_df, player_form, components = group.shared_snapshots.read(version)
+    # the derived artifacts carry on from the mapped data, so a recalculation in this worker starts from the same state
+    for name, (artifact, attribute, data_class) in shared_components(group).items():
+        setattr(artifact, attribute, data_class.from_arrays(components[name]) if name in components else None)
+
+    group.shared_version = version
+    return publish_local_snapshot(group, player_stats_df, player_form)
+
+
+def refresh_shared_snapshot(group, force=False):
+    """
+    The reload signal: when another worker has published a newer shared snapshot (replaced its CURRENT file), swap it
+    in. Checked at most every config.SHARED_SNAPSHOT_CHECK_SECONDS, and skipped while this worker is recalculating.
+    """
+    if group.shared_snapshots is None or (not force and time.monotonic() - group.shared_checked_at < config.SHARED_SNAPSHOT_CHECK_SECONDS):
+        return
+    if not group.shared_snapshot_lock.acquire(blocking=False):
+        return
+
+    try:
+        group.shared_checked_at = time.monotonic()
+        version = group.shared_snapshots.current_version()
+        if version is not None and version != group.shared_version:
+            load_shared_snapshot(group, version)
+    finally:
+        group.shared_snapshot_lock.release()
+
+
+def publish_snapshot(group, player_stats_df, player_form):
+    """Make newly calculated data visible to requests (and, in WSGI mode, to the other workers)."""
+    if group.shared_snapshots is not None:
+        components = {name: getattr(artifact, attribute).to_arrays() if getattr(artifact, attribute) is not None else None
+                      for name, (artifact, attribute, _) in shared_components(group).items()}
+        return load_shared_snapshot(group, group.shared_snapshots.write(player_stats_df, player_form, components))
+
+    return publish_local_snapshot(group, player_stats_df, player_form)
+
+
+def publish_local_snapshot(group, player_stats_df, player_form):
+    """Swap in the snapshot this process serves, and drop the figures built from the old data."""
+    processing_state_path = group.paths['processing_state']
+    processing_state = raw_data_processing.read_processing_state(processing_state_path)
+    fingerprint = dataset_fingerprint(processing_state)
+    # the table also shows win % intervals and luck z-scores (see luck.py), player_stats_df stays what was calculated
+    table = stats_table.StatsTable(luck.luck_cache.with_luck_columns(player_stats_df, fingerprint))
+    snapshot = group.dataset.publish(player_stats_df, player_form, group.player_ratings.model, table,
+                                     group.player_rolling_metrics.metrics, group.player_synergy.matrix, fingerprint,
+                                     os.path.getmtime(processing_state_path) if processing_state else None)
+    group.figure_cache.invalidate(snapshot.version)
+    return snapshot
+
+
+def load_libraries():
+    with imports_lock:
+        load_now(pd, functions, raw_data_processing, data_visualisations, predictions, storage, ingest, stats_table, rolling_metrics, synergy, sqlite_store, luck)
+
+
+def warm_up(group=None):
+    """
+    Import the data libraries and load (or calculate) a group's (the default group's) player stats, form and ratings.
+    Runs once per group, before the first request that needs its data, or up front from a server entry point. Each
+    step's seconds go in the group's warm_up_timings.
+    """
+    group = group or dataset_groups.default
+
+    with group.warm_up_lock:
+        if group.initialised:
+            return group.warm_up_timings
+
+        start = step_start = time.perf_counter()
+
+        def timed(step):
+            nonlocal step_start
+            group.warm_up_timings[step] = round(time.perf_counter() - step_start, 4)
+            step_start = time.perf_counter()
+
+        try:
+            load_libraries()
+            group.create_stores()
+            timed('imports')
+
+            with group.shared_snapshot_lock, group.lock():
+                # in WSGI mode the first worker to get here calculates, the others map what it published
+                if group.shared_snapshots is not None and group.shared_snapshots.current_version() is not None and group.is_fresh():
+                    load_shared_snapshot(group, group.shared_snapshots.current_version())
+                    timed('shared_snapshot')
+                else:
+                    publish_snapshot(group, *load_or_calculate(group, timed))
+
+        except Exception as e:
+            group.initialisation_errors.append(f"Unexpected error initializing app: {e}")
+
+        if group.dataset.get() is None:
+            # setup failed before anything was published: serve empty data (pages show the errors) until a recalculation
+            from player_form import PlayerForm
+            group.dataset.publish(pd.DataFrame(), PlayerForm.empty(), None, stats_table.StatsTable(pd.DataFrame()))
+
+        group.warm_up_timings['total'] = round(time.perf_counter() - start, 4)
+        group.initialised = True
+        return group.warm_up_timings
+
+
+def load_or_calculate(group, timed):
+    """A group's player stats and form from calculated storage if still up to date, otherwise (re)calculated, for warm_up()."""
+    from player_form import PlayerForm
+
+    player_stats_df, player_form = pd.DataFrame(), PlayerForm.empty()
+    calculated_storage, initialisation_errors = group.calculated_storage, group.initialisation_errors
+
+    try:
+        file_statuses = {
+            "match_data": functions.csv_file_checker(group.paths['match_data']),
+            "player_keys": functions.csv_file_checker(group.paths['player_keys'])
+        }
+    except MissingFileError as e:
+        initialisation_errors.append(str(e))
+        file_statuses = {"match_data": {"has_data": False}, "player_keys": {"has_data": False}}
 
-# ----------- Routes -----------
-with app.app_context():
     try:
-        if not initialised:
-            try:
-                file_statuses = {
-                    "match_data": functions.csv_file_checker(MATCH_DATA_PATH),
-                    "player_keys": functions.csv_file_checker(PLAYER_KEYS_PATH),
-                    "player_stats": functions.csv_file_checker(PLAYER_STATS_PATH),
-                    "player_form_dict": functions.json_file_checker(PLAYER_FORM_DICT_PATH)
-                }
-            except MissingFileError as e:
-                initialisation_errors.append(str(e))
-
-            if file_statuses['player_stats']['has_data'] and file_statuses['player_form_dict']['has_data']:
+        if calculated_storage.has_data():
+            if group.is_fresh():
+                player_stats_df, player_form = calculated_storage.load() # nothing changed since the last run, only stat() calls so far
+            elif file_statuses['match_data']['has_data'] and file_statuses['player_keys']['has_data']:
                 try:
-                    player_stats_df = pd.read_csv(PLAYER_STATS_PATH)
-                    with open(PLAYER_FORM_DICT_PATH, 'r') as file:
-                        player_form_dict = json.load(file)
-
-                    if isinstance(player_stats_df, pd.DataFrame) and player_stats_df.empty:
-                        if file_statuses['match_data']['has_data'] and file_statuses['player_keys']['has_data']:
-                            try:
-                                player_stats_df, player_form_dict = raw_data_processing.cs_player_stats_player_form(MATCH_DATA_PATH, MATCH_COUNT_PATH, PLAYER_KEYS_PATH, PLAYER_STATS_PATH, PLAYER_FORM_DICT_PATH)
-                            except DataProcessingError as e:
-                                initialisation_errors.append(str(e))
-                        else:
-                            initialisation_errors.append("match_data or player_keys file is empty")
-                
-                except (pd.errors.EmptyDataError, FileNotFoundError) as e:
-                    initialisation_errors.append(f"Error loading player_stats or player_form files: {e}")
-                    
-    except Exception as e:
-        initialisation_errors.append(f"Unexpected error initializing app: {e}")
+                    player_stats_df, player_form = group.calculate('incremental')
+                except DataProcessingError as e:
+                    initialisation_errors.append(str(e))
+            else:
+                player_stats_df, player_form = calculated_storage.load()
+
+        if isinstance(player_stats_df, pd.DataFrame) and player_stats_df.empty:
+            if file_statuses['match_data']['has_data'] and file_statuses['player_keys']['has_data']:
+                try:
+                    player_stats_df, player_form = group.calculate('full')
+                except DataProcessingError as e:
+                    initialisation_errors.append(str(e))
+            else:
+                initialisation_errors.append("match_data or player_keys file is empty")
+        timed('player_stats')
+
+        missing_artifacts = [derived_artifact for derived_artifact in group.derived_artifacts if derived_artifact.load() is None]
+        if missing_artifacts and file_statuses['match_data']['has_data']:
+            match_data = pd.read_csv(group.paths['match_data'])
+            for derived_artifact in missing_artifacts:
+                derived_artifact.rebuild(match_data)
+        timed('derived_artifacts')
+
+    except (pd.errors.EmptyDataError, FileNotFoundError) as e:
+        initialisation_errors.append(f"Error loading player_stats or player_form files: {e}")
+
+    return player_stats_df, player_form
+
+
+# ----------- Routes -----------
+@app.url_value_preprocessor
+def pull_group(endpoint, values):
+    """/groups/<group>/... urls are for that group, the rest for the default group."""
+    group_name = (values or {}).pop('group', None)
+    g.group = dataset_groups.get(group_name)
+    if g.group is None:
+        abort(404, f"Unknown group: {group_name}")
+
+
+@app.url_defaults
+def add_group(endpoint, values):
+    """url_for() within a group's pages links to the same group's urls."""
+    group = g.get('group')
+    if group is not None and group is not dataset_groups.default and 'group' not in values and app.url_map.is_endpoint_expecting(endpoint, 'group'):
+        values['group'] = group.name
+
+
+@app.before_request
+def warm_up_before_data_routes():
+    if request.endpoint not in COLD_ENDPOINTS:
+        warm_up(current_group())
+        refresh_shared_snapshot(current_group())
 
 
 @app.route('/')
+@http_cache.conditional(uses_data=False, extra=lambda: current_group().initialisation_errors)
 def home():
-    return render_template('home.html', timestamp=datetime.now().timestamp(), errors=initialisation_errors)
+    return render_template('home.html', errors=current_group().initialisation_errors)
+
+
+def requested_recalculation_job():
+    """The recalculation job the stats page was redirected with (?job=), if it's still known."""
+    job = current_group().recalculation_worker.get(request.args.get('job', type=int))
+    return job.to_dict() if job else None
 
 
 @app.route('/stats')
+@http_cache.conditional(extra=requested_recalculation_job)
 def stats():
-    global player_stats_df, player_keys_dict
+    group = current_group()
+    player_keys_dict = group.players.get().names
+    snapshot = group.dataset.get() # taken once, so every figure on the page comes from the same data
+    player_stats_df, player_form = snapshot.player_stats_df, snapshot.player_form
 
-    if os.path.exists(PLAYER_KEYS_PATH):
-        player_keys_df = pd.read_csv(PLAYER_KEYS_PATH)
-        player_keys_dict = player_keys_df.set_index('player_id')['player_name'].to_dict()
+    recalculation_job = requested_recalculation_job()
 
     if player_stats_df.empty:
         response = display.response("error", "Player stats could not be loaded or created. Please ensure the required files are uploaded and try again.")  
-        return render_template('stats.html', player_keys_dict=player_keys_dict, response=response)
+        return render_template('stats.html', player_keys_dict=player_keys_dict, response=response, recalculation_job=recalculation_job,
+                               plotly_heatmap=None, plotly_scatter=None, plotly_bargraph=None)
 
     # Generate example Form heatmap graph
-    default_player_ids = list(player_form_dict.keys())[:4]
+    default_player_ids = player_form.player_ids[:4].tolist()
     form_window = 10
-    plotly_heatmap = data_visualisations.form_heatmap(default_player_ids, form_window, player_form_dict, player_keys_dict)
+    plotly_heatmap = group.figure_cache.get_or_build('form_heatmap', (tuple(default_player_ids), form_window),
+                                                     lambda: data_visualisations.form_heatmap(default_player_ids, form_window, player_form, player_keys_dict),
+                                                     snapshot.version)
     
     # Generate goal difference scatter plot
-    plotly_scatter = data_visualisations.goal_diff_scatter_plot(player_stats_df)
+    plotly_scatter = group.figure_cache.get_or_build('goal_diff_scatter_plot', (), lambda: data_visualisations.goal_diff_scatter_plot(player_stats_df), snapshot.version)
     
     # Generate W/D/L stacked bar chat
-    plotly_bargraph = data_visualisations.results_bar_graph(player_stats_df)
+    plotly_bargraph = group.figure_cache.get_or_build('results_bar_graph', (), lambda: data_visualisations.results_bar_graph(player_stats_df), snapshot.version)
+
+    # First page of the stats table, the rest is fetched from /api/stats_table as the user pages, sorts or filters
+    first_page_rows, records_total, _ = group.figure_cache.get_or_build('stats_table_first_page', (config.STATS_TABLE_PAGE_LENGTH,),
+                                                                        lambda: snapshot.stats_table.query(0, config.STATS_TABLE_PAGE_LENGTH), snapshot.version)
 
-    response = display.response("success", "Great success", player_stats_df.to_dict())  
+    response = display.response("success", "Great success")
     return render_template('stats.html', 
                         player_keys_dict=player_keys_dict,
-                        player_stats_df=player_stats_df,
+                        first_page_rows=first_page_rows,
+                        records_total=records_total,
+                        page_length=config.STATS_TABLE_PAGE_LENGTH,
                         plotly_heatmap=plotly_heatmap, 
                         plotly_scatter=plotly_scatter, 
                         plotly_bargraph=plotly_bargraph, 
+                        recalculation_job=recalculation_job,
                         response=response)
 
 
+@app.route('/api/stats_table')
+@http_cache.conditional
+def stats_table_api():
+    """Server side processing for the DataTables stats table: one page of rows, sorted and filtered."""
+    table = current_group().dataset.get().stats_table
+    n_columns = len(stats_table.STATS_TABLE_COLUMNS)
+
+    order_column = request.args.get('order[0][column]', 0, type=int)
+    column_filters = {column: request.args.get(f'columns[{column}][search][value]', '').strip() for column in range(n_columns)}
+
+    rows, records_total, records_filtered = table.query(
+        start=max(request.args.get('start', 0, type=int), 0),
+        length=request.args.get('length', config.STATS_TABLE_PAGE_LENGTH, type=int),
+        order_column=order_column if 0 <= order_column < n_columns else 0,
+        ascending=request.args.get('order[0][dir]', 'asc') != 'desc',
+        search=request.args.get('search[value]', '').strip(),
+        column_filters={column: value for column, value in column_filters.items() if value}
+    )
+
+    # the response shape is the one DataTables expects, not display.response
+    return jsonify({"draw": request.args.get('draw', 0, type=int), "recordsTotal": records_total, "recordsFiltered": records_filtered, "data": rows})
+
+
+@app.route('/api/player_trends')
+@http_cache.conditional
+def player_trends_api():
+    """
+    Rolling form from the precomputed cumulative metrics: every player's last n matches for each window, plus the
+    rolling series of any players asked for (?player_ids=1,2&windows=5,10).
+    """
+    try:
+        windows = parse_player_ids(request.args.get('windows')) or list(config.ROLLING_WINDOWS)
+        player_ids = parse_player_ids(request.args.get('player_ids'))
+    except ValueError:
+        return jsonify(display.response("error", "player_ids and windows must be comma separated integers")), 400
+
+    if min(windows) < 1:
+        return jsonify(display.response("error", "Windows must be at least 1 match")), 400
+
+    metrics = current_group().dataset.get().rolling_metrics
+    if metrics is None:
+        return jsonify(display.response("error", "Rolling metrics are not available, upload match data and recalculate")), 503
+
+    unknown_player_ids = [player_id for player_id in player_ids if player_id not in metrics]
+    if unknown_player_ids:
+        return jsonify(display.response("error", f"Unknown player ids: {unknown_player_ids}")), 404
+
+    trends = {
+        "summary": {str(window): metrics.summary(window) for window in windows},
+        "series": {str(player_id): {str(window): metrics.series(player_id, window) for window in windows} for player_id in player_ids}
+    }
+    return jsonify(display.response("success", "Player trends", trends))
+
+
+def synergy_player_ids(synergy_matrix):
+    """Players for a synergy query: ?player_ids=1,2,3, or the first config.SYNERGY_DEFAULT_PLAYERS players by default."""
+    player_ids = parse_player_ids(request.args.get('player_ids')) or synergy_matrix.player_ids[:config.SYNERGY_DEFAULT_PLAYERS].tolist()
+    unknown_player_ids = [player_id for player_id in player_ids if player_id not in synergy_matrix]
+    return player_ids, unknown_player_ids
+
+
+def synergy_request():
+    """The snapshot, players and metric of a synergy request, or an error response."""
+    snapshot = current_group().dataset.get()
+    synergy_matrix = snapshot.synergy
+    if synergy_matrix is None:
+        return None, (jsonify(display.response("error", "Synergy data is not available, upload match data and recalculate")), 503)
+
+    metric = request.args.get('metric', 'together_win_pct')
+    if metric not in synergy.MATRIX_METRICS:
+        return None, (jsonify(display.response("error", f"Unknown metric: {metric}, expected one of {synergy.MATRIX_METRICS}")), 400)
+
+    try:
+        player_ids, unknown_player_ids = synergy_player_ids(synergy_matrix)
+    except ValueError:
+        return None, (jsonify(display.response("error", "player_ids must be comma separated integers")), 400)
+
+    if unknown_player_ids:
+        return None, (jsonify(display.response("error", f"Unknown player ids: {unknown_player_ids}")), 404)
+    if len(player_ids) > config.SYNERGY_MAX_PLAYERS:
+        return None, (jsonify(display.response("error", f"Pick at most {config.SYNERGY_MAX_PLAYERS} players")), 400)
+
+    return (snapshot, player_ids, metric), None
+
+
+@app.route('/api/synergy')
+@http_cache.conditional
+def synergy_api():
+    """One synergy metric for every pair of the chosen players (?player_ids=1,2,3&metric=together_win_pct)."""
+    synergy_query, error = synergy_request()
+    if error:
+        return error
+
+    snapshot, player_ids, metric = synergy_query
+    return jsonify(display.response("success", "Player synergy", {"player_ids": player_ids, "metric": metric, "matrix": snapshot.synergy.matrix(player_ids, metric)}))
+
+
+@app.route('/api/synergy/<int:player_id>/<int:other_player_id>')
+@http_cache.conditional
+def synergy_pair_api(player_id, other_player_id):
+    """Record of two players on the same team, and player_id's head to head record against other_player_id."""
+    synergy_matrix = current_group().dataset.get().synergy
+    if synergy_matrix is None:
+        return jsonify(display.response("error", "Synergy data is not available, upload match data and recalculate")), 503
+
+    unknown_player_ids = [pair_player_id for pair_player_id in (player_id, other_player_id) if pair_player_id not in synergy_matrix]
+    if unknown_player_ids:
+        return jsonify(display.response("error", f"Unknown player ids: {unknown_player_ids}")), 404
+    if player_id == other_player_id:
+        return jsonify(display.response("error", "Pick two different players")), 400
+
+    return jsonify(display.response("success", "Player pair synergy", synergy_matrix.pair(player_id, other_player_id)))
+
+
+@app.route('/api/synergy/heatmap')
+@http_cache.conditional
+def synergy_heatmap_api():
+    group = current_group()
+    synergy_query, error = synergy_request()
+    if error:
+        return error
+
+    snapshot, player_ids, metric = synergy_query
+    player_keys_dict = group.players.get().names
+
+    synergy_heatmap = group.figure_cache.get_or_build('synergy_heatmap', (tuple(player_ids), metric),
+                                                      lambda: data_visualisations.synergy_heatmap(player_ids, metric, snapshot.synergy, player_keys_dict),
+                                                      snapshot.version)
+    return jsonify({"status": "success", "synergy_heatmap_json": synergy_heatmap})
+
+
+@app.route('/api/players')
+@http_cache.conditional
+def players_api():
+    """Players for the player pickers: ?q= matches the start of any word of a name, then close misspellings."""
+    try:
+        limit = min(max(int(request.args.get('limit', player_directory.SEARCH_LIMIT)), 1), config.PLAYER_SEARCH_MAX_RESULTS)
+    except ValueError:
+        return jsonify(display.response("error", "limit must be an integer")), 400
+
+    player_index = current_group().players.get()
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify(display.response("success", "All players", player_index.players()))
+
+    return jsonify(display.response("success", f"Players matching '{query}'", player_index.search(query, limit)))
+
+
+@app.route('/api/players/<int:player_id>')
+@http_cache.conditional
+def player_api(player_id):
+    """A player's totals and most recent matches (?limit=10), as indexed queries on the SQLite match store."""
+    group = current_group()
+    match_store = group.match_store
+    if match_store is None:
+        return jsonify(display.response("error", "The match store is not enabled, set MATCH_STORE_ENABLED=1")), 503
+
+    limit = request.args.get('limit', 10, type=int)
+    player_stats = match_store.player_stats([player_id])
+    if player_stats.empty:
+        return jsonify(display.response("error", f"Unknown player id: {player_id}")), 404
+
+    return jsonify(display.response("success", "Player stats", {
+        "player_id": player_id,
+        "player_name": group.players.get().name(player_id),
+        "stats": player_stats.to_dict('records')[0],
+        "recent_matches": match_store.player_matches(player_id, max(limit, 0))
+    }))
+
+
 @app.route('/generate_form_heatmap', methods=['POST'])
 def generate_form_heatmap():
-    global player_form_dict, player_keys_dict
-
+    group = current_group()
+    player_keys_dict = group.players.get().names
     player_ids = request.form.getlist('player_ids')
     form_window = int(request.form['form_window'])
+    snapshot = group.dataset.get()
 
-    form_heatmap = data_visualisations.form_heatmap(player_ids, form_window, player_form_dict, player_keys_dict)
+    form_heatmap = group.figure_cache.get_or_build('form_heatmap', (tuple(int(player_id) for player_id in player_ids), form_window),
+                                                   lambda: data_visualisations.form_heatmap(player_ids, form_window, snapshot.player_form, player_keys_dict),
+                                                   snapshot.version)
 
     return jsonify({"status": "success", "form_heatmap_json": form_heatmap})    
 
 
+@app.route('/api/form_heatmap', methods=['GET', 'POST'])
+@http_cache.conditional
+def form_heatmap_api():
+    """
+    Form heatmap matrices for a set of players over one or more form windows, in a single call. Only the data is
+    returned, the static styling and layout come from /api/form_heatmap/style which the browser caches. As a GET
+    (?player_ids=1,2&windows=10) the browser can keep the response and revalidate it with a cheap 304.
+    """
+    group = current_group()
+    payload = request.get_json(silent=True) or {}
+    try:
+        if request.method == 'GET':
+            player_ids, form_windows = parse_player_ids(request.args.get('player_ids')), parse_player_ids(request.args.get('windows'))
+        else:
+            player_ids = [int(player_id) for player_id in payload.get('player_ids', request.form.getlist('player_ids'))]
+            form_windows = [int(form_window) for form_window in payload.get('windows', request.form.getlist('windows'))]
+    except (TypeError, ValueError):
+        return jsonify(display.response("error", "player_ids and windows must be lists of integers")), 400
+
+    if not player_ids or not form_windows:
+        return jsonify(display.response("error", "At least one player id and one form window are required")), 400
+
+    player_keys_dict = group.players.get().names
+    snapshot = group.dataset.get()
+    unknown_player_ids = [player_id for player_id in player_ids if player_id not in player_keys_dict or player_id not in snapshot.player_form]
+    if unknown_player_ids:
+        return jsonify(display.response("error", f"Unknown player ids: {unknown_player_ids}")), 404
+
+    heatmaps = {
+        str(form_window): group.figure_cache.get_or_build('form_heatmap_data', (tuple(player_ids), form_window),
+                                                          lambda form_window=form_window: data_visualisations.form_heatmap_data(player_ids, form_window, snapshot.player_form, player_keys_dict),
+                                                          snapshot.version)
+        for form_window in form_windows
+    }
+
+    return jsonify(display.response("success", "Form heatmap data", heatmaps))
+
+
+def form_heatmap_style_json():
+    from plotly.utils import PlotlyJSONEncoder
+
+    return figure_cache.get_or_build('form_heatmap_style', (), lambda: json.dumps(data_visualisations.form_heatmap_style(), cls=PlotlyJSONEncoder))
+
+
+@app.route('/api/form_heatmap/style')
+@http_cache.conditional(uses_data=False, extra=form_heatmap_style_json) # the style itself is in the ETag, so a changed style is never a 304
+def form_heatmap_style_api():
+    return app.response_class(form_heatmap_style_json(), mimetype='application/json')
+
+
+@app.route('/metrics')
+def metrics():
+    return app.response_class(instrumentation.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/stats/figure_cache')
+def figure_cache_stats():
+    return jsonify(display.response("success", "Figure cache stats", current_group().figure_cache.stats()))
+
+
+def recalculate(group, mode='incremental'):
+    """
+    Refresh a group's calculated stats, only processing new matches unless a full rebuild is asked for. Runs on the
+    group's recalculation worker thread; requests keep reading the previous snapshot until the new one is published.
+    """
+    with group.shared_snapshot_lock, group.lock():
+        refresh_shared_snapshot(group, force=True) # in WSGI mode, start from whatever another worker published last
+
+        if group.calculated_storage is None: # warm_up() failed before setting up the stores
+            group.create_stores()
+
+        current = group.dataset.get()
+        if current is None: # nothing was ever published, so there's nothing to update
+            player_stats_df, player_form = group.calculate('full')
+        else:
+            player_stats_df, player_form = group.calculate(mode, player_stats_df=None if current.player_stats_df.empty else current.player_stats_df,
+                                                           player_form=current.player_form if len(current.player_form) else None)
+
+        publish_snapshot(group, player_stats_df, player_form)
+
+
+def recalculate_all_groups(mode='incremental'):
+    """
+    Recalculate every group, one recalculate_group() job per group spread over a process pool of
+    config.GROUP_RECALCULATION_WORKERS (0 or 1 runs them here in turn), then publish the new data of the groups this
+    process has loaded, and in WSGI mode of every group with a shared snapshot (other workers may have loaded groups
+    this one hasn't). Returns each group's seconds or error.
+    """
+    all_groups = dataset_groups.all()
+    results = {}
+
+    def finished(group, run):
+        try:
+            results[group.name] = {"seconds": run()}
+        except Exception as e:
+            results[group.name] = {"error": str(e)}
+            return
+        # the other workers only swap in a group's new data when its shared CURRENT file changes, so publish it here
+        shared = group.shared_snapshots is not None and group.shared_snapshots.current_version() is not None
+        if group.initialised or shared:
+            if group.calculated_storage is None:
+                load_libraries()
+                group.create_stores()
+            with group.shared_snapshot_lock, group.lock():
+                publish_snapshot(group, *load_or_calculate(group, lambda step: None)) # up to date, so only loaded
+
+    workers = min(config.GROUP_RECALCULATION_WORKERS, len(all_groups))
+    if workers > 1:
+        # spawned rather than forked, a fork of this multi-threaded process could inherit a lock some other thread holds
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(groups.recalculate_group, group.name, group.paths, mode): group for group in all_groups}
+            for future in as_completed(futures):
+                finished(futures[future], future.result)
+    else:
+        for group in all_groups:
+            finished(group, functools.partial(groups.recalculate_group, group.name, group.paths, mode))
+
+    failed = {name: result["error"] for name, result in results.items() if "error" in result}
+    if failed:
+        raise DataProcessingError(f"Recalculation failed for {len(failed)} of {len(results)} groups: {failed}", 'recalculate_all_groups')
+    return results
+
+
+groups_recalculation_worker = RecalculationWorker(recalculate_all_groups, config.RECALCULATION_DEBOUNCE_SECONDS)
+
+
 @app.route('/stats/recalculate')
 def recalculate_player_stats():
-    global player_stats_df, player_form_dict
-    player_stats_df, player_form_dict = raw_data_processing.cs_player_stats_player_form(MATCH_DATA_PATH, MATCH_COUNT_PATH, PLAYER_KEYS_PATH, PLAYER_STATS_PATH, PLAYER_FORM_DICT_PATH)
-    return redirect(url_for('stats'))
+    """Queue a recalculation and return straight away, the stats page polls the job until it is done."""
+    mode = request.args.get('mode', 'incremental')
+    if mode not in ('incremental', 'full'):
+        return jsonify(display.response("error", f"Unknown recalculation mode: {mode}")), 400
+
+    job = current_group().recalculation_worker.submit(mode)
+
+    if request.args.get('format') == 'json':
+        return jsonify(display.response("success", "Recalculation queued", job.to_dict())), 202
+    return redirect(url_for('stats', job=job.job_id))
+
+
+@app.route('/stats/recalculate/status/<int:job_id>')
+def recalculation_status(job_id):
+    group = current_group()
+    job = group.recalculation_worker.get(job_id)
+    if job is None:
+        return jsonify(display.response("error", f"Unknown recalculation job: {job_id}")), 404
+
+    return jsonify(display.response("success", f"Recalculation {job.status}", {**job.to_dict(), "data_version": group.dataset.get().version}))
+
+
+@app.route('/groups')
+def groups_index():
+    """Every group, and whether this process has its data loaded yet (and which version)."""
+    group_statuses = []
+    for group in dataset_groups.all():
+        snapshot = group.dataset.get()
+        group_statuses.append({"name": group.name, "url": url_for('stats', group=None if group is dataset_groups.default else group.name),
+                               "loaded": group.initialised, "data_version": snapshot.version if snapshot else None,
+                               "players": len(snapshot.player_stats_df) if snapshot else None})
+
+    return jsonify(display.response("success", "Groups", group_statuses))
+
+
+@app.route('/groups/recalculate')
+def recalculate_groups():
+    """Queue a recalculation of every group, spread over a process pool (see recalculate_all_groups())."""
+    mode = request.args.get('mode', 'incremental')
+    if mode not in ('incremental', 'full'):
+        return jsonify(display.response("error", f"Unknown recalculation mode: {mode}")), 400
+
+    job = groups_recalculation_worker.submit(mode)
+    return jsonify(display.response("success", "Recalculation of every group queued", job.to_dict())), 202
+
+
+@app.route('/groups/recalculate/status/<int:job_id>')
+def groups_recalculation_status(job_id):
+    job = groups_recalculation_worker.get(job_id)
+    if job is None:
+        return jsonify(display.response("error", f"Unknown recalculation job: {job_id}")), 404
+
+    return jsonify(display.response("success", f"Recalculation {job.status}", job.to_dict()))
+
+
+@app.route('/stats/export/<file_name>')
+@http_cache.conditional
+def export_calculated_data(file_name):
+    """Download the calculated stats in the csv/json format, whichever storage backend is in use."""
+    snapshot = current_group().dataset.get()
+    player_stats_df, player_form = snapshot.player_stats_df, snapshot.player_form
+
+    if file_name == 'player_stats.csv':
+        return send_file(io.BytesIO(player_stats_df.to_csv(index=False).encode()), mimetype='text/csv', as_attachment=True, download_name=file_name)
+    if file_name == 'player_form_dict.json':
+        return send_file(io.BytesIO(json.dumps(player_form.to_dict()).encode()), mimetype='application/json', as_attachment=True, download_name=file_name)
+
+    return jsonify(display.response("error", f"Unknown export: {file_name}")), 404
 
 
 @app.route('/upload')
+@http_cache.conditional(uses_data=False)
 def upload():
     return render_template('upload.html')
 
 @app.route('/predictions')
-def predictions():
-    return render_template('predictions.html')
+@http_cache.conditional
+def predictions_page():
+    return render_template('predictions.html', player_keys_dict=current_group().players.get().names)
+
+
+def parse_player_ids(value):
+    """Player ids from a json list or a comma separated query string value."""
+    if isinstance(value, str):
+        value = [player_id for player_id in value.split(',') if player_id.strip()]
+    return [int(player_id) for player_id in value or []]
+
+
+@app.route('/api/predict', methods=['GET', 'POST'])
+@http_cache.conditional
+def predict_api():
+    """Predicted score for team_a against team_b, from the stored player ratings (no refitting per request)."""
+    payload = request.get_json(silent=True) or request.args
+    try:
+        team_a = parse_player_ids(payload.get('team_a'))
+        team_b = parse_player_ids(payload.get('team_b'))
+    except (TypeError, ValueError):
+        return jsonify(display.response("error", "team_a and team_b must be lists of player ids")), 400
+
+    if not team_a or not team_b:
+        return jsonify(display.response("error", "Both team_a and team_b need at least one player")), 400
+    if set(team_a) & set(team_b):
+        return jsonify(display.response("error", "A player can't be in both teams")), 400
+
+    rating_model = current_group().dataset.get().rating_model
+    if rating_model is None:
+        return jsonify(display.response("error", "Player ratings are not available, upload match data and recalculate")), 503
+
+    return jsonify(display.response("success", "Predicted result", rating_model.predict(team_a, team_b)))
+
+
+@app.route('/api/balance_teams', methods=['POST'])
+def balance_teams_api():
+    """The fairest splits of a pool of players into two teams, by predicted goal difference."""
+    payload = request.get_json(silent=True) or request.form
+    try:
+        player_ids = parse_player_ids(payload.get('player_ids'))
+        top_k = int(payload.get('top_k', 5))
+    except (TypeError, ValueError):
+        return jsonify(display.response("error", "player_ids must be a list of player ids and top_k an integer")), 400
+
+    if len(set(player_ids)) != len(player_ids):
+        return jsonify(display.response("error", "player_ids contains duplicates")), 400
+    if not 2 <= len(player_ids) <= config.BALANCE_MAX_PLAYERS:
+        return jsonify(display.response("error", f"Pick between 2 and {config.BALANCE_MAX_PLAYERS} players")), 400
+    player_index = current_group().players.get()
+    unknown_player_ids = [player_id for player_id in player_ids if player_id not in player_index]
+    if unknown_player_ids:
+        return jsonify(display.response("error", f"Unknown player ids: {unknown_player_ids}")), 400
+
+    rating_model = current_group().dataset.get().rating_model
+    if rating_model is None:
+        return jsonify(display.response("error", "Player ratings are not available, upload match data and recalculate")), 503
+
+    return jsonify(display.response("success", "Suggested teams", rating_model.suggest_splits(player_ids, max(top_k, 1))))
 
 @app.route('/upload_file', methods=['POST'])
 def upload_file():
@@ -159,7 +796,13 @@ def upload_file():
         file = request.files['file']
         file_type = request.form.get('file_type')
 
-        upload_result = functions.upload(file, file_type, MATCH_DATA_PATH, PLAYER_KEYS_PATH)
+        group = current_group()
+        with group.lock(): # one worker at a time writes the raw data
+            upload_result = functions.upload(file, file_type, group.paths['match_data'], group.paths['player_keys'], group.match_id_index)
+
+        if upload_result['status'] == 'success':
+            job = group.recalculation_worker.submit('incremental') # stats update in the background, the upload returns straight away
+            upload_result = display.response("success", f"{upload_result['message']}. Player stats are being updated (job {job.job_id}).", {**upload_result.get('data', {}), "job_id": job.job_id})
 
         return render_template('upload.html', response=upload_result)
     
@@ -167,9 +810,15 @@ def upload_file():
         error_message = f"An error occurred during file upload: {str(e)}"
         return render_template('upload.html', response=display.reponse("error", error_message))
 
+# every page and api of a group is served under /groups/<name>/ too, the unprefixed urls being the default group's
+for rule in list(app.url_map.iter_rules()):
+    if rule.endpoint not in APP_ENDPOINTS:
+        app.add_url_rule(f"/groups/<group>{rule.rule}", rule.endpoint, methods=rule.methods - {'HEAD', 'OPTIONS'})
+
 context = config.SSL_CONTEXT
 
 if __name__ == '__main__':
+    warm_up()
     app.run(debug=True, host='127.0.0.1', port=5000, ssl_context = context)
     
 
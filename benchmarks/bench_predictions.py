@@ -0,0 +1,41 @@
+"""
+Times the player rating fit (full and incremental) and prediction query latency.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_predictions --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+import timeit
+
+from benchmarks.synthetic import generate_match_data
+from predictions import RatingModel
+
+
+def run(sizes, n_players, queries):
+    print(f"{'matches':>10} {'full fit (s)':>13} {'+1 match (ms)':>14} {'query (us)':>11}")
+    for n_matches in sizes:
+        match_data = generate_match_data(n_matches + 1, n_players)
+        history, new_match = match_data.iloc[:-1], match_data.iloc[-1:]
+
+        start = time.perf_counter()
+        model = RatingModel().partial_fit(history)
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        model.partial_fit(new_match)
+        update_time = time.perf_counter() - start
+
+        team_a, team_b = list(range(1, 9)), list(range(9, 17))
+        query_time = timeit.timeit(lambda: model.predict(team_a, team_b), number=queries) / queries
+
+        print(f"{n_matches:>10} {fit_time:>13.3f} {update_time * 1e3:>14.2f} {query_time * 1e6:>11.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--queries', type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.sizes, args.players, args.queries)
@@ -0,0 +1,94 @@
+"""
+Compares the vectorized cs_player_stats_player_form against the previous iterrows implementation.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_process_match_data --sizes 10000 100000 1000000 --legacy-max 100000
+
+The legacy loop is slow enough that it is only run up to --legacy-max matches.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import raw_data_processing
+from benchmarks.synthetic import generate_match_data, generate_player_keys
+
+
+def legacy_process_match_data(match_data_path):
+    player_records = []
+    match_data = pd.read_csv(match_data_path)
+
+    for index, row in match_data.iterrows():
+        players_team1 = [row[f'Team 1 P{i}'] for i in range(1,9) if row[f'Team 1 P{i}'] != 0]
+        players_team2 = [row[f'Team 2 P{i}'] for i in range(1,9) if row[f'Team 2 P{i}'] != 0]
+
+        for team, players in [('Team 1', players_team1), ('Team 2', players_team2)]:
+            for player_id in players:
+                player_records.append({
+                    'player_id': int(player_id),
+                    'goals_for': int(row[f'{team} Goals']),
+                    'goals_against': int(row['Team 2 Goals'] if team == 'Team 1' else row['Team 1 Goals']),
+                    'result': str(row[f'{team} Result']).strip()
+                })
+
+    calculated_player_stats = {}
+    for player_record in player_records:
+        stats = calculated_player_stats.setdefault(player_record['player_id'], {
+            'total_matches': 0, 'total_wins': 0, 'total_draws': 0, 'total_losses': 0,
+            'total_goals_for': 0, 'total_goals_against': 0
+        })
+        stats['total_matches'] += 1
+        stats['total_goals_for'] += player_record['goals_for']
+        stats['total_goals_against'] += player_record['goals_against']
+        if player_record['result'] == "1.0":
+            stats['total_wins'] += 1
+        elif player_record['result'] == "0.5":
+            stats['total_draws'] += 1
+        else:
+            stats['total_losses'] += 1
+
+    return calculated_player_stats
+
+
+def run(sizes, legacy_max, n_players):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {name: os.path.join(tmp_dir, name) for name in
+                 ['match_data.csv', 'player_keys.csv', 'match_count.txt', 'player_stats.csv', 'player_form_dict.json']}
+        generate_player_keys(n_players).to_csv(paths['player_keys.csv'], index=False)
+
+        print(f"{'matches':>10} {'vectorized (s)':>15} {'legacy (s)':>12} {'speedup':>9}")
+        for n_matches in sizes:
+            generate_match_data(n_matches, n_players).to_csv(paths['match_data.csv'], index=False)
+
+            start = time.perf_counter()
+            player_stats_df, _ = raw_data_processing.cs_player_stats_player_form(
+                paths['match_data.csv'], paths['match_count.txt'], paths['player_keys.csv'],
+                paths['player_stats.csv'], paths['player_form_dict.json'])
+            vectorized_time = time.perf_counter() - start
+
+            if n_matches > legacy_max:
+                print(f"{n_matches:>10} {vectorized_time:>15.3f} {'skipped':>12} {'-':>9}")
+                continue
+
+            start = time.perf_counter()
+            legacy_stats = legacy_process_match_data(paths['match_data.csv'])
+            legacy_time = time.perf_counter() - start
+
+            legacy_totals = pd.DataFrame.from_dict(legacy_stats, orient='index')
+            vectorized_totals = raw_data_processing.calculate_player_stats(
+                raw_data_processing.build_appearances(pd.read_csv(paths['match_data.csv'])))
+            assert legacy_totals.equals(vectorized_totals[legacy_totals.columns]), "vectorized totals differ from legacy"
+
+            print(f"{n_matches:>10} {vectorized_time:>15.3f} {legacy_time:>12.3f} {legacy_time / vectorized_time:>8.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max', type=int, default=100_000)
+    parser.add_argument('--players', type=int, default=40)
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max, args.players)
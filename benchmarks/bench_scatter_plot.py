@@ -0,0 +1,77 @@
+"""
+Compares the single trace goal_diff_scatter_plot against the previous trace-per-player version.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_scatter_plot --players 50 500 2000 5000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import data_visualisations
+
+
+def legacy_goal_diff_scatter_plot(player_stats_df):
+    fig = go.Figure()
+
+    for index, player in player_stats_df.iterrows():
+        fig.add_trace(go.Scatter(
+            x=[player["total_goals_against"]],
+            y=[player["total_goals_for"]],
+            mode='markers+text',
+            marker=dict(size=10),
+            text=[player["player_name"]],
+            name=player["player_name"],
+            textfont=dict(color="#D3D3D3"),
+            showlegend=False
+        ))
+
+    max_goals = max(player_stats_df['total_goals_for'].max(), player_stats_df['total_goals_against'].max())
+    fig.add_trace(go.Scatter(x=[0, max_goals], y=[0, max_goals], mode='lines', name='x=y', showlegend=False))
+    data_visualisations.apply_standard_layout(fig)
+
+    return pio.to_json(fig)
+
+
+def synthetic_player_stats(n_players, seed=0):
+    rng = np.random.default_rng(seed)
+    total_matches = rng.integers(1, 200, n_players)
+    total_wins = rng.binomial(total_matches, 0.45)
+
+    return pd.DataFrame({
+        'player_name': [f'Player {i}' for i in range(1, n_players + 1)],
+        'total_matches': total_matches,
+        'total_goals_for': rng.poisson(6 * total_matches),
+        'total_goals_against': rng.poisson(6 * total_matches),
+        'win_pct': np.round(total_wins / total_matches * 100, 1)
+    })
+
+
+def time_build(build, player_stats_df, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        figure_json = build(player_stats_df)
+    return (time.perf_counter() - start) / repeats, len(figure_json)
+
+
+def run(player_counts, repeats):
+    print(f"{'players':>8} {'legacy (s)':>11} {'legacy (KB)':>12} {'new (s)':>9} {'new (KB)':>9} {'trace':>10}")
+    for n_players in player_counts:
+        player_stats_df = synthetic_player_stats(n_players)
+        legacy_time, legacy_size = time_build(legacy_goal_diff_scatter_plot, player_stats_df, repeats)
+        new_time, new_size = time_build(data_visualisations.goal_diff_scatter_plot, player_stats_df, repeats)
+        trace_type = 'scattergl' if n_players > data_visualisations.config.SCATTER_WEBGL_THRESHOLD else 'scatter'
+
+        print(f"{n_players:>8} {legacy_time:>11.3f} {legacy_size / 1024:>12.1f} {new_time:>9.3f} {new_size / 1024:>9.1f} {trace_type:>10}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, nargs='+', default=[50, 500, 2000, 5000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    run(args.players, args.repeats)
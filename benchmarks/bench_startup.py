@@ -0,0 +1,83 @@
+"""
+Cold start cost of the app: how long `import app` takes (and which modules dominate it, from python -X importtime),
+how long the first / takes to serve, and how long warm_up() takes before the first data route.
+Each run is a fresh interpreter, so nothing is already imported or cached.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_startup --runs 5 --top 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+home_served = time.perf_counter()
+warm_up_timings = app.warm_up() # the default group's
+print(json.dumps({
+    "import_app": imported - start,
+    "first_home": home_served - imported,
+    "warm_up": warm_up_timings["total"],
+    "warm_up_steps": warm_up_timings
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """(module, self microseconds, cumulative microseconds) for every line of python -X importtime output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        modules.append((module.strip(), int(self_us), int(cumulative_us)))
+
+    return modules
+
+
+def import_profile(top):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    modules = parse_importtime(result.stderr)
+    top_level = [module for module in modules if module[0] == 'app']
+
+    return top_level[0][2] if top_level else None, sorted(modules, key=lambda module: module[1], reverse=True)[:top]
+
+
+def cold_start():
+    result = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(runs, top):
+    total_us, slowest_modules = import_profile(top)
+    print(f"import app (importtime): {total_us / 1000:.1f} ms")
+    print(f"{'module':<50} {'self (ms)':>10}")
+    for module, self_us, _ in slowest_modules:
+        print(f"{module:<50} {self_us / 1000:>10.1f}")
+
+    samples = [cold_start() for _ in range(runs)]
+    print()
+    print(f"{'step':<12} {'median (ms)':>12} {'max (ms)':>10}")
+    for step in ['import_app', 'first_home', 'warm_up']:
+        timings = [sample[step] * 1000 for sample in samples]
+        print(f"{step:<12} {statistics.median(timings):>12.1f} {max(timings):>10.1f}")
+    print(f"warm_up steps (last run): {samples[-1]['warm_up_steps']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+    run(args.runs, args.top)
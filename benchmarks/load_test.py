@@ -0,0 +1,99 @@
+"""
+Load test a running server: requests/sec and latency for /stats and /generate_form_heatmap.
+
+Usage (from the repo root), against e.g. `gunicorn -c gunicorn.conf.py wsgi:app` or `python app.py`:
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 16 --duration 10
+    python -m benchmarks.load_test --url https://127.0.0.1:5000 --insecure --player-ids 1 2 3 4
+
+Requests are made from a pool of threads, each keeping one connection open, for --duration seconds per route.
+"""
+import argparse
+import http.client
+import json
+import ssl
+import statistics
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+def route_requests(player_ids, form_window):
+    """(name, method, path, body, headers) for each route under test."""
+    form_body = urllib.parse.urlencode([('form_window', form_window)] + [('player_ids', player_id) for player_id in player_ids])
+    return [
+        ("/stats", "GET", "/stats", None, {}),
+        ("/generate_form_heatmap", "POST", "/generate_form_heatmap", form_body, {"Content-Type": "application/x-www-form-urlencoded"})
+    ]
+
+
+def connect(url, insecure):
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme == 'https':
+        context = ssl._create_unverified_context() if insecure else ssl.create_default_context()
+        return http.client.HTTPSConnection(parsed.hostname, parsed.port or 443, context=context, timeout=30)
+    return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+
+
+def run_client(url, insecure, method, path, body, headers, deadline):
+    """Send requests back to back on one connection until deadline, returning (latencies, errors)."""
+    latencies, errors = [], 0
+    connection = connect(url, insecure)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = connect(url, insecure)
+    connection.close()
+    return latencies, errors
+
+
+def load_test(url, route, concurrency, duration, insecure):
+    name, method, path, body, headers = route
+    start = time.perf_counter()
+    deadline = start + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: run_client(url, insecure, method, path, body, headers, deadline), range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    return {
+        "route": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": len(latencies) / elapsed,
+        "median_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per route")
+    parser.add_argument('--player-ids', type=int, nargs='+', default=[1, 2, 3, 4])
+    parser.add_argument('--form-window', type=int, default=10)
+    parser.add_argument('--insecure', action='store_true', help="don't verify the certificate (the self-signed dev one)")
+    parser.add_argument('--output', help="also write the results to this json file")
+    args = parser.parse_args()
+
+    results = []
+    for route in route_requests(args.player_ids, args.form_window):
+        result = load_test(args.url, route, args.concurrency, args.duration, args.insecure)
+        results.append(result)
+        print(f"{result['route']:<25} {result['requests_per_second']:>9.1f} req/s  median {result['median_ms'] or 0:>8.2f} ms  "
+              f"p95 {result['p95_ms'] or 0:>8.2f} ms  errors {result['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({"url": args.url, "concurrency": args.concurrency, "duration": args.duration, "results": results}, file, indent=2)
@@ -0,0 +1,205 @@
+"""
+Benchmark suite: processing, figure builders, cold start and the main routes, on synthetic data of each size.
+Results are written as json (one file per run, named after the commit) so runs can be compared across commits.
+
+Usage (from the repo root):
+    python -m benchmarks.run_suite --sizes 1000 10000 100000 --players 40
+    python -m benchmarks.run_suite --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+The app is started in a fresh interpreter per size with config pointed at a temp directory, so the cold start
+includes the full calculation and the repo's own data/ is never touched.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import data_visualisations
+import player_directory
+import raw_data_processing
+from benchmarks.synthetic import write_dataset
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# run in a fresh interpreter: config is pointed at the temp data before app (and everything it loads lazily) is imported
+APP_SCRIPT = """
+import json, statistics, sys, time
+options = json.loads(sys.argv[1])
+
+import config
+for name, path in options["config"].items():
+    setattr(config, name, path)
+config.RECALCULATION_DEBOUNCE_SECONDS = 0
+
+start = time.perf_counter()
+import app
+results = {"startup.import_app": [time.perf_counter() - start]}
+start = time.perf_counter()
+app.warm_up()
+results["startup.warm_up"] = [time.perf_counter() - start]
+
+client = app.app.test_client()
+player_ids = app.dataset_groups.default.dataset.get().player_form.player_ids[:8].tolist()
+routes = {
+    "route./": lambda: client.get('/'),
+    "route./stats": lambda: client.get('/stats'),
+    "route./api/stats_table": lambda: client.get('/api/stats_table?draw=1&start=0&length=25&order[0][column]=7&order[0][dir]=desc'),
+    "route./api/form_heatmap": lambda: client.post('/api/form_heatmap', json={"player_ids": player_ids[:4], "windows": [5, 10, 20]}),
+    "route./api/predict": lambda: client.get('/api/predict?team_a=' + ','.join(map(str, player_ids[:4])) + '&team_b=' + ','.join(map(str, player_ids[4:8]))),
+    "route./api/balance_teams": lambda: client.post('/api/balance_teams', json={"player_ids": player_ids}),
+    "route./api/player_trends": lambda: client.get('/api/player_trends?player_ids=' + ','.join(map(str, player_ids[:2]))),
+    "route./metrics": lambda: client.get('/metrics')
+}
+for name, request in routes.items():
+    timings = []
+    for _ in range(options["repeats"]):
+        start = time.perf_counter()
+        response = request()
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, (name, response.status_code)
+    results[name] = timings
+
+print(json.dumps(results))
+"""
+
+
+def summarise(timings):
+    return {"min": min(timings), "median": statistics.median(timings), "max": max(timings), "runs": len(timings)}
+
+
+def time_repeated(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_processing(paths, repeats):
+    return {"cs_player_stats_player_form": time_repeated(lambda: raw_data_processing.cs_player_stats_player_form(
+        paths['match_data'], paths['match_count'], paths['player_keys'], paths['player_stats'], paths['player_form_dict'], paths['processing_state']), repeats)}
+
+
+def bench_figures(paths, repeats):
+    player_stats_df, player_form = raw_data_processing.cs_player_stats_player_form(
+        paths['match_data'], paths['match_count'], paths['player_keys'], paths['player_stats'], paths['player_form_dict'])
+    player_keys_dict = player_directory.for_path(paths['player_keys']).get().names
+    player_ids = player_form.player_ids[:10].tolist()
+
+    builders = {
+        "form_heatmap": lambda: data_visualisations.form_heatmap(player_ids, 10, player_form, player_keys_dict),
+        "form_heatmap_data": lambda: data_visualisations.form_heatmap_data(player_ids, 10, player_form, player_keys_dict),
+        "goal_diff_scatter_plot": lambda: data_visualisations.goal_diff_scatter_plot(player_stats_df),
+        "results_bar_graph": lambda: data_visualisations.results_bar_graph(player_stats_df)
+    }
+    return {f"data_visualisations.{name}": time_repeated(build, repeats) for name, build in builders.items()}
+
+
+def bench_app(tmp_dir, paths, repeats):
+    options = {
+        "repeats": repeats,
+        "config": {
+            "MATCH_DATA_PATH": paths['match_data'],
+            "PLAYER_KEYS_PATH": paths['player_keys'],
+            "MATCH_COUNT_PATH": os.path.join(tmp_dir, 'app', 'match_count.txt'),
+            "PLAYER_STATS_PATH": os.path.join(tmp_dir, 'app', 'player_stats.csv'),
+            "PLAYER_FORM_DICT_PATH": os.path.join(tmp_dir, 'app', 'player_form_dict.json'),
+            "PROCESSING_STATE_PATH": os.path.join(tmp_dir, 'app', 'processing_state.json'),
+            "PLAYER_RATINGS_PATH": os.path.join(tmp_dir, 'app', 'player_ratings.npz'),
+            "CALCULATED_NPY_DIR": os.path.join(tmp_dir, 'app', 'npy'),
+            "ROLLING_METRICS_PATH": os.path.join(tmp_dir, 'app', 'rolling_metrics.npz'),
+            "SYNERGY_PATH": os.path.join(tmp_dir, 'app', 'synergy.npz'),
+            "SHARED_SNAPSHOT_DIR": os.path.join(tmp_dir, 'app', 'shared'),
+            "MATCH_STORE_PATH": os.path.join(tmp_dir, 'app', 'match_store.sqlite'),
+            "GROUPS_DIR": os.path.join(tmp_dir, 'groups')
+        }
+    }
+    os.makedirs(os.path.join(tmp_dir, 'app'), exist_ok=True)
+
+    result = subprocess.run([sys.executable, '-c', APP_SCRIPT, json.dumps(options)], cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"app benchmark failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(sizes, n_players, repeats, seed, output_path):
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "players": n_players,
+            "repeats": repeats,
+            "seed": seed
+        },
+        "results": []
+    }
+
+    for n_matches in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            match_data_path, player_keys_path = write_dataset(tmp_dir, n_matches, n_players, seed, skill_spread=0.5)
+            paths = {"match_data": match_data_path, "player_keys": player_keys_path,
+                     **{name: os.path.join(tmp_dir, file_name) for name, file_name in
+                        [('match_count', 'match_count.txt'), ('player_stats', 'player_stats.csv'),
+                         ('player_form_dict', 'player_form_dict.json'), ('processing_state', 'processing_state.json')]}}
+
+            timings = {**bench_processing(paths, repeats), **bench_figures(paths, repeats), **bench_app(tmp_dir, paths, repeats)}
+
+        for name, samples in timings.items():
+            report["results"].append({"benchmark": name, "matches": n_matches, **summarise(samples)})
+            print(f"{n_matches:>10} {name:<45} {statistics.median(samples) * 1000:>10.2f} ms")
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {output_path}")
+
+
+def compare(old_path, new_path):
+    """Median of every benchmark in new_path relative to old_path."""
+    with open(old_path) as file:
+        old = {(result["benchmark"], result["matches"]): result["median"] for result in json.load(file)["results"]}
+    with open(new_path) as file:
+        new_report = json.load(file)
+
+    print(f"{'matches':>10} {'benchmark':<45} {'old (ms)':>10} {'new (ms)':>10} {'change':>8}")
+    for result in new_report["results"]:
+        key = (result["benchmark"], result["matches"])
+        if key not in old:
+            continue
+        print(f"{key[1]:>10} {key[0]:<45} {old[key] * 1000:>10.2f} {result['median'] * 1000:>10.2f} {result['median'] / old[key]:>7.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="json results path (default benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two results files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args.sizes, args.players, args.repeats, args.seed, args.output or os.path.join(RESULTS_DIR, f"{git_commit()}.json"))
@@ -0,0 +1,84 @@
+"""
+Deterministic synthetic match history in the same schema as data/raw/match_data.csv.
+
+Usage (from the repo root), to write match_data.csv and player_keys.csv to a directory:
+    python -m benchmarks.synthetic --matches 100000 --players 60 --out /tmp/football_data
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from raw_data_processing import PLAYER_COLUMNS, TEAM_SIZE
+
+
+def generate_match_data(n_matches, n_players=40, seed=0, min_team_size=5, mean_goals=6.0, skill_spread=0.0):
+    """
+    n_matches matches between teams of min_team_size to 8 players drawn from a roster of n_players, empty slots
+    padded with 0. With skill_spread > 0 every player gets a hidden skill (normal, that standard deviation, in goals
+    per match) that shifts their team's expected goals, so stronger players really do win more.
+    """
+    rng = np.random.default_rng(seed)
+
+    # each match draws 16 distinct players from the roster, then pads a random number of slots with 0
+    picks = np.argsort(rng.random((n_matches, n_players)), axis=1)[:, :2 * TEAM_SIZE] + 1
+    team_sizes = rng.integers(min_team_size, TEAM_SIZE + 1, size=(n_matches, 2))
+    slot = np.tile(np.arange(TEAM_SIZE), 2)
+    sizes = np.repeat(team_sizes, TEAM_SIZE, axis=1)
+    picks[slot[None, :] >= sizes] = 0
+
+    if skill_spread > 0:
+        skills = np.r_[0.0, rng.normal(0.0, skill_spread, n_players)] # index 0 is the empty slot
+        team_skill = skills[picks].reshape(n_matches, 2, TEAM_SIZE).sum(axis=2)
+        team1_mean = np.clip(mean_goals + (team_skill[:, 0] - team_skill[:, 1]) / 2, 0.5, None)
+        team2_mean = np.clip(mean_goals - (team_skill[:, 0] - team_skill[:, 1]) / 2, 0.5, None)
+    else:
+        team1_mean = team2_mean = mean_goals
+
+    team1_goals = rng.poisson(team1_mean, n_matches)
+    team2_goals = rng.poisson(team2_mean, n_matches)
+    team1_result = np.where(team1_goals > team2_goals, 1.0, np.where(team1_goals == team2_goals, 0.5, 0.0))
+
+    match_data = pd.DataFrame(picks, columns=PLAYER_COLUMNS)
+    match_data.insert(0, 'Match ID', np.arange(1, n_matches + 1))
+    match_data['Team 1 Goals'] = team1_goals
+    match_data['Team 2 Goals'] = team2_goals
+    match_data['Team 1 Result'] = team1_result
+    match_data['Team 2 Result'] = 1.0 - team1_result
+    return match_data
+
+
+def generate_player_keys(n_players=40):
+    return pd.DataFrame({
+        'player_name': [f'Player {i}' for i in range(1, n_players + 1)],
+        'player_id': np.arange(1, n_players + 1)
+    })
+
+
+def write_dataset(directory, n_matches, n_players=40, seed=0, **match_options):
+    """Write match_data.csv and player_keys.csv to directory, returning their paths."""
+    os.makedirs(directory, exist_ok=True)
+    match_data_path = os.path.join(directory, 'match_data.csv')
+    player_keys_path = os.path.join(directory, 'player_keys.csv')
+
+    generate_match_data(n_matches, n_players, seed, **match_options).to_csv(match_data_path, index=False)
+    generate_player_keys(n_players).to_csv(player_keys_path, index=False)
+
+    return match_data_path, player_keys_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, required=True)
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-team-size', type=int, default=5)
+    parser.add_argument('--mean-goals', type=float, default=6.0)
+    parser.add_argument('--skill-spread', type=float, default=0.0)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    paths = write_dataset(args.out, args.matches, args.players, args.seed,
+                          min_team_size=args.min_team_size, mean_goals=args.mean_goals, skill_spread=args.skill_spread)
+    print("\n".join(paths))
@@ -8,6 +8,87 @@ PLAYER_KEYS_PATH = os.path.join(BASE_DIR, 'data/raw/player_keys.csv')
 MATCH_COUNT_PATH = os.path.join(BASE_DIR, 'data/calculated/match_count.txt')
 PLAYER_STATS_PATH = os.path.join(BASE_DIR, 'data/calculated/player_stats.csv')
 PLAYER_FORM_DICT_PATH = os.path.join(BASE_DIR, 'data/calculated/player_form_dict.json')
+PROCESSING_STATE_PATH = os.path.join(BASE_DIR, 'data/calculated/processing_state.json')
+PLAYER_RATINGS_PATH = os.path.join(BASE_DIR, 'data/calculated/player_ratings.npz')
+ROLLING_METRICS_PATH = os.path.join(BASE_DIR, 'data/calculated/rolling_metrics.npz')
+SYNERGY_PATH = os.path.join(BASE_DIR, 'data/calculated/synergy.npz')
+CALCULATED_NPY_DIR = os.path.join(BASE_DIR, 'data/calculated/npy')
+SHARED_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'data/calculated/shared')
+MATCH_STORE_PATH = os.path.join(BASE_DIR, 'data/calculated/match_store.sqlite')
+PROFILE_DIR = os.path.join(BASE_DIR, 'data/profiles')
+GROUPS_DIR = os.path.join(BASE_DIR, 'data/groups') # one <name>/raw/ (and <name>/calculated/) per extra group, see groups.py
+
+# Calculated data storage backend: 'csv' (player_stats.csv + player_form_dict.json) or 'npy' (memory-mapped numpy arrays)
+CALCULATED_STORAGE_BACKEND = os.environ.get('CALCULATED_STORAGE_BACKEND', 'csv')
+
+# Optional SQLite match store (sqlite_store.py) kept alongside match_data.csv, for indexed per-player queries
+MATCH_STORE_ENABLED = os.environ.get('MATCH_STORE_ENABLED', '0') == '1'
+
+# Maximum number of plotly figures kept by figure_cache
+FIGURE_CACHE_SIZE = 128
+
+# Above this many players the goal difference scatter plot is drawn with WebGL (Scattergl)
+SCATTER_WEBGL_THRESHOLD = 500
+
+# Player rating fit (predictions.py): ridge penalty on the ratings, and the spread of goal difference assumed before any matches
+RATING_REGULARISATION = 2.0
+RATING_DEFAULT_SIGMA = 3.0
+
+# Team balancing: most players in the pool and seconds allowed for the search
+BALANCE_MAX_PLAYERS = 16
+BALANCE_TIME_BUDGET = 0.5
+
+# Default windows (last n matches) for the rolling player metrics, any window can be asked for
+ROLLING_WINDOWS = (5, 10, 20)
+
+# Synergy heatmap: players shown when none are picked, and the most players one request can ask for
+SYNERGY_DEFAULT_PLAYERS = 20
+SYNERGY_MAX_PLAYERS = 100
+
+# Most players one name search (/api/players?q=) returns
+PLAYER_SEARCH_MAX_RESULTS = 50
+
+# Processes recalculating groups at once when every group is recalculated (0 or 1 recalculates them one at a time)
+GROUP_RECALCULATION_WORKERS = int(os.environ.get('GROUP_RECALCULATION_WORKERS', os.cpu_count() or 1))
+
+# Seconds a queued recalculation waits before starting, so repeated triggers are folded into one job
+RECALCULATION_DEBOUNCE_SECONDS = 1.0
+
+# Rows validated and written at a time when an uploaded csv is ingested
+UPLOAD_CHUNK_ROWS = 50_000
+
+# Rows on the first page of the stats table, which is rendered into /stats rather than fetched
+STATS_TABLE_PAGE_LENGTH = 10
+
+# Win % confidence intervals and luck z-scores in the stats table (luck.py): bootstrap resamples per player, the
+# interval's confidence level, the seed (so every process gets the same intervals) and datasets whose columns are kept
+LUCK_BOOTSTRAP_RESAMPLES = 2000
+LUCK_CONFIDENCE_LEVEL = 0.95
+LUCK_RANDOM_SEED = 0
+LUCK_CACHE_SIZE = 8
+
+# Timing instrumentation served at /metrics (set INSTRUMENTATION_ENABLED=0 to turn it off entirely), and the opt-in
+# cProfile mode that saves a profile to PROFILE_DIR for any request with ?profile=1
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '1') == '1'
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# HTTP caching (http_cache.py): compressed response bodies kept in memory, smallest body worth compressing, gzip level,
+# and how long browsers keep static files (their urls change with their contents)
+COMPRESSED_CACHE_SIZE = 256
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_LEVEL = 6
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# WSGI serving (gunicorn -c gunicorn.conf.py wsgi:app): worker processes, request threads per worker and address.
+# With SHARED_SNAPSHOT_ENABLED (wsgi.py turns it on) the calculated data is written once to SHARED_SNAPSHOT_DIR and
+# memory-mapped by every worker, which check for a newer snapshot at most every SHARED_SNAPSHOT_CHECK_SECONDS
+WSGI_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 4))
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 4))
+WSGI_BIND = os.environ.get('WSGI_BIND', '127.0.0.1:8000')
+SHARED_SNAPSHOT_ENABLED = os.environ.get('SHARED_SNAPSHOT_ENABLED', '0') == '1'
+SHARED_SNAPSHOT_CHECK_SECONDS = 1.0
+SHARED_SNAPSHOTS_KEPT = 2
 
 # SSL Context
 SSL_CONTEXT = (os.path.join(BASE_DIR, 'ssl/client-cert.pem'),
@@ -3,6 +3,10 @@ import plotly.io as pio
 import plotly.colors as pc
 import random
 
+import config
+from player_form import RESULT_NAMES, RESULT_VALUES
+from instrumentation import timed
+
 
 def get_category_colors():
     category_colors = {
@@ -38,58 +42,21 @@ def apply_standard_layout(fig):
         )
     )
 
-def form_heatmap(player_ids, form_window, player_form_dict, player_keys_dict):
-    player_match_history = {}
-    max_games_played = 0
+def form_heatmap_trace_style():
     category_colors = get_category_colors()
-
-    for player_id in player_ids:
-        match_ids = sorted(player_form_dict[player_id].keys(), key = lambda x: int(x))[-form_window:]
-        player_match_history[player_id] = match_ids
-        max_games_played = max(max_games_played, len(match_ids))
-
-    form_matrix, form_text_matrix, player_names = [], [], []
-
-    for player_id in player_ids:
-        player_name = player_keys_dict[int(player_id)]
-        player_names.append(player_name)
-
-        results = []
-        text_labels = []
-
-        match_ids = player_match_history[player_id]
-
-        for i in range(max_games_played):
-            if i < len(match_ids):
-                match_id = match_ids[i]
-                print(match_id)
-                result = float(player_form_dict[player_id][match_id])
-
-                result_text = "Win" if result == 1 else "Draw" if result == 0.5 else "Loss"
-                results.append(result)
-                text_labels.append(f"{result_text} ({match_id})")
-            else:
-                results.append(None)
-                text_labels.append("")
-
-        form_matrix.append(results)
-        form_text_matrix.append(text_labels)
-
-    fig = go.Figure(data=go.Heatmap(
-        z=form_matrix,
-        x=[f"Match {i+1}" for i in range(max_games_played)],  # Arbitrary x-axis
-        y=player_names,
+    return dict(
         colorscale=[(0, category_colors["Loss"]), (0.5, category_colors["Draw"]), (1, category_colors["Win"])], 
         showscale=False,
         hoverongaps=False,
         xgap=2,
         ygap=2,
-        text=form_text_matrix,  # Show result & match ID as text
         texttemplate="%{text}",
         hovertemplate="%{text}<extra></extra>"  # Ensure text is displayed
-    ))
-        
-    for category, color in category_colors.items():
+    )
+
+
+def add_form_heatmap_legend(fig):
+    for category, color in get_category_colors().items():
         fig.add_trace(go.Scatter(
             x=[None], y=[None],
             mode="markers",
@@ -97,6 +64,52 @@ def form_heatmap(player_ids, form_window, player_form_dict, player_keys_dict):
             name=category
         ))
 
+
+@timed('data_visualisations.form_heatmap_data')
+def form_heatmap_data(player_ids, form_window, player_form, player_keys_dict):
+    """The per-request part of the form heatmap: axis labels and the z (result) and text matrices, padded with gaps."""
+    histories = [player_form.last_n(player_id, form_window) for player_id in player_ids]
+    max_games_played = max((len(match_ids) for match_ids, _ in histories), default=0)
+
+    form_matrix, form_text_matrix = [], []
+    for match_ids, result_codes in histories:
+        result_codes = result_codes.tolist()
+        padding = max_games_played - len(result_codes)
+
+        form_matrix.append([RESULT_VALUES.get(code, 0.0) for code in result_codes] + [None] * padding)
+        form_text_matrix.append([f"{RESULT_NAMES.get(code, 'Loss')} ({match_id})" for match_id, code in zip(match_ids.tolist(), result_codes)] + [""] * padding)
+
+    return {
+        "x": [f"Match {i+1}" for i in range(max_games_played)],  # Arbitrary x-axis
+        "y": [player_keys_dict[int(player_id)] for player_id in player_ids],
+        "z": form_matrix,
+        "text": form_text_matrix  # Show result & match ID as text
+    }
+
+
+def form_heatmap_style():
+    """The parts of the form heatmap that never change (trace styling, legend and layout), served once to the browser."""
+    fig = go.Figure()
+    add_form_heatmap_legend(fig)
+
+    fig.update_layout(
+        xaxis=dict(title="Recent Matches (Oldest -> Recent)", tickangle=45),
+        yaxis=dict(title="Players")
+    )
+
+    apply_standard_layout(fig)
+
+    style = fig.to_plotly_json()
+    return {"heatmap": form_heatmap_trace_style(), "legend": style["data"], "layout": style["layout"]}
+
+
+@timed('data_visualisations.form_heatmap')
+def form_heatmap(player_ids, form_window, player_form, player_keys_dict):
+    heatmap_data = form_heatmap_data(player_ids, form_window, player_form, player_keys_dict)
+
+    fig = go.Figure(data=go.Heatmap(**heatmap_data, **form_heatmap_trace_style()))
+    add_form_heatmap_legend(fig)
+
     fig.update_layout(
         title=f"Player Form Over Last {form_window} Matches",
         xaxis=dict(title="Recent Matches (Oldest -> Recent)", tickangle=45),
@@ -105,27 +118,31 @@ def form_heatmap(player_ids, form_window, player_form_dict, player_keys_dict):
 
     apply_standard_layout(fig)
 
-    return pio.to_json(fig)
+    with timed('data_visualisations.to_json'):
+        return pio.to_json(fig)
 
 
-def goal_diff_scatter_plot(player_stats_df):
+@timed('data_visualisations.goal_diff_scatter_plot')
+def goal_diff_scatter_plot(player_stats_df, webgl_threshold=config.SCATTER_WEBGL_THRESHOLD):
     fig = go.Figure()
 
-    for index, player in player_stats_df.iterrows():
-        player_name = player["player_name"]
-        goals_for = player["total_goals_for"]
-        goals_against = player["total_goals_against"]
-
-        fig.add_trace(go.Scatter(
-            x=[goals_against],
-            y=[goals_for],
-            mode='markers+text',
-            marker=dict(size=10),#, color=dot_color),
-            text=[player_name],
-            name=player_name,
-            textfont=dict(color="#D3D3D3"),
-            showlegend=False
-        ))
+    # one trace for every player, coloured point by point the way plotly used to colour a trace per player
+    player_names = player_stats_df["player_name"].fillna("").astype(str).to_numpy()
+    palette = pc.qualitative.Plotly
+    point_colors = [palette[i % len(palette)] for i in range(len(player_stats_df))]
+    scatter_trace = go.Scattergl if len(player_stats_df) > webgl_threshold else go.Scatter
+
+    fig.add_trace(scatter_trace(
+        x=player_stats_df["total_goals_against"].to_numpy(),
+        y=player_stats_df["total_goals_for"].to_numpy(),
+        mode='markers+text',
+        marker=dict(size=10, color=point_colors),
+        text=player_names,
+        customdata=player_stats_df[["total_matches", "win_pct"]].to_numpy(),
+        hovertemplate="%{text}<br>Goals For: %{y}<br>Goals Against: %{x}<br>Matches: %{customdata[0]}<br>Win %: %{customdata[1]}<extra></extra>",
+        textfont=dict(color="#D3D3D3"),
+        showlegend=False
+    ))
 
     # Calculate the range based on the data
     min_goals = min(player_stats_df['total_goals_for'].min(), player_stats_df['total_goals_against'].min())
@@ -150,9 +167,11 @@ def goal_diff_scatter_plot(player_stats_df):
 
     apply_standard_layout(fig)
 
-    return pio.to_json(fig)
+    with timed('data_visualisations.to_json'):
+        return pio.to_json(fig)
 
 
+@timed('data_visualisations.results_bar_graph')
 def results_bar_graph(player_stats_df):
     # Extract player names and stats
     player_names = player_stats_df["player_name"].tolist()
@@ -179,4 +198,44 @@ def results_bar_graph(player_stats_df):
 
     apply_standard_layout(fig)
 
-    return pio.to_json(fig)
\ No newline at end of file
+    with timed('data_visualisations.to_json'):
+        return pio.to_json(fig)
+
+SYNERGY_METRIC_TITLES = {
+    "together": "Matches Played Together",
+    "together_win_pct": "Win % Playing Together",
+    "against": "Matches Played Against Each Other",
+    "against_win_pct": "Head to Head Win % (row player against column player)"
+}
+
+
+@timed('data_visualisations.synergy_heatmap')
+def synergy_heatmap(player_ids, metric, synergy_matrix, player_keys_dict):
+    """Player x player heatmap of one of synergy.MATRIX_METRICS, from the precomputed synergy counts."""
+    player_names = [str(player_keys_dict.get(int(player_id), player_id)) for player_id in player_ids]
+    is_pct = metric.endswith('_pct')
+    category_colors = get_category_colors()
+
+    fig = go.Figure(data=go.Heatmap(
+        x=player_names,
+        y=player_names,
+        z=synergy_matrix.matrix(player_ids, metric),
+        colorscale=[(0, category_colors["Loss"]), (0.5, category_colors["Draw"]), (1, category_colors["Win"])] if is_pct else "Viridis",
+        zmin=0 if is_pct else None,
+        zmax=100 if is_pct else None,
+        hoverongaps=False,
+        xgap=1,
+        ygap=1,
+        hovertemplate="%{y} / %{x}: %{z}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        title=SYNERGY_METRIC_TITLES[metric],
+        xaxis=dict(tickangle=45),
+        yaxis=dict(autorange="reversed")
+    )
+
+    apply_standard_layout(fig)
+
+    with timed('data_visualisations.to_json'):
+        return pio.to_json(fig)
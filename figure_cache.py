@@ -0,0 +1,63 @@
+"""
+LRU cache for the plotly figure json built by data_visualisations.
+
+Keys combine a data version (the version of the snapshot the figure is built from) with the figure name and its
+parameters. Publishing a new snapshot invalidates the cache, so a figure is only rebuilt after the data behind it changes.
+"""
+import threading
+from collections import OrderedDict
+
+import config
+
+
+class FigureCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def invalidate(self, version=None):
+        """Drop every figure, moving on to the given data version (or the next one)."""
+        with self.lock:
+            self.version = self.version + 1 if version is None else version
+            self.entries.clear()
+
+    def get_or_build(self, name, params, build, version=None):
+        """Return the cached figure for (name, params) at the data version, building it with build() on a miss."""
+        with self.lock:
+            key = (self.version if version is None else version, name, params)
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+
+        figure = build() # built outside the lock so a slow figure doesn't hold up other requests
+
+        with self.lock:
+            if key[0] == self.version: # don't cache a figure built from data that was replaced meanwhile
+                self.entries[key] = figure
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+
+        return figure
+
+    def stats(self):
+        with self.lock:
+            return {
+                "version": self.version,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+figure_cache = FigureCache(config.FIGURE_CACHE_SIZE)
@@ -7,7 +7,9 @@ import os
 
 from error_classes import MissingFileError, UploadError
 from display import response
+from instrumentation import timed
 import raw_data_processing
+import ingest
 
 
 def response(status, message, data=None):
@@ -21,36 +23,41 @@ def response(status, message, data=None):
     return response_result
 
 
-def upload(file, file_type, match_data_path, player_keys_path):
+@timed('functions.upload')
+def upload(file, file_type, match_data_path, player_keys_path, match_id_index=None):
+    """
+    Validate and save an uploaded csv, streamed in chunks so large uploads don't have to fit in memory.
+    file_type 'append_matches' adds only the matches that aren't in match_data.csv yet, instead of replacing it.
+    """
     try:
         if not file.filename.lower().endswith('.csv'):
             return response("error", "The uploaded file must be a .csv file")
 
-        df = pd.read_csv(file)
-
-        if file_type == 'match_data':
-            required_data_headers = ['Match ID', 'Team 1 P1', 'Team 1 P2', 'Team 1 P3', 'Team 1 P4', 'Team 1 P5', 'Team 1 P6', 'Team 1 P7', 'Team 1 P8', 
-                'Team 2 P1', 'Team 2 P2', 'Team 2 P3', 'Team 2 P4', 'Team 2 P5', 'Team 2 P6', 'Team 2 P7', 'Team 2 P8',
-                'Team 1 Goals', 'Team 2 Goals', 'Team 1 Result', 'Team 2 Result']
-            upload_path = match_data_path
-            
-        elif file_type == 'player_keys':
-            required_data_headers = ['player_name', 'player_id']
-            upload_path = player_keys_path
-        
-        df = df.loc[:, df.columns.str.strip() != '']
-        if list(df.columns) != required_data_headers:
-            print(df.columns)
-            return response("error", f"The column headers in your CSV file do not match the expected column headers: {required_data_headers}")
-        
-        df.to_csv(upload_path, index=False)
-
-        return response("success", "File successfully uploaded")
+        if file_type == 'append_matches':
+            rows_added, duplicates_skipped = ingest.append_match_data(file.stream, match_data_path, match_id_index or ingest.MatchIdIndex(match_data_path))
+            return response("success", f"{rows_added} new matches appended, {duplicates_skipped} already uploaded matches skipped",
+                            {"rows_added": rows_added, "duplicates_skipped": duplicates_skipped})
+
+        upload_path = match_data_path if file_type == 'match_data' else player_keys_path
+        n_rows = ingest.ingest_csv(file.stream, file_type, upload_path)
+
+        return response("success", f"File successfully uploaded ({n_rows} rows)")
+
+    except UploadError as e:
+        return response("error", e.message)
 
     except Exception as e:
         return response("error", f"An error occurred: {str(e)}")
 
 
+def file_has_content(file_path, peek_bytes=4096):
+    """True if the file has anything other than whitespace, without reading more than the start of a large file."""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as file:
+        return bool(file.read(min(file_size, peek_bytes)).strip()) or file_size > peek_bytes
+
+
+@timed('functions.csv_file_checker')
 def csv_file_checker(file_path):
     """Check if a CSV file exists and contains valid data."""
     file_status = {"has_data": False}
@@ -58,10 +65,7 @@ def csv_file_checker(file_path):
     if not os.path.exists(file_path):
         raise MissingFileError(f"CSV file not found: {file_path}")
 
-    with open(file_path, 'r') as file:
-        content = file.read().strip()
-        if content:  # Ensure it's not just whitespace
-            file_status["has_data"] = True
+    file_status["has_data"] = file_has_content(file_path)
     
     return file_status
 
@@ -72,10 +76,7 @@ def json_file_checker(file_path):
     if not os.path.exists(file_path):
         raise MissingFileError(f"JSON file not found: {file_path}")
 
-    with open(file_path, 'r') as file:
-        content = file.read().strip()
-        if content:  # Ensure it's not just whitespace
-            file_status["has_data"] = True
+    file_status["has_data"] = file_has_content(file_path)
 
     return file_status
 
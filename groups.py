@@ -0,0 +1,189 @@
+"""
+Named datasets ("groups"): several five-a-side groups served by one app, each with its own raw and calculated data.
+
+    default                          the data/ paths in config.py, served at the unprefixed urls (/stats, /api/...)
+    <GROUPS_DIR>/<name>/raw/         match_data.csv and player_keys.csv of group <name>, served under /groups/<name>/...
+    <GROUPS_DIR>/<name>/calculated/  its calculated data, laid out like data/calculated
+
+Every group has its own snapshot (and so its own data version), figure cache, player directory and recalculation
+worker. A group is only set up, and its data only loaded, the first time one of its pages is asked for, so a
+deployment with dozens of groups holds the data of the groups in use. recalculate_group() is one group's
+recalculation as a self-contained job, for spreading every group over a process pool (see app.recalculate_all_groups).
+"""
+import os
+import re
+import threading
+import time
+
+import config
+import player_directory
+from figure_cache import FigureCache
+from lazy_imports import lazy_import
+from shared_snapshot import SharedSnapshotStore, file_lock
+from snapshot import SnapshotHolder
+
+raw_data_processing = lazy_import('raw_data_processing')
+storage = lazy_import('storage')
+predictions = lazy_import('predictions')
+rolling_metrics = lazy_import('rolling_metrics')
+synergy = lazy_import('synergy')
+sqlite_store = lazy_import('sqlite_store')
+ingest = lazy_import('ingest')
+
+
+DEFAULT_GROUP = 'default'
+GROUP_NAME_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def default_paths():
+    """The default group's files, from config (read when the app starts, so they can be pointed elsewhere first)."""
+    return {
+        "match_data": config.MATCH_DATA_PATH,
+        "player_keys": config.PLAYER_KEYS_PATH,
+        "match_count": config.MATCH_COUNT_PATH,
+        "player_stats": config.PLAYER_STATS_PATH,
+        "player_form_dict": config.PLAYER_FORM_DICT_PATH,
+        "processing_state": config.PROCESSING_STATE_PATH,
+        "player_ratings": config.PLAYER_RATINGS_PATH,
+        "rolling_metrics": config.ROLLING_METRICS_PATH,
+        "synergy": config.SYNERGY_PATH,
+        "match_store": config.MATCH_STORE_PATH,
+        "npy_dir": config.CALCULATED_NPY_DIR,
+        "shared_snapshot_dir": config.SHARED_SNAPSHOT_DIR
+    }
+
+
+def group_paths(group_directory):
+    """A named group's files: the same file names as the default group, under its own raw/ and calculated/."""
+    raw_directory, calculated_directory = os.path.join(group_directory, 'raw'), os.path.join(group_directory, 'calculated')
+    return {
+        "match_data": os.path.join(raw_directory, 'match_data.csv'),
+        "player_keys": os.path.join(raw_directory, 'player_keys.csv'),
+        **{name: os.path.join(calculated_directory, os.path.basename(path)) for name, path in default_paths().items()
+           if name not in ('match_data', 'player_keys')}
+    }
+
+
+class Group:
+    def __init__(self, name, paths, figure_cache=None):
+        self.name = name
+        self.paths = paths # see default_paths()
+        self.dataset = SnapshotHolder() # what requests read, see app.publish_snapshot()
+        self.figure_cache = figure_cache or FigureCache(config.FIGURE_CACHE_SIZE)
+        self.players = player_directory.for_path(paths['player_keys']) # player id <-> name, re-read only when player_keys.csv changes
+
+        self.initialised = False
+        self.initialisation_errors = []
+        self.warm_up_timings = {}
+        self.warm_up_lock = threading.Lock()
+
+        # in WSGI mode (see wsgi.py) the snapshot is shared with the other worker processes through memory-mapped files
+        self.shared_snapshots = SharedSnapshotStore(paths['shared_snapshot_dir']) if config.SHARED_SNAPSHOT_ENABLED else None
+        self.shared_version = None # of the shared snapshot this process serves
+        self.shared_checked_at = 0.0
+        self.shared_snapshot_lock = threading.RLock() # held by the thread mapping a new shared snapshot or recalculating
+
+        # set up by create_stores()
+        self.calculated_storage = None
+        self.player_ratings = None
+        self.player_rolling_metrics = None
+        self.player_synergy = None
+        self.derived_artifacts = [] # stores built from the match data alongside the player stats, see raw_data_processing
+        self.match_id_index = None # Match IDs already uploaded, for append uploads
+        self.match_store = None # the SQLite match store, when config.MATCH_STORE_ENABLED
+
+        self.recalculation_worker = None # set by the app, see GroupRegistry
+
+    def create_stores(self):
+        """The calculated storage and derived artifacts for this group's files (nothing is read yet)."""
+        os.makedirs(os.path.dirname(self.paths['processing_state']), exist_ok=True)
+        self.calculated_storage = storage.get_storage(config.CALCULATED_STORAGE_BACKEND, self.paths['player_stats'], self.paths['player_form_dict'], self.paths['npy_dir'])
+        self.player_ratings = predictions.PlayerRatings(self.paths['player_ratings'])
+        self.player_rolling_metrics = rolling_metrics.PlayerRollingMetrics(self.paths['rolling_metrics'])
+        self.player_synergy = synergy.PlayerSynergy(self.paths['synergy'])
+        self.derived_artifacts = [self.player_ratings, self.player_rolling_metrics, self.player_synergy]
+        if config.MATCH_STORE_ENABLED:
+            self.match_store = sqlite_store.SqliteMatchStore(self.paths['match_store'])
+            self.derived_artifacts.append(self.match_store) # kept in step with match_data.csv like the other artifacts
+        self.match_id_index = ingest.MatchIdIndex(self.paths['match_data'])
+
+    def lock(self):
+        """
+        Held while calculating or appending to match_data, so one thread or process at a time does, whether it's
+        a request, a recalculation worker, another WSGI worker or a recalculate_group() job in a process pool.
+        """
+        if self.shared_snapshots is not None:
+            return self.shared_snapshots.lock()
+        return file_lock(os.path.join(os.path.dirname(self.paths['processing_state']), '.lock'))
+
+    def is_fresh(self):
+        return raw_data_processing.processing_state_is_fresh(self.paths['processing_state'], self.paths['match_data'], self.paths['player_keys'],
+                                                             self.calculated_storage, self.derived_artifacts)
+
+    def calculate(self, mode='incremental', player_stats_df=None, player_form=None):
+        """
+        Recalculate the player stats, form and derived artifacts from the raw files: only the new matches unless mode
+        is 'full' (or the incremental update can't be done). Returns (player_stats_df, player_form). Call with lock() held.
+        """
+        paths = self.paths
+        if mode == 'full':
+            return raw_data_processing.cs_player_stats_player_form(paths['match_data'], paths['match_count'], paths['player_keys'], paths['player_stats'], paths['player_form_dict'],
+                                                                   paths['processing_state'], self.calculated_storage, derived_artifacts=self.derived_artifacts)
+
+        return raw_data_processing.update_player_stats_player_form(paths['match_data'], paths['match_count'], paths['player_keys'], paths['player_stats'], paths['player_form_dict'],
+                                                                   paths['processing_state'], player_stats_df=player_stats_df, player_form=player_form,
+                                                                   calculated_storage=self.calculated_storage, derived_artifacts=self.derived_artifacts)
+
+
+def recalculate_group(name, paths, mode='incremental'):
+    """
+    One group's recalculation from its files, as a process pool job: everything it needs is rebuilt from name and
+    paths, and the results are only written to the group's calculated files. Returns the seconds it took.
+    """
+    start = time.perf_counter()
+    group = Group(name, paths)
+    group.create_stores()
+    with group.lock():
+        group.calculate(mode)
+    return round(time.perf_counter() - start, 4)
+
+
+class GroupRegistry:
+    """The default group plus every <groups_directory>/<name>/ with a raw/ directory, set up on first use."""
+
+    def __init__(self, groups_directory, default, setup=None):
+        self.groups_directory = groups_directory
+        self.default = default
+        self.setup = setup # called with each new Group, e.g. to give it a recalculation worker
+        self.groups = {}
+        self.lock = threading.Lock()
+        self.add(default)
+
+    def add(self, group):
+        if self.setup:
+            self.setup(group)
+        self.groups[group.name] = group
+        return group
+
+    def names(self):
+        """Every group's name, the default first (new group directories are picked up as they appear)."""
+        if not os.path.isdir(self.groups_directory):
+            return [self.default.name]
+        return [self.default.name] + sorted(name for name in os.listdir(self.groups_directory) if name != self.default.name and
+                                            GROUP_NAME_PATTERN.fullmatch(name) and os.path.isdir(os.path.join(self.groups_directory, name, 'raw')))
+
+    def get(self, name=None):
+        """The group called name (the default for None), or None if there is no such group."""
+        if name is None or name == self.default.name:
+            return self.default
+        if not GROUP_NAME_PATTERN.fullmatch(name):
+            return None
+
+        with self.lock:
+            group = self.groups.get(name)
+            if group is None and os.path.isdir(os.path.join(self.groups_directory, name, 'raw')):
+                group = self.add(Group(name, group_paths(os.path.join(self.groups_directory, name))))
+            return group
+
+    def all(self):
+        return [self.get(name) for name in self.names()]
@@ -0,0 +1,15 @@
+"""gunicorn settings for serving the app with several worker processes: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+
+os.environ.setdefault('SHARED_SNAPSHOT_ENABLED', '1') # before config is imported
+
+import config as app_config # gunicorn reads every module level name as a setting, and 'config' is one
+
+bind = app_config.WSGI_BIND
+workers = app_config.WSGI_WORKERS
+worker_class = 'gthread' # recalculations run on a background thread in whichever worker took the upload
+threads = app_config.WSGI_THREADS
+preload_app = True # wsgi.py warms up once in the master, workers are forked with the snapshot already mapped
+
+if all(os.path.exists(path) for path in app_config.SSL_CONTEXT):
+    certfile, keyfile = app_config.SSL_CONTEXT
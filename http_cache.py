@@ -0,0 +1,199 @@
+"""
+HTTP caching: strong ETags and Last-Modified from the calculated dataset, 304s and compressed responses.
+
+    @http_cache.conditional                        ETag from the dataset fingerprint, the build and the request
+    @http_cache.conditional(extra=job_status)      ... and anything else the page shows
+    @http_cache.conditional(uses_data=False)       pages that don't show the calculated data
+
+A conditional GET whose ETag still matches gets a 304 before the view runs, so nothing is rebuilt or sent. The
+fingerprint (see dataset_fingerprint) only changes when the data behind the pages does, and is the same in every
+worker process and across restarts. JSON, HTML and text responses are gzip (or brotli, if the optional brotli package
+is installed) compressed, and the compressed bytes are kept in a small LRU so a figure's json is only compressed once.
+"""
+import functools
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import config
+from instrumentation import timed
+
+try:
+    import brotli
+except ImportError: # optional, gzip is always available
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/csv', 'text/css', 'application/javascript'}
+
+
+def dataset_fingerprint(processing_state):
+    """Identifies the calculated data by the raw data it was calculated from, so it's the same in every process."""
+    if not processing_state:
+        return None
+    identity = [processing_state.get(key) for key in ['match_data_sha256', 'player_keys_sha256', 'match_count', 'storage']]
+    return hashlib.blake2b(repr(identity).encode(), digest_size=8).hexdigest()
+
+
+def files_fingerprint(paths):
+    """Hash of the files' contents, plus the newest modification time."""
+    digest = hashlib.blake2b(digest_size=8)
+    newest = 0.0
+    for path in paths:
+        with open(path, 'rb') as file:
+            digest.update(path.encode() + b'\0' + file.read())
+        newest = max(newest, os.path.getmtime(path))
+    return digest.hexdigest(), newest
+
+
+def build_files(root_path, *directories):
+    """What a deployment changes: the app's python modules (in root_path) and every file under directories."""
+    paths = sorted(os.path.join(root_path, file_name) for file_name in os.listdir(root_path) if file_name.endswith('.py'))
+    for directory in directories:
+        for root, _, file_names in sorted(os.walk(directory)):
+            paths.extend(os.path.join(root, file_name) for file_name in sorted(file_names))
+    return paths
+
+
+class HttpCache:
+    def __init__(self, maxsize=256, min_size=1024, level=6):
+        self.maxsize = maxsize # compressed bodies kept
+        self.min_size = min_size # smaller responses aren't worth compressing
+        self.level = level
+        self.validators = None # () -> (dataset fingerprint, last modified timestamp), set by init_app
+        self.build_id, self.build_time = None, 0.0
+        self.asset_versions = {}
+        self.compressed = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def init_app(self, app, validators):
+        """validators returns the current dataset's (fingerprint, last modified timestamp)."""
+        self.validators = validators
+        # the code, templates and static files go into every ETag, so a deployment doesn't serve stale responses
+        self.build_id, self.build_time = files_fingerprint(build_files(app.root_path, os.path.join(app.root_path, app.template_folder), app.static_folder))
+        app.jinja_env.globals['asset_version'] = self.asset_version
+        app.get_send_file_max_age = self.send_file_max_age
+        app.after_request(self.compress_response)
+
+    def send_file_max_age(self, file_name):
+        """
+        Static urls carry asset_version, so browsers can keep those files. Anything else sent as a file (the stats
+        exports) changes at the same url, so it gets no max-age and is revalidated like the pages are.
+        """
+        from flask import has_request_context, request
+
+        return config.STATIC_MAX_AGE if has_request_context() and request.endpoint == 'static' else None
+
+    def asset_version(self, file_name):
+        """Content hash of a static file, for its url (?v=...) so browsers only fetch it again when it changes."""
+        from flask import current_app
+
+        path = os.path.join(current_app.static_folder, file_name)
+        stamp = os.stat(path).st_mtime_ns
+        cached = self.asset_versions.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path, 'rb') as file:
+                cached = self.asset_versions[path] = (stamp, hashlib.blake2b(file.read(), digest_size=6).hexdigest())
+        return cached[1]
+
+    def accepted_encoding(self, request):
+        if brotli is not None and request.accept_encodings['br']:
+            return 'br'
+        if request.accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def conditional(self, view=None, *, extra=None, uses_data=True):
+        """
+        Serve a GET view with a strong ETag and Last-Modified, answering 304 without running it when the client's
+        copy is current. extra returns anything else the response depends on besides the data, build and url.
+        """
+        if view is None:
+            return functools.partial(self.conditional, extra=extra, uses_data=uses_data)
+
+        @functools.wraps(view)
+        def conditional_view(*args, **kwargs):
+            from flask import make_response, request
+
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            fingerprint, last_modified = self.validators() if uses_data else (None, self.build_time)
+            etag = hashlib.blake2b(repr((self.build_id, fingerprint, request.full_path, extra() if extra else None)).encode(), digest_size=12).hexdigest()
+            encoding = self.accepted_encoding(request)
+            last_modified = datetime.fromtimestamp(int(max(last_modified or 0, self.build_time)), timezone.utc)
+
+            # each encoding is a different representation with its own ETag (compress_response adds the suffix), any
+            # of them is still current if the content is
+            if request.if_none_match:
+                matched_etag = next((candidate for candidate in (f"{etag}-{encoding}", etag) if request.if_none_match.contains(candidate)), None)
+            elif request.if_modified_since is not None and last_modified <= request.if_modified_since:
+                matched_etag = f"{etag}-{encoding}" if encoding else etag
+            else:
+                matched_etag = None
+
+            if matched_etag:
+                response = make_response('', 304)
+                response.set_etag(matched_etag)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+
+            response.last_modified = last_modified
+            if response.cache_control.max_age is None:
+                response.cache_control.no_cache = True # keep it, but check back (a cheap 304) before using it
+            response.vary.add('Accept-Encoding')
+            return response
+
+        return conditional_view
+
+    @timed('http_cache.compress')
+    def compress(self, body, encoding):
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        with self.lock:
+            compressed = self.compressed.get(key)
+            if compressed is not None:
+                self.compressed.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+
+        compressed = brotli.compress(body, quality=5) if encoding == 'br' else gzip.compress(body, self.level, mtime=0)
+        with self.lock:
+            self.compressed[key] = compressed
+            while len(self.compressed) > self.maxsize:
+                self.compressed.popitem(last=False)
+        return compressed
+
+    def compress_response(self, response):
+        from flask import request
+
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = self.accepted_encoding(request)
+        if not encoding or response.status_code != 200 or response.content_length is None or response.content_length < self.min_size:
+            return response
+
+        etag, _ = response.get_etag()
+        response.set_data(self.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.compressed), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                    "brotli": brotli is not None}
+
+
+http_cache = HttpCache(config.COMPRESSED_CACHE_SIZE, config.COMPRESSION_MIN_BYTES, config.COMPRESSION_LEVEL)
@@ -0,0 +1,226 @@
+"""
+Streaming validation and ingest of uploaded csv files.
+
+The upload is read in chunks of config.UPLOAD_CHUNK_ROWS rows, every row is checked and the clean chunk is
+written to a temp file next to the target. Only once the whole file has passed is the temp file swapped in with
+os.replace, so a bad upload never leaves a half written match_data.csv behind and memory stays at one chunk.
+
+Appended matches go through the same checks, minus the rows whose Match ID is already in match_data.csv, and are
+added to the end of the file without rewriting what is already there.
+"""
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+import config
+from error_classes import UploadError
+from raw_data_processing import PLAYER_COLUMNS
+
+
+MATCH_DATA_COLUMNS = ['Match ID', *PLAYER_COLUMNS, 'Team 1 Goals', 'Team 2 Goals', 'Team 1 Result', 'Team 2 Result']
+PLAYER_KEYS_COLUMNS = ['player_name', 'player_id']
+MAX_REPORTED_ERRORS = 10
+
+
+def check_headers(chunk, required_headers):
+    chunk = chunk.loc[:, chunk.columns.str.strip() != '']
+    if list(chunk.columns) != required_headers:
+        raise UploadError(f"The column headers in your CSV file do not match the expected column headers: {required_headers}")
+
+    return chunk
+
+
+def integer_values(chunk, columns):
+    """The columns as an int64 array, with a mask of the rows where any of them isn't a whole number."""
+    values = chunk[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    invalid = np.isnan(values).any(axis=1) | (values % 1 != 0).any(axis=1)
+
+    return np.nan_to_num(values).astype(np.int64), invalid
+
+
+def row_errors(chunk, invalid, message):
+    """Messages for the rows flagged in invalid, numbered as csv lines (read_csv chunks keep counting rows, the header is line 1)."""
+    return [f"Line {row + 2}: {message}" for row in chunk.index[invalid][:MAX_REPORTED_ERRORS].tolist()]
+
+
+def validate_match_data_chunk(chunk, previous_match_id):
+    """Check a chunk of match_data rows and return it with clean dtypes, raising UploadError for bad rows."""
+    match_ids, bad_match_ids = integer_values(chunk, ['Match ID'])
+    player_ids, bad_player_ids = integer_values(chunk, PLAYER_COLUMNS)
+    goals, bad_goals = integer_values(chunk, ['Team 1 Goals', 'Team 2 Goals'])
+    results = chunk[['Team 1 Result', 'Team 2 Result']].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    match_ids = match_ids[:, 0]
+
+    bad_match_ids |= match_ids <= 0
+    bad_player_ids |= (player_ids < 0).any(axis=1)
+    bad_goals |= (goals < 0).any(axis=1)
+    bad_results = ~np.isin(results, [0.0, 0.5, 1.0]).all(axis=1) | (results.sum(axis=1) != 1.0)
+    expected_result = (np.sign(goals[:, 0] - goals[:, 1]) + 1) / 2 # 1.0 for a Team 1 win, 0.5 for a draw, 0.0 for a loss
+    inconsistent = ~bad_goals & ~bad_results & (expected_result != results[:, 0])
+    not_increasing = ~bad_match_ids & (match_ids <= np.r_[previous_match_id, match_ids[:-1]])
+
+    errors = (row_errors(chunk, bad_match_ids, "Match ID must be a positive whole number")
+              + row_errors(chunk, bad_player_ids, "player ids must be whole numbers (0 for an empty slot)")
+              + row_errors(chunk, bad_goals, "goals must be non-negative whole numbers")
+              + row_errors(chunk, bad_results, "results must be 1.0, 0.5 or 0.0 and add up to 1")
+              + row_errors(chunk, inconsistent, "results don't match the score")
+              + row_errors(chunk, not_increasing, "Match IDs must be unique and increasing"))
+    if errors:
+        raise UploadError("; ".join(errors[:MAX_REPORTED_ERRORS]))
+
+    clean_chunk = pd.DataFrame(np.c_[match_ids, player_ids, goals], columns=MATCH_DATA_COLUMNS[:-2], index=chunk.index)
+    clean_chunk[['Team 1 Result', 'Team 2 Result']] = results
+    return clean_chunk, int(match_ids[-1])
+
+
+def validate_player_keys_chunk(chunk, seen_player_ids):
+    """Check a chunk of player_keys rows, raising UploadError for bad rows. seen_player_ids is updated in place."""
+    player_ids, bad_player_ids = integer_values(chunk, ['player_id'])
+    player_ids = player_ids[:, 0]
+    bad_player_ids |= player_ids <= 0
+    missing_names = chunk['player_name'].isna().to_numpy() | (chunk['player_name'].astype(str).str.strip() == '').to_numpy()
+    duplicates = ~bad_player_ids & (pd.Series(player_ids).duplicated().to_numpy() | np.isin(player_ids, list(seen_player_ids)))
+
+    errors = (row_errors(chunk, bad_player_ids, "player_id must be a positive whole number")
+              + row_errors(chunk, missing_names, "player_name is empty")
+              + row_errors(chunk, duplicates, "player_id is used more than once"))
+    if errors:
+        raise UploadError("; ".join(errors[:MAX_REPORTED_ERRORS]))
+
+    seen_player_ids.update(player_ids.tolist())
+    return chunk.assign(player_id=player_ids)
+
+
+def ingest_csv(file, file_type, target_path, chunk_rows=None):
+    """
+    Validate the uploaded csv chunk by chunk into a temp file and atomically replace target_path with it.
+    Returns the number of rows written, raising UploadError if any row is invalid (target_path is left untouched).
+    """
+    if file_type == 'match_data':
+        required_headers = MATCH_DATA_COLUMNS
+    elif file_type == 'player_keys':
+        required_headers = PLAYER_KEYS_COLUMNS
+    else:
+        raise UploadError(f"Unknown file type: {file_type}")
+
+    temp_path = f"{target_path}.upload.tmp"
+    n_rows, previous_match_id, seen_player_ids = 0, 0, set()
+    try:
+        with open(temp_path, 'w', newline='') as temp_file:
+            for chunk in pd.read_csv(file, chunksize=chunk_rows or config.UPLOAD_CHUNK_ROWS):
+                chunk = check_headers(chunk, required_headers)
+
+                if file_type == 'match_data':
+                    chunk, previous_match_id = validate_match_data_chunk(chunk, previous_match_id)
+                else:
+                    chunk = validate_player_keys_chunk(chunk, seen_player_ids)
+
+                chunk.to_csv(temp_file, index=False, header=n_rows == 0)
+                n_rows += len(chunk)
+
+        if n_rows == 0:
+            raise UploadError("The uploaded file has no rows")
+
+        os.replace(temp_path, target_path)
+        return n_rows
+
+    except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+        raise UploadError(f"The uploaded file could not be read as a csv: {e}")
+
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class MatchIdIndex:
+    """The Match IDs in match_data.csv, kept in memory and only re-read when the file was changed by something else."""
+
+    def __init__(self, match_data_path):
+        self.match_data_path = match_data_path
+        self.match_ids = None # sorted
+        self.file_stamp = None
+        self.lock = threading.Lock()
+
+    def stamp(self):
+        if not os.path.exists(self.match_data_path):
+            return None
+        file_stat = os.stat(self.match_data_path)
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+    def load(self):
+        file_stamp = self.stamp()
+        if self.match_ids is None or file_stamp != self.file_stamp:
+            if file_stamp and file_stamp[0] > 0:
+                self.match_ids = np.sort(pd.read_csv(self.match_data_path, usecols=['Match ID'])['Match ID'].to_numpy(dtype=np.int64))
+            else:
+                self.match_ids = np.empty(0, dtype=np.int64)
+            self.file_stamp = file_stamp
+
+        return self.match_ids
+
+    def add(self, new_match_ids):
+        """Record match ids just appended to the file (all larger than the ones already there)."""
+        self.match_ids = np.concatenate([self.match_ids, new_match_ids])
+        self.file_stamp = self.stamp()
+
+
+def append_match_data(file, match_data_path, match_id_index, chunk_rows=None):
+    """
+    Append the matches in the uploaded csv that aren't in match_data.csv yet. New Match IDs have to come after
+    the last existing one, so the file stays in match order and the incremental processing only sees new bytes.
+    Returns (rows_added, duplicates_skipped), raising UploadError (with match_data.csv untouched) for bad rows.
+    """
+    with match_id_index.lock:
+        existing_match_ids = match_id_index.load()
+        original_size = match_id_index.file_stamp[0] if match_id_index.file_stamp else 0
+
+        temp_path = f"{match_data_path}.append.tmp"
+        new_match_ids, n_duplicates = [], 0
+        previous_match_id = int(existing_match_ids[-1]) if len(existing_match_ids) else 0
+        try:
+            with open(temp_path, 'w', newline='') as temp_file:
+                for chunk in pd.read_csv(file, chunksize=chunk_rows or config.UPLOAD_CHUNK_ROWS):
+                    chunk = check_headers(chunk, MATCH_DATA_COLUMNS)
+
+                    duplicate = np.isin(pd.to_numeric(chunk['Match ID'], errors='coerce'), existing_match_ids)
+                    n_duplicates += int(duplicate.sum())
+                    chunk = chunk[~duplicate]
+                    if chunk.empty:
+                        continue
+
+                    chunk, previous_match_id = validate_match_data_chunk(chunk, previous_match_id)
+                    chunk.to_csv(temp_file, index=False, header=original_size == 0 and not new_match_ids)
+                    new_match_ids.append(chunk['Match ID'].to_numpy(dtype=np.int64))
+
+            if new_match_ids:
+                append_file(temp_path, match_data_path, original_size)
+                match_id_index.add(np.concatenate(new_match_ids))
+
+        except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+            raise UploadError(f"The uploaded file could not be read as a csv: {e}")
+
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return sum(len(match_ids) for match_ids in new_match_ids), n_duplicates
+
+
+def append_file(source_path, target_path, original_size):
+    """Copy source_path onto the end of target_path, cutting target_path back to original_size if that fails part way."""
+    with open(target_path, 'ab') as target_file:
+        try:
+            if original_size:
+                with open(target_path, 'rb') as existing_file:
+                    existing_file.seek(original_size - 1)
+                    if existing_file.read(1) != b'\n':
+                        target_file.write(b'\n')
+
+            with open(source_path, 'rb') as source_file:
+                shutil.copyfileobj(source_file, target_file)
+        except OSError:
+            target_file.truncate(original_size)
+            raise
@@ -0,0 +1,150 @@
+"""
+Timing instrumentation, served as Prometheus text from /metrics.
+
+    @timed('raw_data_processing.process_match_data')    time every call of a function
+    with timed('data_visualisations.to_json'):          time a block
+
+Durations go into histograms (config.METRICS_BUCKETS) labelled by name, and init_app() adds per-route latency and
+the opt-in cProfile mode: with config.PROFILING_ENABLED, a request with ?profile=1 has its profile saved to
+config.PROFILE_DIR. With config.INSTRUMENTATION_ENABLED off, timed() hands functions back undecorated and the
+request hooks aren't installed, so there is nothing left to pay for.
+"""
+import bisect
+import cProfile
+import functools
+import os
+import threading
+import time
+
+import config
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.histograms = {} # (metric name, sorted label items) -> Histogram
+        self.lock = threading.Lock()
+
+    def observe(self, metric, labels, value):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render(self):
+        """Every histogram in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for metric in sorted({metric for metric, _ in self.histograms}):
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+
+                for (histogram_metric, labels), histogram in sorted(self.histograms.items()):
+                    if histogram_metric != metric:
+                        continue
+                    label_text = ",".join(f'{name}="{value}"' for name, value in labels)
+
+                    cumulative = 0
+                    for bucket, count in zip([*map(repr, self.buckets), '+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{label_text},le="{bucket}"}} {cumulative}')
+                    lines.append(f"{metric}_sum{{{label_text}}} {histogram.total!r}")
+                    lines.append(f"{metric}_count{{{label_text}}} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+METRIC_HELP = {
+    "function_duration_seconds": "Time spent in instrumented functions and blocks.",
+    "request_duration_seconds": "Time to serve a request, by endpoint, method and status."
+}
+
+metrics = MetricsRegistry(config.METRICS_BUCKETS)
+
+
+class Timer:
+    """Decorator or context manager recording the duration under function_duration_seconds{function=name}."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __call__(self, function):
+        if not config.INSTRUMENTATION_ENABLED:
+            return function
+
+        name = self.name
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.observe("function_duration_seconds", {"function": name}, time.perf_counter() - start)
+
+        return timed_function
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if config.INSTRUMENTATION_ENABLED:
+            metrics.observe("function_duration_seconds", {"function": self.name}, time.perf_counter() - self.start)
+        return False
+
+
+def timed(name):
+    return Timer(name)
+
+
+def init_app(app):
+    """Install the per-request latency and profiling hooks. Call before any other before_request hook is registered."""
+    from flask import g, request
+
+    if not config.INSTRUMENTATION_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.profiler = None
+        if config.PROFILING_ENABLED and request.args.get('profile'):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request_duration(response):
+        if getattr(g, 'profiler', None) is not None:
+            g.profiler.disable()
+            os.makedirs(config.PROFILE_DIR, exist_ok=True)
+            profile_path = os.path.join(config.PROFILE_DIR, f"{request.endpoint or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns()}.prof")
+            g.profiler.dump_stats(profile_path)
+            g.profiler = None
+            response.headers['X-Profile'] = os.path.basename(profile_path)
+
+        if hasattr(g, 'request_start'):
+            metrics.observe("request_duration_seconds",
+                            {"endpoint": request.endpoint or "unknown", "method": request.method, "status": str(response.status_code)},
+                            time.perf_counter() - g.request_start)
+        return response
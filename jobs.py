@@ -0,0 +1,92 @@
+"""
+Background recalculation jobs.
+
+Jobs run one at a time on a single worker thread so requests aren't blocked by a rebuild. Triggers that arrive
+while a job is still waiting to start are folded into it (a full rebuild wins over an incremental one), so a
+burst of uploads or clicks costs one recalculation rather than one each.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RecalculationJob:
+    def __init__(self, job_id, mode):
+        self.job_id = job_id
+        self.mode = mode
+        self.status = "queued"
+        self.error = None
+        self.triggers = 1
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "mode": self.mode,
+            "status": self.status,
+            "error": self.error,
+            "triggers": self.triggers,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class RecalculationWorker:
+    def __init__(self, recalculate, debounce_seconds=0.0, history_size=50):
+        self.recalculate = recalculate # called with the job's mode on the worker thread
+        self.debounce_seconds = debounce_seconds
+        self.history_size = history_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recalculation")
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+        self.jobs = OrderedDict()
+        self.pending = None
+
+    def submit(self, mode='incremental'):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.triggers += 1
+                if mode == 'full':
+                    self.pending.mode = 'full'
+                return self.pending
+
+            job = RecalculationJob(next(self.job_ids), mode)
+            self.pending = job
+            self.jobs[job.job_id] = job
+            while len(self.jobs) > self.history_size:
+                self.jobs.popitem(last=False)
+
+        self.executor.submit(self.run, job)
+        return job
+
+    def run(self, job):
+        if self.debounce_seconds:
+            time.sleep(self.debounce_seconds) # triggers during this wait fold into this job
+
+        with self.lock:
+            if self.pending is job:
+                self.pending = None
+            job.status = "running"
+            job.started_at = time.time()
+
+        try:
+            self.recalculate(job.mode)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def wait(self, timeout=None):
+        """Block until every job submitted so far has finished (used at shutdown and in scripts)."""
+        self.executor.submit(lambda: None).result(timeout)
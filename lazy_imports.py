@@ -0,0 +1,32 @@
+"""
+Deferred imports for the heavy libraries (pandas, numpy, plotly) and the modules built on them.
+
+lazy_import returns the module object straight away but only runs the module's code on first attribute access,
+so importing app.py doesn't pay for libraries a request may never use.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(module_name):
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.find_spec(module_name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    loader.exec_module(module)
+
+    return module
+
+
+def load_now(*modules):
+    """
+    Run lazily imported modules' code straight away. LazyLoader isn't thread safe before Python 3.12: a thread that
+    touches a module while another is still running its code can find attributes missing, so app.warm_up() loads
+    everything up front rather than leaving it to the first requests, which may arrive together.
+    """
+    for module in modules:
+        getattr(module, '__name__')
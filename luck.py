@@ -0,0 +1,99 @@
+"""
+Is a low win % underperformance or bad luck? Confidence intervals and a luck z-score for every player's win %.
+
+    win_pct_ci_low, win_pct_ci_high   bootstrap interval of the win % (config.LUCK_CONFIDENCE_LEVEL)
+    luck_z                            standard deviations the wins are from what a fair coin at the league's win rate gives
+
+The teams are picked to be even, so over enough matches every player should win about as often as the league as a
+whole does (a little under 50%, draws aside). A |luck_z| under about 2 is within what luck alone explains; a player
+well below -2 keeps ending up on the losing side more than chance would have it.
+
+Resampling a player's n results with replacement gives Binomial(n, wins / n) wins, so every resample of every player is
+drawn in one batched binomial call over a players x resamples matrix (a chunk of players at a time), with no loop per
+player. The draws are seeded, so every process gets the same intervals for the same data, and the columns are cached
+by the dataset fingerprint so publishing the same data again doesn't resample it.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+from instrumentation import timed
+
+
+LUCK_COLUMNS = ['win_pct_ci_low', 'win_pct_ci_high', 'luck_z']
+MAX_CHUNK_DRAWS = 4_000_000 # players x resamples drawn at once, bounding the memory of a very large roster
+
+
+def bootstrap_win_pct_intervals(total_matches, total_wins, resamples=config.LUCK_BOOTSTRAP_RESAMPLES, confidence_level=config.LUCK_CONFIDENCE_LEVEL,
+                                seed=config.LUCK_RANDOM_SEED):
+    """(low, high) win % of every player, the percentile bootstrap interval from resamples draws per player."""
+    total_matches = np.asarray(total_matches, dtype=np.int64)
+    win_rates = np.asarray(total_wins, dtype=np.float64) / np.maximum(total_matches, 1)
+    quantiles = [(1 - confidence_level) / 2, (1 + confidence_level) / 2]
+    rng = np.random.default_rng(seed)
+
+    intervals = np.empty((len(total_matches), 2))
+    chunk_players = max(MAX_CHUNK_DRAWS // resamples, 1)
+    for start in range(0, len(total_matches), chunk_players):
+        matches, rates = total_matches[start:start + chunk_players, None], win_rates[start:start + chunk_players, None]
+        resampled_wins = rng.binomial(matches, rates, size=(len(matches), resamples))
+        intervals[start:start + chunk_players] = np.quantile(resampled_wins, quantiles, axis=1).T / np.maximum(matches, 1) * 100
+
+    return intervals[:, 0], intervals[:, 1]
+
+
+def luck_z_scores(total_matches, total_wins):
+    """(wins - expected wins) / standard deviation, for wins ~ Binomial(matches, the league's win rate)."""
+    total_matches = np.asarray(total_matches, dtype=np.float64)
+    total_wins = np.asarray(total_wins, dtype=np.float64)
+    league_win_rate = total_wins.sum() / total_matches.sum() if total_matches.sum() else 0.0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = (total_wins - total_matches * league_win_rate) / np.sqrt(total_matches * league_win_rate * (1 - league_win_rate))
+    return np.where(np.isfinite(z_scores), z_scores, 0.0)
+
+
+@timed('luck.luck_columns')
+def luck_columns(player_stats_df):
+    """{column: values} of LUCK_COLUMNS for player_stats_df's rows, rounded like the other percentages."""
+    if player_stats_df.empty: # no matches yet (the frame may not even have the stats columns)
+        return {column: np.empty(0) for column in LUCK_COLUMNS}
+    total_matches, total_wins = player_stats_df['total_matches'].to_numpy(), player_stats_df['total_wins'].to_numpy()
+    ci_low, ci_high = bootstrap_win_pct_intervals(total_matches, total_wins)
+    return {
+        "win_pct_ci_low": np.round(ci_low, 1),
+        "win_pct_ci_high": np.round(ci_high, 1),
+        "luck_z": np.round(luck_z_scores(total_matches, total_wins), 2)
+    }
+
+
+class LuckCache:
+    """The luck columns of the last few datasets, by dataset fingerprint (see http_cache.dataset_fingerprint)."""
+
+    def __init__(self, maxsize=config.LUCK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.columns = OrderedDict()
+        self.lock = threading.Lock()
+
+    def with_luck_columns(self, player_stats_df, fingerprint=None):
+        """player_stats_df plus LUCK_COLUMNS, resampled only the first time this fingerprint's data is seen."""
+        key = (fingerprint, len(player_stats_df))
+        with self.lock:
+            columns = self.columns.get(key) if fingerprint else None
+            if columns is not None:
+                self.columns.move_to_end(key)
+
+        if columns is None:
+            columns = luck_columns(player_stats_df)
+            if fingerprint:
+                with self.lock:
+                    self.columns[key] = columns
+                    while len(self.columns) > self.maxsize:
+                        self.columns.popitem(last=False)
+
+        return player_stats_df.assign(**columns)
+
+
+luck_cache = LuckCache()
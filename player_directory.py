@@ -0,0 +1,132 @@
+"""
+player_id <-> player_name from player_keys.csv, read once and kept in memory.
+
+Every lookup checks the file's size and modification time (one stat), and the file is only read again when it has
+changed, e.g. after a player_keys upload. The routes and raw_data_processing share one directory per path
+(for_path()), so a page and the stats calculated for it see the same names.
+
+Name search is for the player pickers: prefix matches on any word of a name come from a sorted list of name words
+(bisect, no scan of the roster), then close misspellings (difflib) fill up the rest.
+"""
+import bisect
+import difflib
+import os
+import re
+import threading
+
+from lazy_imports import lazy_import
+pd = lazy_import('pandas') # app.py imports this module before warm_up() loads pandas
+
+
+FUZZY_CUTOFF = 0.6 # difflib similarity a misspelt name needs to be suggested
+SEARCH_LIMIT = 10
+
+
+def name_words(player_name):
+    """Lowercase words of a name, plus the whole name so multi word prefixes match too."""
+    lower_name = player_name.strip().lower()
+    return {lower_name, *re.findall(r'\w+', lower_name)}
+
+
+class PlayerIndex:
+    """One read of player_keys.csv. Never changed after it's built, a changed file gives a new PlayerIndex."""
+
+    def __init__(self, player_keys, file_stamp=None):
+        self.file_stamp = file_stamp
+        self.frame = player_keys[['player_name', 'player_id']] # what name_player_stats merges
+        self.names = dict(zip(player_keys['player_id'].tolist(), player_keys['player_name'].tolist()))
+        self.ids = {}
+        self.words = [] # sorted (word, player_id)
+        for player_id, player_name in self.names.items():
+            if not isinstance(player_name, str): # a missing name is NaN
+                continue
+            self.ids.setdefault(player_name.strip().lower(), []).append(player_id)
+            self.words.extend((word, player_id) for word in name_words(player_name))
+        self.words.sort()
+
+    @classmethod
+    def empty(cls, file_stamp=None):
+        return cls(pd.DataFrame({'player_name': pd.Series(dtype=object), 'player_id': pd.Series(dtype='int64')}), file_stamp)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, player_id):
+        return player_id in self.names
+
+    def name(self, player_id, default=None):
+        return self.names.get(player_id, default)
+
+    def player_ids(self, player_name):
+        """Ids of the players with exactly this name (ignoring case)."""
+        return self.ids.get(player_name.strip().lower(), [])
+
+    def players(self):
+        """Every player as [{"player_id", "player_name"}], in file order (a missing name is None)."""
+        return [{"player_id": player_id, "player_name": player_name if isinstance(player_name, str) else None}
+                for player_id, player_name in self.names.items()]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Players whose name, or a word of it, starts with query (ignoring case), then close matches for typos, as
+        [{"player_id", "player_name"}] in that order.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        matched = {} # player_id -> rank, dicts keep insertion order
+        start = bisect.bisect_left(self.words, (query,))
+        for word, player_id in self.words[start:]:
+            if not word.startswith(query):
+                break
+            matched.setdefault(player_id, (word != query, self.names[player_id].lower()))
+        player_ids = sorted(matched, key=matched.get) # exact words first, then alphabetical
+
+        if len(player_ids) < limit:
+            for close_name in difflib.get_close_matches(query, list(self.ids), n=limit, cutoff=FUZZY_CUTOFF):
+                player_ids.extend(player_id for player_id in self.ids[close_name] if player_id not in matched)
+
+        return [{"player_id": player_id, "player_name": self.names[player_id]} for player_id in player_ids[:limit]]
+
+
+class PlayerDirectory:
+    """The current PlayerIndex of a player_keys.csv, re-read only when the file changes."""
+
+    def __init__(self, player_keys_path):
+        self.player_keys_path = player_keys_path
+        self.index = None
+        self.lock = threading.Lock()
+
+    def stamp(self):
+        if not os.path.exists(self.player_keys_path):
+            return None
+        file_stat = os.stat(self.player_keys_path)
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+    def get(self):
+        file_stamp = self.stamp()
+        index = self.index
+        if index is not None and index.file_stamp == file_stamp:
+            return index
+
+        with self.lock: # one thread reads the file, the others wait for its index
+            if self.index is None or self.index.file_stamp != file_stamp:
+                if file_stamp and file_stamp[0] > 0:
+                    self.index = PlayerIndex(pd.read_csv(self.player_keys_path), file_stamp)
+                else:
+                    self.index = PlayerIndex.empty(file_stamp)
+            return self.index
+
+
+directories = {}
+directories_lock = threading.Lock()
+
+
+def for_path(player_keys_path):
+    """The PlayerDirectory shared by everything in this process that reads player_keys_path."""
+    player_keys_path = os.path.abspath(player_keys_path)
+    with directories_lock:
+        if player_keys_path not in directories:
+            directories[player_keys_path] = PlayerDirectory(player_keys_path)
+        return directories[player_keys_path]
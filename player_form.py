@@ -0,0 +1,136 @@
+"""
+Array backed player form history.
+
+Each player's results are one contiguous, match id sorted segment of two flat arrays (int32 match ids and int8
+result codes), with offsets marking where each player's segment starts. The last n matches of a player are then
+a slice of those arrays, with no sorting or string parsing per request.
+"""
+import numpy as np
+
+
+LOSS, DRAW, WIN, UNKNOWN = 0, 1, 2, -1
+RESULT_VALUES = {LOSS: 0.0, DRAW: 0.5, WIN: 1.0}
+RESULT_LABELS = np.array(["0.0", "0.5", "1.0", "nan"]) # indexed by result code, so UNKNOWN (-1) maps to "nan"
+RESULT_NAMES = {LOSS: "Loss", DRAW: "Draw", WIN: "Win"}
+
+
+def result_codes(results):
+    """Convert float results (1.0 win, 0.5 draw, 0.0 loss) into int8 result codes."""
+    results = np.asarray(results, dtype=np.float64)
+    codes = np.full(len(results), UNKNOWN, dtype=np.int8)
+    for code, value in RESULT_VALUES.items():
+        codes[results == value] = code
+
+    return codes
+
+
+class PlayerForm:
+    def __init__(self, player_ids, offsets, match_ids, result_codes):
+        self.player_ids = np.asarray(player_ids, dtype=np.int64) # in order of first appearance
+        self.offsets = np.asarray(offsets, dtype=np.int64) # player i's results are [offsets[i], offsets[i + 1])
+        self.match_ids = match_ids
+        self.result_codes = result_codes
+        self.index = {player_id: position for position, player_id in enumerate(self.player_ids.tolist())}
+
+    @classmethod
+    def empty(cls):
+        return cls([], [0], np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int8))
+
+    @classmethod
+    def from_arrays(cls, player_ids, match_ids, result_codes):
+        """Build from flat per-result arrays that are already grouped by player and sorted by match id within each player."""
+        if len(player_ids) == 0:
+            return cls.empty()
+
+        player_ids = np.asarray(player_ids)
+        segment_starts = np.flatnonzero(np.r_[True, player_ids[1:] != player_ids[:-1]])
+        offsets = np.r_[segment_starts, len(player_ids)]
+
+        return cls(player_ids[segment_starts], offsets, match_ids, result_codes)
+
+    @classmethod
+    def from_records(cls, player_ids, match_ids, codes, previous=None):
+        """
+        Build from unordered (player_id, match_id, result code) records, optionally merged on top of a previous
+        PlayerForm. Players keep their order of first appearance and a later record for the same player and match wins.
+        """
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        match_ids = np.asarray(match_ids, dtype=np.int32)
+        codes = np.asarray(codes, dtype=np.int8)
+
+        if previous is not None and len(previous.player_ids):
+            previous_player_ids, previous_match_ids, previous_codes = previous.to_arrays()
+            player_ids = np.concatenate([previous_player_ids, player_ids])
+            match_ids = np.concatenate([previous_match_ids, match_ids])
+            codes = np.concatenate([previous_codes, codes])
+
+        if len(player_ids) == 0:
+            return cls.empty()
+
+        unique_player_ids, first_seen, inverse = np.unique(player_ids, return_index=True, return_inverse=True)
+        appearance_rank = np.empty(len(unique_player_ids), dtype=np.int64)
+        appearance_rank[np.argsort(first_seen)] = np.arange(len(unique_player_ids))
+        player_rank = appearance_rank[inverse]
+
+        order = np.lexsort((match_ids, player_rank)) # stable, so duplicates stay in record order
+        player_rank, match_ids, codes = player_rank[order], match_ids[order], codes[order]
+
+        is_last = np.r_[(player_rank[1:] != player_rank[:-1]) | (match_ids[1:] != match_ids[:-1]), True]
+        player_rank, match_ids, codes = player_rank[is_last], match_ids[is_last], codes[is_last]
+
+        return cls.from_arrays(unique_player_ids[np.argsort(first_seen)][player_rank], match_ids, codes)
+
+    @classmethod
+    def from_dict(cls, player_form_dict):
+        """Build from the {player_id: {match_id: "1.0"}} shape of player_form_dict.json."""
+        label_codes = {label: code for code, label in enumerate(RESULT_LABELS[:3].tolist())}
+
+        n_results = sum(len(player_results) for player_results in player_form_dict.values())
+        player_ids = np.empty(n_results, dtype=np.int64)
+        match_ids = np.empty(n_results, dtype=np.int32)
+        codes = np.empty(n_results, dtype=np.int8)
+
+        position = 0
+        for player_id, player_results in player_form_dict.items():
+            n_player_results = len(player_results)
+            player_ids[position:position + n_player_results] = int(player_id)
+            match_ids[position:position + n_player_results] = np.fromiter(map(int, player_results.keys()), dtype=np.int32, count=n_player_results)
+            codes[position:position + n_player_results] = [label_codes.get(result, UNKNOWN) for result in player_results.values()]
+            position += n_player_results
+
+        return cls.from_records(player_ids, match_ids, codes)
+
+    def to_arrays(self):
+        """Flat (player_id, match_id, result code) arrays, grouped by player."""
+        return np.repeat(self.player_ids, np.diff(self.offsets)).astype(np.int32), self.match_ids, self.result_codes
+
+    def to_dict(self):
+        """Convert back to the {player_id: {match_id: "1.0"}} shape of player_form_dict.json."""
+        match_labels = np.asarray(self.match_ids).astype(str).tolist()
+        result_labels = RESULT_LABELS[np.asarray(self.result_codes)].tolist()
+        bounds = self.offsets.tolist()
+
+        return {str(player_id): dict(zip(match_labels[start:end], result_labels[start:end]))
+                for player_id, start, end in zip(self.player_ids.tolist(), bounds[:-1], bounds[1:])}
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def __contains__(self, player_id):
+        return int(player_id) in self.index
+
+    def history(self, player_id):
+        """(match_ids, result_codes) for every match the player played, oldest first."""
+        return self.last_n(player_id, None)
+
+    def last_n(self, player_id, n):
+        """(match_ids, result_codes) for the player's last n matches, oldest first. Slices, so O(1)."""
+        position = self.index.get(int(player_id))
+        if position is None:
+            return self.match_ids[:0], self.result_codes[:0]
+
+        start, end = self.offsets[position], self.offsets[position + 1]
+        if n is not None:
+            start = max(start, end - n)
+
+        return self.match_ids[start:end], self.result_codes[start:end]
@@ -0,0 +1,226 @@
+"""
+Score predictions from per-player ratings.
+
+Each match is one row of a least-squares problem: +1 for every Team 1 player, -1 for every Team 2 player and the
+player advantage (Team 1 size - Team 2 size), fitted to the goal difference. The normal equations (X'X and X'y)
+plus a few running totals are kept as the stored artifact, so new matches are added to them without refitting
+from scratch, and the ratings are one small ridge solve away.
+"""
+import itertools
+import math
+import os
+import time
+from functools import lru_cache
+
+import numpy as np
+
+import config
+from raw_data_processing import PLAYER_COLUMNS, TEAM_SIZE
+
+
+FIT_CHUNK_BYTES = 64 * 1024 * 1024 # size of each dense design matrix chunk, its rows are matches and columns players
+SPLIT_BATCH_SIZE = 2048 # team splits scored per batch when balancing teams
+TEAM_SIGNS = np.repeat([1.0, -1.0], TEAM_SIZE)
+
+
+def normal_cdf(x):
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+@lru_cache(maxsize=None)
+def split_masks(n_players):
+    """
+    Every way of splitting n_players into two teams as a (n_splits, n_players) boolean matrix, True for Team A.
+    For an even pool the first player is always in Team A so mirrored splits aren't scored twice.
+    """
+    team_a_size = n_players // 2
+    if n_players % 2 == 0 and n_players > 0:
+        combinations = [(0,) + combination for combination in itertools.combinations(range(1, n_players), team_a_size - 1)]
+    else:
+        combinations = list(itertools.combinations(range(n_players), team_a_size))
+
+    masks = np.zeros((len(combinations), n_players), dtype=bool)
+    masks[np.repeat(np.arange(len(combinations)), team_a_size), np.asarray(combinations, dtype=np.int64).ravel()] = True
+    masks.setflags(write=False)
+    return masks
+
+
+def split_goal_differences(masks, ratings, player_advantage):
+    """Predicted goal difference (Team A - Team B) of every split in masks, in one matrix product."""
+    team_a_sizes = masks.sum(axis=1)
+    return masks @ (2 * ratings) - ratings.sum() + player_advantage * (2 * team_a_sizes - masks.shape[1])
+
+
+class RatingModel:
+    def __init__(self, player_ids=None, gram=None, target=None, totals=None, regularisation=config.RATING_REGULARISATION):
+        self.player_ids = np.asarray(player_ids if player_ids is not None else [], dtype=np.int64) # sorted
+        n_features = len(self.player_ids) + 1 # feature 0 is the player advantage
+        self.gram = gram if gram is not None else np.zeros((n_features, n_features)) # X'X
+        self.target = target if target is not None else np.zeros(n_features) # X'y
+        self.totals = totals if totals is not None else {"n_matches": 0, "sum_sq_goal_diff": 0.0, "sum_total_goals": 0.0, "match_count": 0}
+        self.regularisation = regularisation
+        self.solve()
+
+    def solve(self):
+        penalty = np.full(len(self.target), float(self.regularisation))
+        penalty[0] = 1e-9 # the player advantage is barely shrunk, just enough to stay solvable when every match had equal teams
+
+        weights = np.linalg.solve(self.gram + np.diag(penalty), self.target)
+        self.player_advantage = float(weights[0])
+        self.ratings = dict(zip(self.player_ids.tolist(), weights[1:].tolist()))
+
+        n_matches = self.totals["n_matches"]
+        residual_sum_sq = self.totals["sum_sq_goal_diff"] - 2 * weights @ self.target + weights @ self.gram @ weights
+        self.sigma = max(math.sqrt(max(residual_sum_sq, 0) / n_matches), 1.0) if n_matches else config.RATING_DEFAULT_SIGMA
+        self.mean_total_goals = self.totals["sum_total_goals"] / n_matches if n_matches else 0.0
+
+    def add_players(self, player_ids):
+        """Grow X'X and X'y with zero rows/columns for players seen for the first time."""
+        all_player_ids = np.union1d(self.player_ids, player_ids)
+        if len(all_player_ids) == len(self.player_ids):
+            return
+
+        positions = np.r_[0, np.searchsorted(all_player_ids, self.player_ids) + 1]
+        gram = np.zeros((len(all_player_ids) + 1, len(all_player_ids) + 1))
+        target = np.zeros(len(all_player_ids) + 1)
+        gram[np.ix_(positions, positions)] = self.gram
+        target[positions] = self.target
+
+        self.player_ids, self.gram, self.target = all_player_ids, gram, target
+
+    def partial_fit(self, match_data):
+        """Add the matches in match_data (raw match_data.csv rows) to the fit."""
+        if match_data.empty:
+            return self
+
+        player_slots = match_data[PLAYER_COLUMNS].to_numpy(dtype=np.int64)
+        played = player_slots != 0
+        self.add_players(np.unique(player_slots[played]))
+
+        goals = match_data[['Team 1 Goals', 'Team 2 Goals']].to_numpy(dtype=np.float64)
+        goal_diff = goals[:, 0] - goals[:, 1]
+
+        chunk_size = max(FIT_CHUNK_BYTES // (8 * len(self.target)), 1) # fewer matches per chunk the more players there are
+        for start in range(0, len(match_data), chunk_size):
+            chunk_slots, chunk_played = player_slots[start:start + chunk_size], played[start:start + chunk_size]
+            design = np.zeros((len(chunk_slots), len(self.target)))
+
+            rows, slots = np.nonzero(chunk_played)
+            design[rows, np.searchsorted(self.player_ids, chunk_slots[rows, slots]) + 1] = TEAM_SIGNS[slots]
+            design[:, 0] = chunk_played[:, :TEAM_SIZE].sum(axis=1) - chunk_played[:, TEAM_SIZE:].sum(axis=1)
+
+            self.gram += design.T @ design
+            self.target += design.T @ goal_diff[start:start + chunk_size]
+
+        self.totals = {
+            "n_matches": self.totals["n_matches"] + len(match_data),
+            "sum_sq_goal_diff": self.totals["sum_sq_goal_diff"] + float(goal_diff @ goal_diff),
+            "sum_total_goals": self.totals["sum_total_goals"] + float(goals.sum()),
+            "match_count": max(self.totals["match_count"], int(match_data['Match ID'].max()))
+        }
+        self.solve()
+        return self
+
+    def predict(self, team_a, team_b):
+        """Predicted score and win/draw/loss probabilities for team_a (as Team 1) against team_b. Unknown players rate as average."""
+        goal_diff = (sum(self.ratings.get(player_id, 0.0) for player_id in team_a)
+                     - sum(self.ratings.get(player_id, 0.0) for player_id in team_b)
+                     + self.player_advantage * (len(team_a) - len(team_b)))
+
+        # goal differences are whole numbers, so a predicted difference within half a goal of 0 is a draw
+        team_a_win = 1 - normal_cdf((0.5 - goal_diff) / self.sigma)
+        team_b_win = normal_cdf((-0.5 - goal_diff) / self.sigma)
+
+        return {
+            "goal_difference": round(goal_diff, 2),
+            "team_a_goals": round(max((self.mean_total_goals + goal_diff) / 2, 0), 1),
+            "team_b_goals": round(max((self.mean_total_goals - goal_diff) / 2, 0), 1),
+            "team_a_win_pct": round(team_a_win * 100, 1),
+            "draw_pct": round((1 - team_a_win - team_b_win) * 100, 1),
+            "team_b_win_pct": round(team_b_win * 100, 1)
+        }
+
+    def suggest_splits(self, player_ids, top_k=5, time_budget=config.BALANCE_TIME_BUDGET):
+        """
+        The top_k splits of player_ids into two teams with the smallest predicted goal difference. Splits are scored
+        in batches, stopping once time_budget seconds have passed. (In process: at config.BALANCE_MAX_PLAYERS the
+        6,435 splits take a few milliseconds, less than starting a process pool would.)
+        """
+        start = time.perf_counter()
+        masks = split_masks(len(player_ids))
+        ratings = np.array([self.ratings.get(player_id, 0.0) for player_id in player_ids])
+
+        goal_differences = []
+        for batch_start in range(0, len(masks), SPLIT_BATCH_SIZE):
+            goal_differences.append(split_goal_differences(masks[batch_start:batch_start + SPLIT_BATCH_SIZE], ratings, self.player_advantage))
+            if time.perf_counter() - start > time_budget:
+                break
+
+        goal_differences = np.concatenate(goal_differences) if goal_differences else np.empty(0)
+        top_k = min(top_k, len(goal_differences))
+        fairest = np.argpartition(np.abs(goal_differences), top_k - 1)[:top_k] if top_k else np.empty(0, dtype=np.int64)
+        fairest = fairest[np.argsort(np.abs(goal_differences[fairest]))]
+
+        player_ids = np.asarray(player_ids)
+        suggestions = []
+        for split in fairest.tolist():
+            team_a, team_b = player_ids[masks[split]].tolist(), player_ids[~masks[split]].tolist()
+            suggestions.append({"team_a": team_a, "team_b": team_b, **self.predict(team_a, team_b)})
+
+        return {
+            "splits": suggestions,
+            "splits_scored": int(len(goal_differences)),
+            "splits_total": int(len(masks)),
+            "seconds": round(time.perf_counter() - start, 4)
+        }
+
+    def to_arrays(self):
+        return {"player_ids": self.player_ids, "gram": self.gram, "target": self.target,
+                "totals": np.array([self.totals[key] for key in ["n_matches", "sum_sq_goal_diff", "sum_total_goals", "match_count"]], dtype=np.float64)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        n_matches, sum_sq_goal_diff, sum_total_goals, match_count = arrays['totals'].tolist()
+        totals = {"n_matches": int(n_matches), "sum_sq_goal_diff": sum_sq_goal_diff, "sum_total_goals": sum_total_goals, "match_count": int(match_count)}
+        return cls(arrays['player_ids'], arrays['gram'], arrays['target'], totals)
+
+    def save(self, ratings_path):
+        temp_path = f"{ratings_path}.tmp.npz"
+        np.savez(temp_path, **self.to_arrays())
+        os.replace(temp_path, ratings_path)
+
+    @classmethod
+    def load(cls, ratings_path):
+        with np.load(ratings_path) as saved:
+            return cls.from_arrays(saved)
+
+
+class PlayerRatings:
+    """The rating model as a derived artifact of raw_data_processing, saved next to player_stats.csv."""
+
+    def __init__(self, ratings_path):
+        self.ratings_path = ratings_path
+        self.model = None
+
+    def load(self):
+        if os.path.exists(self.ratings_path):
+            self.model = RatingModel.load(self.ratings_path)
+        return self.model
+
+    def paths(self):
+        return [self.ratings_path]
+
+    def match_count(self):
+        model = self.model or self.load()
+        return model.totals["match_count"] if model else None
+
+    def rebuild(self, match_data):
+        model = RatingModel().partial_fit(match_data)
+        model.save(self.ratings_path)
+        self.model = model # swapped in whole, so readers see either the old or the new ratings
+
+    def update(self, new_match_data):
+        current = self.model or self.load()
+        model = RatingModel(current.player_ids, current.gram.copy(), current.target.copy(), dict(current.totals)).partial_fit(new_match_data)
+        model.save(self.ratings_path)
+        self.model = model
@@ -1,94 +1,287 @@
 import pandas as pd
+import numpy as np
 import json
-from collections import defaultdict
+import hashlib
+import io
+import os
 from display import response
+from storage import CsvJsonStorage
+from player_form import PlayerForm, result_codes
+from instrumentation import timed
+import player_directory
 
 
-def process_match_data(match_data_path, match_count_path):
-    player_records = []
-    player_form_dict = defaultdict(lambda:{})
-    match_data = pd.read_csv(match_data_path)
+HASH_BLOCK_SIZE = 1 << 20
+TEAM_SIZE = 8
+TEAMS = ('Team 1', 'Team 2')
+PLAYER_COLUMNS = [f'{team} P{i}' for team in TEAMS for i in range(1, TEAM_SIZE + 1)]
+
+
+@timed('raw_data_processing.build_appearances')
+def build_appearances(match_data):
+    """Melt the 16 player columns of match_data into one long table with a row per player appearance."""
+    n_matches = len(match_data)
+    player_ids = match_data[PLAYER_COLUMNS].to_numpy(dtype=np.int64).ravel() # row-major, so appearances stay in match order
+    team_index = np.tile(np.repeat([0, 1], TEAM_SIZE), n_matches)
+
+    match_ids = np.repeat(match_data['Match ID'].to_numpy(dtype=np.int64), 2 * TEAM_SIZE)
+    goals = match_data[['Team 1 Goals', 'Team 2 Goals']].to_numpy(dtype=np.int64)
+    results = match_data[['Team 1 Result', 'Team 2 Result']].to_numpy(dtype=np.float64)
+    match_index = np.repeat(np.arange(n_matches), 2 * TEAM_SIZE)
 
-    for index, row in match_data.iterrows():
-        players_team1 = [row[f'Team 1 P{i}'] for i in range(1,9) if row[f'Team 1 P{i}'] != 0] # gets list of players in team 1 for that match
-        players_team2 = [row[f'Team 2 P{i}'] for i in range(1,9) if row[f'Team 2 P{i}'] != 0] # gets list of players in team 2 for that match
+    played = player_ids != 0 # 0 pads teams with fewer than 8 players
+    match_index, team_index = match_index[played], team_index[played]
 
-        for team, players in [('Team 1', players_team1), ('Team 2', players_team2)]:
-            for player_id in players:
-                player_records.append({
-                    'match_id': int(row['Match ID']),
-                    'player_id': int(player_id),
-                    'team': team,
-                    'goals_for': int(row[f'{team} Goals']),
-                    'goals_against': int(row['Team 2 Goals'] if team == 'Team 1' else row['Team 1 Goals']),
-                    'result': str(row[f'{team} Result']).strip()
-                })
+    return pd.DataFrame({
+        'match_id': match_ids[played],
+        'player_id': player_ids[played],
+        'team': pd.Categorical.from_codes(team_index, TEAMS),
+        'goals_for': goals[match_index, team_index],
+        'goals_against': goals[match_index, 1 - team_index],
+        'result': results[match_index, team_index]
+    })
+
+
+@timed('raw_data_processing.process_match_data')
+def process_match_data(match_data_path, match_count_path, derived_artifacts=()):
+    match_data = pd.read_csv(match_data_path)
+    player_records = build_appearances(match_data)
 
-                player_form_dict[int(player_id)][int(row['Match ID'])] = str(row[f'{team} Result']).strip()
+    for derived_artifact in derived_artifacts:
+        derived_artifact.rebuild(match_data)
+    player_form = PlayerForm.from_records(player_records['player_id'], player_records['match_id'], result_codes(player_records['result']))
 
     total_number_of_matches = match_data['Match ID'].max()
     with open(match_count_path, 'w') as file:
         file.write(str(total_number_of_matches))
 
-    return player_records, player_form_dict
-    
+    return player_records, player_form
 
+
+@timed('raw_data_processing.calculate_player_stats')
 def calculate_player_stats(player_records):
-    calculated_player_stats = {}
-
-    for player_record in player_records:
-        player_id = player_record['player_id']
-
-        if player_id not in calculated_player_stats:
-            calculated_player_stats[player_id] = {
-                'total_matches': 0,
-                'total_wins': 0,
-                'total_draws': 0,
-                'total_losses': 0,
-                'total_goals_for': 0,
-                'total_goals_against': 0,
-                'win_pct': 0,
-                'draw_pct': 0,
-                'loss_pct': 0
-            }
-
-        calculated_player_stats[player_id]['total_matches'] += 1
-        calculated_player_stats[player_id]['total_goals_for'] += player_record['goals_for']
-        calculated_player_stats[player_id]['total_goals_against'] += player_record['goals_against']
-
-        if player_record['result'] == "1.0":
-            calculated_player_stats[player_id]['total_wins'] += 1
-        elif player_record['result'] == "0.5":
-            calculated_player_stats[player_id]['total_draws'] += 1
-        else:
-            calculated_player_stats[player_id]['total_losses'] += 1
-
-    for player_id, stats in calculated_player_stats.items():
-        total_matches = stats['total_matches']
-        if total_matches > 0:
-            stats['win_pct'] = round(stats['total_wins'] / total_matches * 100, 1)
-            stats['draw_pct'] = round(stats['total_draws'] / total_matches * 100, 1)
-            stats['loss_pct'] = round(stats['total_losses'] / total_matches * 100, 1)
-    
-    return calculated_player_stats
-
-
-def cs_player_stats_player_form(match_data_path, match_count_path, player_keys_path, player_stats_path, player_form_dict_path):
-    player_records, player_form_dict = process_match_data(match_data_path, match_count_path)
-    calculated_player_stats = calculate_player_stats(player_records)
+    outcomes = player_records.assign(
+        total_matches=1,
+        total_wins=(player_records['result'] == 1.0).astype(np.int64),
+        total_draws=(player_records['result'] == 0.5).astype(np.int64),
+        total_losses=(~player_records['result'].isin([1.0, 0.5])).astype(np.int64),
+        total_goals_for=player_records['goals_for'],
+        total_goals_against=player_records['goals_against']
+    )
+
+    totals = outcomes.groupby('player_id', sort=False)[
+        ['total_matches', 'total_wins', 'total_draws', 'total_losses', 'total_goals_for', 'total_goals_against']
+    ].sum()
+
+    totals.index.name = None
+    return calculate_result_percentages(totals)
+
+
+def calculate_result_percentages(player_stats):
+    # python's round() rather than np.round so the percentages match the previous loop exactly
+    total_matches = player_stats['total_matches'].tolist()
+    for result_column, pct_column in [('total_wins', 'win_pct'), ('total_draws', 'draw_pct'), ('total_losses', 'loss_pct')]:
+        player_stats[pct_column] = [round(count / matches * 100, 1) for count, matches in zip(player_stats[result_column].tolist(), total_matches)]
+
+    return player_stats
 
-    player_keys = pd.read_csv(player_keys_path)
-    player_stats_df = pd.DataFrame.from_dict(calculated_player_stats, orient='index')
-    player_stats_df = player_stats_df.reset_index().rename(columns={'index': 'player_id'})
+
+@timed('raw_data_processing.name_player_stats')
+def name_player_stats(calculated_player_stats, player_keys):
+    player_stats_df = calculated_player_stats.reset_index().rename(columns={'index': 'player_id'})
     player_stats_df = player_stats_df.merge(player_keys, how='left', left_on='player_id', right_on='player_id')
-    player_stats_df = player_stats_df.drop(columns=['player_id']) 
+    player_stats_df = player_stats_df.drop(columns=['player_id'])
+
+    return player_stats_df.set_index('player_name').reset_index()
+
+
+@timed('raw_data_processing.file_hash')
+def file_hash(file_path, n_bytes=None):
+    """Stream a sha256 over the first n_bytes of a file (the whole file if n_bytes is None)."""
+    hasher = hashlib.sha256()
+    remaining = os.path.getsize(file_path) if n_bytes is None else n_bytes
+    with open(file_path, 'rb') as file:
+        while remaining > 0:
+            block = file.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+
+    return hasher
+
+
+def file_stat(file_path):
+    """Size and modification time of a file, the cheap part of the freshness check."""
+    if not os.path.exists(file_path):
+        return None
+    stat_result = os.stat(file_path)
+    return {"size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns}
+
+
+def read_processing_state(processing_state_path):
+    if not processing_state_path or not os.path.exists(processing_state_path):
+        return None
+
+    try:
+        with open(processing_state_path, 'r') as file:
+            return json.load(file)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+
+def write_processing_state(processing_state_path, match_count, processed_bytes, match_data_hash, player_keys_hash, storage_name, input_stats=None, artifact_paths=()):
+    """
+    Record how much of match_data has been processed, so the next run can pick up from there. It doubles as the
+    manifest checked at startup: the stat of the raw files as they were read and of every file produced from them.
+    """
+    processing_state = {
+        "storage": storage_name,
+        "match_count": int(match_count),
+        "processed_bytes": processed_bytes,
+        "match_data_sha256": match_data_hash,
+        "player_keys_sha256": player_keys_hash,
+        "inputs": input_stats or {},
+        "artifacts": {artifact_path: file_stat(artifact_path) for artifact_path in artifact_paths}
+    }
+    with open(processing_state_path, 'w') as file:
+        json.dump(processing_state, file)
+
+
+def artifact_paths(calculated_storage, derived_artifacts):
+    return [*calculated_storage.paths(), *(path for derived_artifact in derived_artifacts for path in derived_artifact.paths())]
 
-    player_stats_df = player_stats_df.set_index('player_name').reset_index()
 
-    player_stats_df.to_csv(player_stats_path, index=False) # saves the df
+@timed('raw_data_processing.processing_state_is_fresh')
+def processing_state_is_fresh(processing_state_path, match_data_path, player_keys_path, calculated_storage, derived_artifacts=()):
+    """
+    True when the raw files and every calculated file have the size and mtime recorded after the last run, so the
+    saved stats can be loaded as they are. Only stat() calls, nothing is read or hashed; when this is False
+    update_player_stats_player_form works out (by hashing) whether anything actually changed.
+    """
+    processing_state = read_processing_state(processing_state_path)
+    if processing_state is None or processing_state.get('storage') != calculated_storage.name or not processing_state.get('inputs'):
+        return False
 
-    with open(player_form_dict_path, 'w') as file: # saves player_form_dict
-        json.dump(player_form_dict, file)
+    if processing_state['inputs'] != {"match_data": file_stat(match_data_path), "player_keys": file_stat(player_keys_path)}:
+        return False
 
-    return player_stats_df, player_form_dict
+    expected_artifacts = processing_state['artifacts']
+    return (set(expected_artifacts) == set(artifact_paths(calculated_storage, derived_artifacts))
+            and all(file_stat(path) == recorded for path, recorded in expected_artifacts.items()))
+
+
+@timed('raw_data_processing.cs_player_stats_player_form')
+def cs_player_stats_player_form(match_data_path, match_count_path, player_keys_path, player_stats_path, player_form_dict_path, processing_state_path=None, calculated_storage=None,
+                                derived_artifacts=()):
+    """
+    Rebuild player stats and form from scratch, saved through calculated_storage (the csv/json files at the given paths by default).
+    derived_artifacts are other stores built from the match data (e.g. predictions.PlayerRatings), each with a
+    rebuild(match_data) and update(new_match_data) method, a match_count() of the last Match ID they include and
+    the paths() of the files they save.
+    """
+    calculated_storage = calculated_storage or CsvJsonStorage(player_stats_path, player_form_dict_path)
+    input_stats = {"match_data": file_stat(match_data_path), "player_keys": file_stat(player_keys_path)}
+
+    player_records, player_form = process_match_data(match_data_path, match_count_path, derived_artifacts)
+    calculated_player_stats = calculate_player_stats(player_records)
+
+    player_keys = player_directory.for_path(player_keys_path).get().frame
+    player_stats_df = name_player_stats(calculated_player_stats, player_keys)
+
+    calculated_storage.save(player_stats_df, player_form)
+
+    if processing_state_path:
+        processed_bytes = input_stats['match_data']['size']
+        write_processing_state(processing_state_path, player_records['match_id'].max(), processed_bytes,
+                               file_hash(match_data_path, processed_bytes).hexdigest(), file_hash(player_keys_path).hexdigest(), calculated_storage.name,
+                               input_stats, artifact_paths(calculated_storage, derived_artifacts))
+
+    return player_stats_df, player_form
+
+
+@timed('raw_data_processing.update_player_stats_player_form')
+def update_player_stats_player_form(match_data_path, match_count_path, player_keys_path, player_stats_path, player_form_dict_path, processing_state_path,
+                                    player_stats_df=None, player_form=None, calculated_storage=None, derived_artifacts=()):
+    """
+    Incremental version of cs_player_stats_player_form: only the rows appended to match_data since the last run are read
+    and merged into the existing player stats and form. Falls back to a full rebuild when the previously processed rows
+    (or player_keys) have changed, when new rows reuse an already processed Match ID, or when there is no saved state.
+    """
+    calculated_storage = calculated_storage or CsvJsonStorage(player_stats_path, player_form_dict_path)
+
+    def full_rebuild():
+        return cs_player_stats_player_form(match_data_path, match_count_path, player_keys_path, player_stats_path, player_form_dict_path, processing_state_path, calculated_storage,
+                                           derived_artifacts)
+
+    processing_state = read_processing_state(processing_state_path)
+    if processing_state is None or processing_state.get('storage') != calculated_storage.name or not calculated_storage.has_data():
+        return full_rebuild()
+    if any(derived_artifact.match_count() != processing_state['match_count'] for derived_artifact in derived_artifacts):
+        return full_rebuild()
+
+    input_stats = {"match_data": file_stat(match_data_path), "player_keys": file_stat(player_keys_path)}
+    processed_bytes = processing_state['processed_bytes']
+    if input_stats['match_data']['size'] < processed_bytes:
+        return full_rebuild()
+
+    match_data_hasher = file_hash(match_data_path, processed_bytes)
+    player_keys_hash = file_hash(player_keys_path).hexdigest()
+    if match_data_hasher.hexdigest() != processing_state['match_data_sha256'] or player_keys_hash != processing_state['player_keys_sha256']:
+        return full_rebuild()
+
+    with open(match_data_path, 'rb') as file:
+        header = file.readline()
+        file.seek(processed_bytes)
+        new_rows = file.read()
+    new_rows = new_rows[:new_rows.rfind(b'\n') + 1] # only whole lines, in case matches are being appended right now
+    match_data_hasher.update(new_rows)
+
+    if player_stats_df is None or player_form is None:
+        player_stats_df, player_form = calculated_storage.load()
+
+    def record_unchanged():
+        # nothing new (e.g. the file was only touched), refresh the manifest so the next startup doesn't hash again
+        write_processing_state(processing_state_path, processing_state['match_count'], processed_bytes, processing_state['match_data_sha256'], player_keys_hash,
+                               calculated_storage.name, input_stats, artifact_paths(calculated_storage, derived_artifacts))
+        return player_stats_df, player_form
+
+    if not new_rows.strip():
+        return record_unchanged()
+
+    new_match_data = pd.read_csv(io.BytesIO(header + new_rows))
+    if new_match_data.empty:
+        return record_unchanged()
+    if new_match_data['Match ID'].min() <= processing_state['match_count']:
+        return full_rebuild()
+
+    player_records = build_appearances(new_match_data)
+    new_player_stats = name_player_stats(calculate_player_stats(player_records), player_directory.for_path(player_keys_path).get().frame)
+
+    # stats are keyed by player_name once saved, so unnamed or duplicate names can't be merged safely
+    if player_stats_df['player_name'].isna().any() or new_player_stats['player_name'].isna().any() or player_stats_df['player_name'].duplicated().any():
+        return full_rebuild()
+
+    count_columns = ['total_matches', 'total_wins', 'total_draws', 'total_losses', 'total_goals_for', 'total_goals_against']
+    player_stats_df = player_stats_df.set_index('player_name')
+    new_player_stats = new_player_stats.set_index('player_name')
+    returning_players = new_player_stats.index.intersection(player_stats_df.index, sort=False)
+
+    player_stats_df.loc[returning_players, count_columns] += new_player_stats.loc[returning_players, count_columns]
+    player_stats_df = pd.concat([player_stats_df, new_player_stats.drop(index=returning_players)])
+    player_stats_df = calculate_result_percentages(player_stats_df).reset_index()
+
+    player_form = PlayerForm.from_records(player_records['player_id'], player_records['match_id'], result_codes(player_records['result']), previous=player_form)
+
+    for derived_artifact in derived_artifacts:
+        derived_artifact.update(new_match_data)
+
+    calculated_storage.save(player_stats_df, player_form)
+
+    match_count = new_match_data['Match ID'].max()
+    with open(match_count_path, 'w') as file:
+        file.write(str(match_count))
+    write_processing_state(processing_state_path, match_count, processed_bytes + len(new_rows), match_data_hasher.hexdigest(), player_keys_hash, calculated_storage.name,
+                           input_stats, artifact_paths(calculated_storage, derived_artifacts))
 
+    return player_stats_df, player_form
@@ -0,0 +1,209 @@
+"""
+Rolling (last n matches) player metrics from cumulative sums.
+
+Like PlayerForm, every player's matches are one contiguous, match id sorted segment of flat arrays. Alongside the
+match ids, each entry keeps the player's running totals up to and including that match (wins, draws, losses, goal
+difference) and the length of the streak of identical results ending there. The totals over any window are then the
+difference of two entries, O(1) whatever the window, and new matches extend a player's totals from their last entry
+without going back over their history.
+"""
+import os
+
+import numpy as np
+
+from player_form import LOSS, DRAW, WIN, RESULT_NAMES, result_codes
+from raw_data_processing import build_appearances
+
+
+CUMULATIVE_FIELDS = ['wins', 'draws', 'losses', 'goal_diff']
+
+
+def grouped_cumsum(values, group_starts):
+    """Cumulative sum of values restarting at every index in group_starts (sorted, starting with 0)."""
+    totals = np.cumsum(values)
+    before_group = totals[group_starts] - values[group_starts]
+    return totals - np.repeat(before_group, np.diff(np.r_[group_starts, len(values)]))
+
+
+class RollingMetrics:
+    def __init__(self, player_ids, offsets, match_ids, cumulative, streaks, result_codes, match_count=0):
+        self.player_ids = np.asarray(player_ids, dtype=np.int64) # in order of first appearance
+        self.offsets = np.asarray(offsets, dtype=np.int64) # player i's matches are [offsets[i], offsets[i + 1])
+        self.match_ids = match_ids
+        self.cumulative = cumulative # {field: running total per entry}, see CUMULATIVE_FIELDS
+        self.streaks = streaks # identical results in a row, ending at each entry
+        self.result_codes = result_codes
+        self.match_count = match_count
+        self.index = {player_id: position for position, player_id in enumerate(self.player_ids.tolist())}
+
+    @classmethod
+    def empty(cls):
+        return cls([], [0], np.empty(0, dtype=np.int32), {field: np.empty(0, dtype=np.int64) for field in CUMULATIVE_FIELDS},
+                   np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int8))
+
+    @classmethod
+    def from_match_data(cls, match_data, previous=None):
+        """Build from raw match_data rows, continuing previous (whose matches must all come before these) if given."""
+        previous = previous if previous is not None else cls.empty()
+        if match_data.empty:
+            return previous
+
+        appearances = build_appearances(match_data)
+        match_count = max(previous.match_count, int(match_data['Match ID'].max()))
+        return cls.from_records(appearances['player_id'].to_numpy(), appearances['match_id'].to_numpy(),
+                                (appearances['goals_for'] - appearances['goals_against']).to_numpy(),
+                                result_codes(appearances['result']), match_count, previous)
+
+    @classmethod
+    def from_records(cls, player_ids, match_ids, goal_diff, codes, match_count, previous):
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+
+        # rank players: previous players keep their position, new ones follow in order of first appearance
+        unique_player_ids, first_seen, inverse = np.unique(player_ids, return_index=True, return_inverse=True)
+        unique_rank = np.array([previous.index.get(player_id, -1) for player_id in unique_player_ids.tolist()], dtype=np.int64)
+        new_players = np.flatnonzero(unique_rank < 0)
+        new_players = new_players[np.argsort(first_seen[new_players], kind='stable')]
+        unique_rank[new_players] = len(previous.player_ids) + np.arange(len(new_players))
+        rank = unique_rank[inverse]
+
+        order = np.lexsort((match_ids, rank))
+        rank, match_ids, goal_diff, codes = rank[order], np.asarray(match_ids, dtype=np.int32)[order], np.asarray(goal_diff, dtype=np.int64)[order], codes[order]
+        group_starts = np.flatnonzero(np.r_[True, rank[1:] != rank[:-1]])
+
+        # a returning player's running totals and streak carry on from their last previous entry
+        carried = rank < len(previous.player_ids)
+        previous_last = previous.offsets[np.minimum(rank + 1, len(previous.player_ids))] - 1
+        carried_last = previous_last[carried]
+
+        cumulative = {}
+        for field, values in [('wins', codes == WIN), ('draws', codes == DRAW), ('losses', codes == LOSS), ('goal_diff', goal_diff)]:
+            cumulative[field] = grouped_cumsum(values.astype(np.int64), group_starts)
+            cumulative[field][carried] += previous.cumulative[field][carried_last]
+
+        run_starts = np.flatnonzero(np.r_[True, (rank[1:] != rank[:-1]) | (codes[1:] != codes[:-1])])
+        run_lengths = np.diff(np.r_[run_starts, len(codes)])
+        streaks = (np.arange(len(codes)) - np.repeat(run_starts, run_lengths) + 1).astype(np.int32)
+
+        # a player's first run of new matches continues their previous streak if it has the same result
+        first_run = np.repeat(np.isin(run_starts, group_starts), run_lengths)
+        continues = first_run & carried
+        continues[continues] = previous.result_codes[previous_last[continues]] == codes[continues]
+        streaks[continues] += previous.streaks[previous_last[continues]]
+
+        n_players = len(previous.player_ids) + len(new_players)
+        all_player_ids = np.r_[previous.player_ids, unique_player_ids[new_players]]
+        if not len(previous.match_ids):
+            counts = np.bincount(rank, minlength=n_players)
+            return cls(all_player_ids, np.r_[0, np.cumsum(counts)], match_ids, cumulative, streaks, codes, match_count)
+
+        # merge: previous entries then new ones, stable sorted by player so each segment stays in match order
+        previous_rank = np.repeat(np.arange(len(previous.player_ids)), np.diff(previous.offsets))
+        merged_rank = np.r_[previous_rank, rank]
+        merge_order = np.argsort(merged_rank, kind='stable')
+        counts = np.bincount(merged_rank, minlength=n_players)
+
+        return cls(all_player_ids, np.r_[0, np.cumsum(counts)],
+                   np.r_[previous.match_ids, match_ids][merge_order],
+                   {field: np.r_[previous.cumulative[field], cumulative[field]][merge_order] for field in CUMULATIVE_FIELDS},
+                   np.r_[previous.streaks, streaks][merge_order],
+                   np.r_[previous.result_codes, codes][merge_order],
+                   match_count)
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def __contains__(self, player_id):
+        return int(player_id) in self.index
+
+    def window_totals(self, starts, ends, segment_starts):
+        """Totals of every cumulative field over the non-empty entry ranges [starts, ends) of segments starting at segment_starts."""
+        return {field: values[ends - 1] - np.where(starts > segment_starts, values[np.maximum(starts - 1, 0)], 0)
+                for field, values in self.cumulative.items()}
+
+    def summary(self, window):
+        """Last window matches of every player: matches, wins, draws, losses, win %, goal difference and current streak."""
+        segment_starts, ends = self.offsets[:-1], self.offsets[1:]
+        starts = np.maximum(segment_starts, ends - window)
+        totals = self.window_totals(starts, ends, segment_starts)
+        matches = ends - starts
+
+        return {
+            "player_id": self.player_ids.tolist(),
+            "matches": matches.tolist(),
+            "wins": totals['wins'].tolist(),
+            "draws": totals['draws'].tolist(),
+            "losses": totals['losses'].tolist(),
+            "win_pct": np.round(totals['wins'] * 100 / np.maximum(matches, 1), 1).tolist(),
+            "goal_diff": totals['goal_diff'].tolist(),
+            "streak": self.streaks[ends - 1].tolist(),
+            "streak_result": [RESULT_NAMES.get(code) for code in self.result_codes[ends - 1].tolist()]
+        }
+
+    def series(self, player_id, window):
+        """Rolling win % and goal difference over the last window matches, at every match the player played."""
+        position = self.index.get(int(player_id))
+        if position is None:
+            return {"match_ids": [], "win_pct": [], "goal_diff": [], "streak": []}
+
+        segment_start, segment_end = self.offsets[position], self.offsets[position + 1]
+        ends = np.arange(segment_start + 1, segment_end + 1)
+        starts = np.maximum(segment_start, ends - window)
+        totals = self.window_totals(starts, ends, segment_start)
+
+        return {
+            "match_ids": self.match_ids[segment_start:segment_end].tolist(),
+            "win_pct": np.round(totals['wins'] * 100 / (ends - starts), 1).tolist(),
+            "goal_diff": totals['goal_diff'].tolist(),
+            "streak": self.streaks[segment_start:segment_end].tolist()
+        }
+
+    def to_arrays(self):
+        return {"player_ids": self.player_ids, "offsets": self.offsets, "match_ids": self.match_ids, "streaks": self.streaks,
+                "result_codes": self.result_codes, "match_count": np.array(self.match_count),
+                **{f"cumulative_{field}": self.cumulative[field] for field in CUMULATIVE_FIELDS}}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['player_ids'], arrays['offsets'], arrays['match_ids'],
+                   {field: arrays[f"cumulative_{field}"] for field in CUMULATIVE_FIELDS},
+                   arrays['streaks'], arrays['result_codes'], int(arrays['match_count']))
+
+    def save(self, metrics_path):
+        temp_path = f"{metrics_path}.tmp.npz"
+        np.savez(temp_path, **self.to_arrays())
+        os.replace(temp_path, metrics_path)
+
+    @classmethod
+    def load(cls, metrics_path):
+        with np.load(metrics_path) as saved:
+            return cls.from_arrays(saved)
+
+
+class PlayerRollingMetrics:
+    """RollingMetrics as a derived artifact of raw_data_processing, saved next to player_stats.csv."""
+
+    def __init__(self, metrics_path):
+        self.metrics_path = metrics_path
+        self.metrics = None
+
+    def paths(self):
+        return [self.metrics_path]
+
+    def load(self):
+        if os.path.exists(self.metrics_path):
+            self.metrics = RollingMetrics.load(self.metrics_path)
+        return self.metrics
+
+    def match_count(self):
+        metrics = self.metrics if self.metrics is not None else self.load()
+        return metrics.match_count if metrics is not None else None # empty metrics have len 0, but aren't missing
+
+    def rebuild(self, match_data):
+        metrics = RollingMetrics.from_match_data(match_data)
+        metrics.save(self.metrics_path)
+        self.metrics = metrics # swapped in whole, so readers see either the old or the new metrics
+
+    def update(self, new_match_data):
+        metrics = RollingMetrics.from_match_data(new_match_data, previous=self.metrics if self.metrics is not None else self.load())
+        metrics.save(self.metrics_path)
+        self.metrics = metrics
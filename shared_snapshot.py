@@ -0,0 +1,94 @@
+"""
+The calculated data shared by every worker process when the app is served by a WSGI server (see wsgi.py).
+
+One process calculates, writes the snapshot's arrays to a new numbered directory, then replaces CURRENT with that
+number: replacing CURRENT is the reload signal. Workers memory-map the arrays read-only, so however many workers there
+are the operating system keeps one copy in its page cache, and a worker that sees CURRENT change maps the new directory
+and swaps it in on its next request (app.refresh_shared_snapshot()).
+
+    <directory>/<version>/   one directory per snapshot: the stats and form as storage.NpyStorage, the rest as .npy
+    <directory>/CURRENT      the version workers should serve
+    <directory>/.lock        held while calculating, so only one process calculates at a time
+"""
+import fcntl
+import os
+import shutil
+from contextlib import contextmanager
+
+import config
+from lazy_imports import lazy_import
+np = lazy_import('numpy') # app.py imports this module (through groups.py) before warm_up() loads the data libraries
+storage = lazy_import('storage')
+
+
+@contextmanager
+def file_lock(lock_path):
+    """An exclusive flock on lock_path (created if needed), held for the with block."""
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SharedSnapshotStore:
+    def __init__(self, directory, keep=config.SHARED_SNAPSHOTS_KEPT):
+        self.directory = directory
+        self.keep = keep # older snapshots are deleted, workers still mapping one keep their open mappings
+        self.current_path = os.path.join(directory, 'CURRENT')
+
+    def version_directory(self, version):
+        return os.path.join(self.directory, str(version))
+
+    def current_version(self):
+        """The version workers should serve, a single small read so it can be checked on every request."""
+        try:
+            with open(self.current_path) as file:
+                return int(file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def lock(self):
+        """Exclusive across processes (not threads of one process, app.py serialises those itself)."""
+        return file_lock(os.path.join(self.directory, '.lock'))
+
+    def write(self, player_stats_df, player_form, components):
+        """
+        Write a new snapshot and make it current, returning its version. components maps a name to a dict of arrays
+        (a derived artifact's to_arrays(), or None if it has none). Call with lock() held.
+        """
+        version = (self.current_version() or 0) + 1
+        version_directory = self.version_directory(version)
+        shutil.rmtree(version_directory, ignore_errors=True) # left over from a write that didn't finish
+
+        storage.NpyStorage(version_directory).save(player_stats_df, player_form)
+        for name, arrays in components.items():
+            for key, array in (arrays or {}).items():
+                storage.atomic_save_npy(os.path.join(version_directory, f"{name}.{key}.npy"), np.asarray(array))
+
+        temp_path = f"{self.current_path}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write(str(version))
+        os.replace(temp_path, self.current_path)
+
+        for old_version in range(max(version - self.keep, 0), 0, -1):
+            if not os.path.exists(self.version_directory(old_version)):
+                break
+            shutil.rmtree(self.version_directory(old_version), ignore_errors=True)
+
+        return version
+
+    def read(self, version):
+        """Map a snapshot: (player_stats_df, player_form, {name: {key: read-only memory-mapped array}})."""
+        version_directory = self.version_directory(version)
+        player_stats_df, player_form = storage.NpyStorage(version_directory).load()
+
+        components = {}
+        for file_name in os.listdir(version_directory):
+            name, _, key = file_name.removesuffix('.npy').partition('.')
+            if key and file_name.endswith('.npy') and file_name not in storage.NpyStorage.files:
+                components.setdefault(name, {})[key] = np.load(os.path.join(version_directory, file_name), mmap_mode='r')
+
+        return player_stats_df, player_form, components
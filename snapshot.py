@@ -0,0 +1,40 @@
+"""
+The calculated data requests read from, published as one immutable snapshot.
+
+A recalculation builds a whole new snapshot and swaps a single reference, so a request that takes the current
+snapshot once sees either all of the old data or all of the new data, never a mix, without taking a lock.
+"""
+import threading
+import time
+
+
+class DatasetSnapshot:
+    def __init__(self, player_stats_df, player_form, rating_model, version, stats_table=None, rolling_metrics=None, synergy=None, fingerprint=None,
+                 last_modified=None):
+        self.player_stats_df = player_stats_df
+        self.player_form = player_form
+        self.rating_model = rating_model
+        self.stats_table = stats_table
+        self.rolling_metrics = rolling_metrics
+        self.synergy = synergy
+        self.version = version
+        self.published_at = time.time()
+        self.fingerprint = fingerprint or f"{version}-{self.published_at}" # identifies the data for HTTP caching, see http_cache
+        self.last_modified = last_modified or self.published_at
+
+
+class SnapshotHolder:
+    def __init__(self):
+        self.current = None # until the first publish (app.warm_up() publishes before any request reads it)
+        self.publish_lock = threading.Lock() # only publishers take it, readers just read self.current
+
+    def get(self):
+        return self.current
+
+    def publish(self, player_stats_df, player_form, rating_model, stats_table=None, rolling_metrics=None, synergy=None, fingerprint=None, last_modified=None):
+        with self.publish_lock:
+            snapshot = DatasetSnapshot(player_stats_df, player_form, rating_model, self.current.version + 1 if self.current else 1, stats_table, rolling_metrics, synergy,
+                                       fingerprint, last_modified)
+            self.current = snapshot
+
+        return snapshot
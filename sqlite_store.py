@@ -0,0 +1,235 @@
+"""
+Optional embedded SQLite match store (MATCH_STORE_ENABLED=1): match_data normalised into one row per player appearance.
+
+    matches(match_id, team1_goals, team2_goals, team1_result, team2_result)
+    appearances(match_id, player_id, team, slot, goals_for, goals_against, result)
+
+appearances is indexed by player (with the columns the stats need, so a player's aggregates never touch the table)
+and by match, so "every match of player X" costs that player's matches rather than a scan of all 16 player columns
+of every row. match_data.csv stays the raw data the app uploads to and hashes; the store is kept in step with it as a
+derived artifact of raw_data_processing (rebuilt or appended to with the other artifacts), and can be imported from
+or exported back to the csv schema from the command line:
+
+    python -m sqlite_store import [--csv data/raw/match_data.csv] [--db data/calculated/match_store.sqlite]
+    python -m sqlite_store export --csv exported_match_data.csv
+"""
+import argparse
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+import config
+from instrumentation import timed
+from player_form import PlayerForm, result_codes
+from raw_data_processing import PLAYER_COLUMNS, TEAM_SIZE, calculate_result_percentages
+
+
+INSERT_CHUNK_ROWS = 50_000 # matches per executemany batch, so a big import doesn't build every row tuple at once
+MATCH_COLUMNS = ['Match ID', 'Team 1 Goals', 'Team 2 Goals', 'Team 1 Result', 'Team 2 Result']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY,
+    team1_goals INTEGER NOT NULL,
+    team2_goals INTEGER NOT NULL,
+    team1_result REAL,
+    team2_result REAL
+);
+CREATE TABLE IF NOT EXISTS appearances (
+    match_id INTEGER NOT NULL REFERENCES matches (match_id),
+    player_id INTEGER NOT NULL,
+    team INTEGER NOT NULL, -- 1 or 2
+    slot INTEGER NOT NULL, -- the P1 to P8 column, so the csv is written back in the same order
+    goals_for INTEGER NOT NULL,
+    goals_against INTEGER NOT NULL,
+    result REAL -- 1.0 win, 0.5 draw, 0.0 loss
+);
+"""
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS appearances_player ON appearances (player_id, match_id, result, goals_for, goals_against)',
+    'CREATE INDEX IF NOT EXISTS appearances_match ON appearances (match_id)'
+]
+
+# the same totals as raw_data_processing.calculate_player_stats, players in order of first appearance
+PLAYER_STATS_SQL = """
+SELECT player_id,
+       COUNT(*) AS total_matches,
+       SUM(result = 1.0) AS total_wins,
+       SUM(result = 0.5) AS total_draws,
+       SUM(result IS NULL OR result NOT IN (1.0, 0.5)) AS total_losses,
+       SUM(goals_for) AS total_goals_for,
+       SUM(goals_against) AS total_goals_against
+FROM appearances {where}
+GROUP BY player_id
+ORDER BY MIN(rowid)
+"""
+
+
+def match_rows(match_data):
+    values = match_data[MATCH_COLUMNS].to_numpy(dtype=np.float64)
+    return [(int(match_id), int(team1_goals), int(team2_goals), team1_result, team2_result)
+            for match_id, team1_goals, team2_goals, team1_result, team2_result in values.tolist()]
+
+
+def appearance_rows(match_data):
+    """One row per player in match_data's 16 player columns, in match then column order (like build_appearances)."""
+    player_ids = match_data[PLAYER_COLUMNS].to_numpy(dtype=np.int64)
+    rows, columns = np.nonzero(player_ids != 0) # 0 pads teams with fewer than 8 players
+    teams = columns // TEAM_SIZE
+    goals = match_data[['Team 1 Goals', 'Team 2 Goals']].to_numpy(dtype=np.int64)
+    results = match_data[['Team 1 Result', 'Team 2 Result']].to_numpy(dtype=np.float64)
+
+    return list(zip(match_data['Match ID'].to_numpy(dtype=np.int64)[rows].tolist(), player_ids[rows, columns].tolist(),
+                    (teams + 1).tolist(), (columns % TEAM_SIZE + 1).tolist(), goals[rows, teams].tolist(),
+                    goals[rows, 1 - teams].tolist(), results[rows, teams].tolist()))
+
+
+class SqliteMatchStore:
+    """
+    The match store, also a derived artifact of raw_data_processing (rebuild, update, match_count, paths, load).
+    Connections are per thread (and per process, a WSGI worker doesn't reuse its parent's), in WAL mode so requests
+    keep reading the last committed matches while a recalculation writes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL') # enough in WAL mode: a crash can lose the last commit, never corrupt
+            connection.executescript(SCHEMA + ';'.join(INDEXES))
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    def paths(self):
+        return [self.db_path]
+
+    def load(self):
+        return self if os.path.exists(self.db_path) else None
+
+    def match_count(self):
+        """The last Match ID in the store, None before anything has been imported."""
+        if not os.path.exists(self.db_path):
+            return None
+        return self.connection().execute('SELECT MAX(match_id) FROM matches').fetchone()[0]
+
+    def insert(self, connection, match_data):
+        for start in range(0, len(match_data), INSERT_CHUNK_ROWS):
+            chunk = match_data.iloc[start:start + INSERT_CHUNK_ROWS]
+            connection.executemany('INSERT INTO matches VALUES (?, ?, ?, ?, ?)', match_rows(chunk))
+            connection.executemany('INSERT INTO appearances VALUES (?, ?, ?, ?, ?, ?, ?)', appearance_rows(chunk))
+
+    def checkpoint(self, connection):
+        # fold the WAL into the database file now, so its size and mtime (recorded in processing_state) don't change later
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    @timed('sqlite_store.rebuild')
+    def rebuild(self, match_data):
+        """Replace everything with match_data, in one transaction (readers see the old or the new matches)."""
+        self.import_chunks([match_data])
+
+    @timed('sqlite_store.update')
+    def update(self, new_match_data):
+        """Append matches whose Match IDs all come after the stored ones, in one transaction."""
+        connection = self.connection()
+        with connection:
+            self.insert(connection, new_match_data)
+        self.checkpoint(connection)
+
+    @timed('sqlite_store.import_chunks')
+    def import_chunks(self, match_data_chunks):
+        # indexes are dropped for the bulk insert and built once at the end, much faster than updating them per row
+        connection = self.connection()
+        with connection: # (execute, not executescript, which would commit part way)
+            connection.execute('BEGIN')
+            for statement in ['DROP INDEX appearances_player', 'DROP INDEX appearances_match', 'DELETE FROM appearances', 'DELETE FROM matches']:
+                connection.execute(statement)
+            for match_data in match_data_chunks:
+                self.insert(connection, match_data)
+            for statement in INDEXES:
+                connection.execute(statement)
+        self.checkpoint(connection)
+
+    def import_csv(self, match_data_path):
+        self.import_chunks(pd.read_csv(match_data_path, chunksize=INSERT_CHUNK_ROWS))
+
+    @timed('sqlite_store.export_csv')
+    def export_csv(self, match_data_path):
+        """Write the store back out in match_data.csv's schema (columns and order), a batch of matches at a time."""
+        connection = self.connection()
+        temp_path = f"{match_data_path}.tmp"
+        last_match_id, header = -1, True
+
+        while True:
+            matches = pd.read_sql_query('SELECT * FROM matches WHERE match_id > ? ORDER BY match_id LIMIT ?', connection,
+                                        params=(last_match_id, INSERT_CHUNK_ROWS))
+            if matches.empty and not header:
+                break
+
+            appearances = connection.execute('SELECT match_id, team, slot, player_id FROM appearances WHERE match_id BETWEEN ? AND ?',
+                                             (int(matches['match_id'].min()), int(matches['match_id'].max()))).fetchall() if len(matches) else []
+            appearances = np.array(appearances, dtype=np.int64).reshape(-1, 4)
+            player_ids = np.zeros((len(matches), 2 * TEAM_SIZE), dtype=np.int64)
+            player_ids[np.searchsorted(matches['match_id'].to_numpy(), appearances[:, 0]), (appearances[:, 1] - 1) * TEAM_SIZE + appearances[:, 2] - 1] = appearances[:, 3]
+
+            match_data = pd.DataFrame(player_ids, columns=PLAYER_COLUMNS)
+            match_data.insert(0, 'Match ID', matches['match_id'].to_numpy())
+            match_data[MATCH_COLUMNS[1:]] = matches[['team1_goals', 'team2_goals', 'team1_result', 'team2_result']].to_numpy()
+            match_data[['Team 1 Goals', 'Team 2 Goals']] = match_data[['Team 1 Goals', 'Team 2 Goals']].astype(np.int64)
+            match_data.to_csv(temp_path, mode='w' if header else 'a', header=header, index=False)
+
+            if matches.empty:
+                break
+            last_match_id, header = int(matches['match_id'].iloc[-1]), False
+
+        os.replace(temp_path, match_data_path)
+
+    @timed('sqlite_store.player_stats')
+    def player_stats(self, player_ids=None):
+        """
+        calculate_player_stats' table (totals and percentages, indexed by player id) as one GROUP BY. For a list of
+        player_ids only their index entries are read.
+        """
+        where, params = '', []
+        if player_ids is not None:
+            where, params = f"WHERE player_id IN ({', '.join('?' * len(player_ids))})", [int(player_id) for player_id in player_ids]
+
+        player_stats = pd.read_sql_query(PLAYER_STATS_SQL.format(where=where), self.connection(), params=params, index_col='player_id')
+        player_stats.index.name = None
+        return calculate_result_percentages(player_stats)
+
+    def player_matches(self, player_id, limit=None):
+        """A player's matches, most recent first: [{"match_id", "team", "goals_for", "goals_against", "result"}]."""
+        rows = self.connection().execute(
+            'SELECT match_id, team, goals_for, goals_against, result FROM appearances WHERE player_id = ? ORDER BY match_id DESC LIMIT ?',
+            (int(player_id), -1 if limit is None else int(limit))).fetchall()
+        return [dict(zip(['match_id', 'team', 'goals_for', 'goals_against', 'result'], row)) for row in rows]
+
+    @timed('sqlite_store.player_form')
+    def player_form(self):
+        """Every player's form history, as raw_data_processing builds it from the csv."""
+        rows = np.array(self.connection().execute('SELECT player_id, match_id, result FROM appearances ORDER BY rowid').fetchall(),
+                        dtype=np.float64).reshape(-1, 3)
+        return PlayerForm.from_records(rows[:, 0], rows[:, 1], result_codes(rows[:, 2]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('--csv', default=config.MATCH_DATA_PATH, help="match_data csv to import from or export to")
+    parser.add_argument('--db', default=config.MATCH_STORE_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        store = SqliteMatchStore(args.db)
+        store.import_csv(args.csv)
+        print(f"imported {args.csv} into {args.db} (last Match ID {store.match_count()})")
+    else:
+        SqliteMatchStore(args.db).export_csv(args.csv)
+        print(f"exported {args.db} to {args.csv}")
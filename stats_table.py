@@ -0,0 +1,77 @@
+"""
+Server side paging, sorting and filtering of the player stats table.
+
+A StatsTable is built once per published snapshot: the display rows plus, for every column, the row order sorted
+ascending and descending. A request then only filters (vectorized masks) and slices one of those orders, and just
+the rows on the requested page are sent to the browser.
+"""
+import numpy as np
+import pandas as pd
+
+
+STATS_TABLE_COLUMNS = ['player_name', 'total_matches', 'total_wins', 'total_draws', 'total_losses',
+                       'total_goals_for', 'total_goals_against', 'win_pct', 'draw_pct', 'loss_pct',
+                       'win_pct_ci_low', 'win_pct_ci_high', 'luck_z']
+MAX_PAGE_LENGTH = 500
+
+
+def column_filter_mask(values, search_text, filter_value):
+    """
+    Rows matching one column filter, the same rules as the filter boxes always had: '>n', '<n' and '=n' compare
+    numbers, anything else is a case-insensitive substring match.
+    """
+    operator, operand = filter_value[:1], filter_value[1:]
+    if operator in ('>', '<', '='):
+        try:
+            operand = float(operand)
+        except ValueError:
+            return np.zeros(len(search_text), dtype=bool)
+
+        numbers = pd.to_numeric(pd.Series(values), errors='coerce').fillna(0).to_numpy()
+        if operator == '>':
+            return numbers > operand
+        if operator == '<':
+            return numbers < operand
+        return numbers == operand
+
+    return search_text.str.contains(filter_value.lower(), regex=False).to_numpy()
+
+
+class StatsTable:
+    def __init__(self, player_stats_df):
+        table = player_stats_df.reindex(columns=STATS_TABLE_COLUMNS).reset_index(drop=True)
+        self.n_rows = len(table)
+
+        # names sort case-insensitively like DataTables does in the browser, players without a name go last
+        self.sort_orders = {
+            (column, ascending): table[column].sort_values(ascending=ascending, kind='stable', na_position='last',
+                                                           key=lambda values: values if pd.api.types.is_numeric_dtype(values) else values.str.lower()).index.to_numpy()
+            for column in STATS_TABLE_COLUMNS for ascending in (True, False)
+        }
+
+        table['player_name'] = table['player_name'].astype(object).where(table['player_name'].notna(), '')
+
+        self.columns = {column: table[column].to_numpy() for column in STATS_TABLE_COLUMNS}
+        self.search_text = {column: table[column].astype(str).str.lower() for column in STATS_TABLE_COLUMNS}
+        self.rows = table.astype(object).values.tolist() # python ints/floats/strs, ready for json
+
+    def query(self, start=0, length=10, order_column=0, ascending=True, search='', column_filters=None):
+        """
+        One page of rows. order_column is a position in STATS_TABLE_COLUMNS, search matches any column and
+        column_filters maps column positions to filter values (see column_filter_mask).
+        Returns (rows, records_total, records_filtered).
+        """
+        order = self.sort_orders[(STATS_TABLE_COLUMNS[order_column], ascending)]
+
+        mask = np.ones(self.n_rows, dtype=bool)
+        if search:
+            mask &= np.logical_or.reduce([text.str.contains(search.lower(), regex=False).to_numpy() for text in self.search_text.values()])
+        for column_position, filter_value in (column_filters or {}).items():
+            column = STATS_TABLE_COLUMNS[column_position]
+            mask &= column_filter_mask(self.columns[column], self.search_text[column], filter_value)
+
+        filtered_order = order[mask[order]]
+        length = min(length, MAX_PAGE_LENGTH) if length >= 0 else MAX_PAGE_LENGTH # DataTables sends -1 for "all"
+        page = filtered_order[start:start + length]
+
+        return [self.rows[position] for position in page.tolist()], self.n_rows, len(filtered_order)
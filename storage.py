@@ -0,0 +1,113 @@
+"""
+Storage backends for the calculated data layer (player stats table + player form history).
+
+    csv - player_stats.csv and player_form_dict.json, the original format (also used for exports)
+    npy - a directory of .npy arrays that are memory-mapped on load. The form history is stored as three flat
+          integer arrays (player_id, match_id, result code) grouped by player, rather than nested string keyed json.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import config
+from player_form import PlayerForm
+from instrumentation import timed
+
+
+def atomic_save_npy(file_path, array):
+    """Write to a temp file and swap it in, so a reader never maps a half written file."""
+    temp_path = f"{file_path}.tmp.npy"
+    np.save(temp_path, array)
+    os.replace(temp_path, file_path)
+
+
+class CsvJsonStorage:
+    name = 'csv'
+
+    def __init__(self, player_stats_path, player_form_dict_path):
+        self.player_stats_path = player_stats_path
+        self.player_form_dict_path = player_form_dict_path
+
+    def paths(self):
+        return [self.player_stats_path, self.player_form_dict_path]
+
+    def has_data(self):
+        return all(os.path.exists(path) and os.path.getsize(path) > 0 for path in self.paths())
+
+    @timed('storage.CsvJsonStorage.save')
+    def save(self, player_stats_df, player_form):
+        player_stats_df.to_csv(self.player_stats_path, index=False) # saves the df
+
+        with open(self.player_form_dict_path, 'w') as file: # saves player_form_dict (dumps() uses the C encoder, dump() does not)
+            file.write(json.dumps(player_form.to_dict()))
+
+    @timed('storage.CsvJsonStorage.load')
+    def load(self):
+        player_stats_df = pd.read_csv(self.player_stats_path)
+        with open(self.player_form_dict_path, 'r') as file:
+            player_form = PlayerForm.from_dict(json.load(file))
+
+        return player_stats_df, player_form
+
+
+class NpyStorage:
+    name = 'npy'
+    files = ['player_stats.npy', 'form_player_ids.npy', 'form_match_ids.npy', 'form_results.npy']
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def paths(self):
+        return [self.path(file_name) for file_name in self.files]
+
+    def has_data(self):
+        return all(os.path.exists(path) for path in self.paths())
+
+    @timed('storage.NpyStorage.save')
+    def save(self, player_stats_df, player_form):
+        os.makedirs(self.directory, exist_ok=True)
+
+        # the stats table goes in one structured array, text columns as fixed width unicode so it can still be mapped
+        columns = {}
+        for column in player_stats_df.columns:
+            if pd.api.types.is_numeric_dtype(player_stats_df[column]):
+                columns[column] = player_stats_df[column].to_numpy()
+            else:
+                columns[column] = player_stats_df[column].fillna('').astype(str).to_numpy(dtype=str)
+
+        player_stats = np.empty(len(player_stats_df), dtype=[(column, values.dtype) for column, values in columns.items()])
+        for column, values in columns.items():
+            player_stats[column] = values
+        atomic_save_npy(self.path('player_stats.npy'), player_stats)
+
+        for file_name, array in zip(self.files[1:], player_form.to_arrays()):
+            atomic_save_npy(self.path(file_name), array)
+
+    def load_form_arrays(self):
+        return tuple(np.load(self.path(file_name), mmap_mode='r') for file_name in self.files[1:])
+
+    @timed('storage.NpyStorage.load')
+    def load(self):
+        player_stats = np.load(self.path('player_stats.npy'), mmap_mode='r')
+        player_stats_df = pd.DataFrame({column: np.asarray(player_stats[column]) for column in player_stats.dtype.names})
+        for column in player_stats_df.columns:
+            if not pd.api.types.is_numeric_dtype(player_stats_df[column]):
+                player_stats_df[column] = player_stats_df[column].astype(str).replace('', np.nan) # same dtype and missing values as read_csv
+
+        return player_stats_df, PlayerForm.from_arrays(*self.load_form_arrays())
+
+
+def get_storage(backend=None, player_stats_path=config.PLAYER_STATS_PATH, player_form_dict_path=config.PLAYER_FORM_DICT_PATH, npy_dir=config.CALCULATED_NPY_DIR):
+    backend = backend or config.CALCULATED_STORAGE_BACKEND
+
+    if backend == 'csv':
+        return CsvJsonStorage(player_stats_path, player_form_dict_path)
+    if backend == 'npy':
+        return NpyStorage(npy_dir)
+
+    raise ValueError(f"Unknown calculated storage backend: {backend}")
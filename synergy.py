@@ -0,0 +1,169 @@
+"""
+Pairwise player synergy: games played together and their results, and the head to head record as opponents.
+
+Counts are kept in dense player x player arrays indexed by each player's position (new players are added after
+the existing ones), so any pair or block of pairs is a lookup. They are built from the team columns of match_data as matrix
+products of one-hot team membership, a chunk of matches at a time rather than a loop over matches, and new matches are
+simply added to the counts, so an upload never goes back over the history.
+"""
+import os
+
+import numpy as np
+
+from raw_data_processing import PLAYER_COLUMNS, TEAM_SIZE
+
+
+COUNT_FIELDS = ['together', 'together_wins', 'together_draws', 'against', 'against_wins']
+MATRIX_METRICS = ['together', 'together_win_pct', 'against', 'against_win_pct']
+# size of the dense float32 arrays built per chunk of matches: the team membership matrix (2 rows per match, a column per
+# player) and the 8 more of its size that the products are made from, so fewer matches per chunk the bigger the roster
+BUILD_CHUNK_BYTES = 256 * 1024 * 1024
+
+
+class SynergyMatrix:
+    def __init__(self, player_ids, counts, match_count=0):
+        self.player_ids = np.asarray(player_ids, dtype=np.int64) # in the order they were added
+        self.counts = counts # {field: n_players x n_players int array}, see COUNT_FIELDS. The diagonal is each player's own record
+        self.match_count = match_count
+        self.index = {player_id: position for position, player_id in enumerate(self.player_ids.tolist())}
+
+    @classmethod
+    def empty(cls):
+        return cls([], {field: np.zeros((0, 0), dtype=np.int32) for field in COUNT_FIELDS})
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def __contains__(self, player_id):
+        return int(player_id) in self.index
+
+    def positions(self, player_ids):
+        return np.array([self.index[int(player_id)] for player_id in player_ids], dtype=np.int64)
+
+    def add_matches(self, match_data):
+        """A new SynergyMatrix with the matches in match_data added to these counts."""
+        if match_data.empty:
+            return self
+
+        # players' positions: existing players keep theirs, new ones are added after them in id order
+        slot_player_ids = match_data[PLAYER_COLUMNS].to_numpy(dtype=np.int64)
+        played = slot_player_ids != 0 # 0 pads teams with fewer than 8 players
+        unique_player_ids = np.unique(slot_player_ids[played])
+        unique_positions = np.array([self.index.get(player_id, -1) for player_id in unique_player_ids.tolist()], dtype=np.int64)
+        new_players = np.flatnonzero(unique_positions < 0)
+        unique_positions[new_players] = len(self.player_ids) + np.arange(len(new_players))
+
+        slot_positions = np.full(slot_player_ids.shape, -1, dtype=np.int64)
+        slot_positions[played] = unique_positions[np.searchsorted(unique_player_ids, slot_player_ids[played])]
+
+        n_players = len(self.player_ids) + len(new_players)
+        counts = {}
+        for field, values in self.counts.items():
+            counts[field] = np.zeros((n_players, n_players), dtype=np.int32)
+            counts[field][:len(values), :len(values)] = values
+
+        team1_result = match_data['Team 1 Result'].to_numpy(dtype=np.float64)
+        won = np.c_[team1_result == 1.0, team1_result == 0.0] # per team
+        drew = np.c_[team1_result == 0.5, team1_result == 0.5]
+
+        # one-hot team membership per chunk of matches, then every count is one matrix product (like RatingModel's X'X).
+        # float32 is exact here, a chunk (at most a few million matches) can't add more than 2**24 to any count
+        chunk_size = max(BUILD_CHUNK_BYTES // (9 * 2 * 4 * n_players), 1)
+        for start in range(0, len(match_data), chunk_size):
+            chunk_positions = slot_positions[start:start + chunk_size]
+            n_rows = len(chunk_positions)
+
+            # team i of match m is row m + i * n_rows, opponents are the same rows in the other half
+            membership = np.zeros((2 * n_rows, n_players), dtype=np.float32)
+            rows, slots = np.nonzero(chunk_positions >= 0)
+            membership[rows + (slots >= TEAM_SIZE) * n_rows, chunk_positions[rows, slots]] = 1.0
+            opponents = np.r_[membership[n_rows:], membership[:n_rows]]
+            team_won = won[start:start + chunk_size].T.reshape(-1, 1)
+            team_drew = drew[start:start + chunk_size].T.reshape(-1, 1)
+
+            products = np.c_[membership, membership * team_won, membership * team_drew].T @ np.c_[membership, opponents]
+            (together, against), (together_wins, against_wins), (together_draws, _) = [np.hsplit(block, 2) for block in np.vsplit(products, 3)]
+            for field, block in [('together', together), ('together_wins', together_wins), ('together_draws', together_draws), ('against', against), ('against_wins', against_wins)]:
+                counts[field] += np.rint(block).astype(np.int32)
+
+        match_count = max(self.match_count, int(match_data['Match ID'].max()))
+        return SynergyMatrix(np.r_[self.player_ids, unique_player_ids[new_players]], counts, match_count)
+
+    def pair(self, player_id, other_player_id):
+        """Games together and their results, and player_id's head to head record against other_player_id."""
+        first, second = self.index[int(player_id)], self.index[int(other_player_id)]
+        together, together_wins, together_draws = (int(self.counts[field][first, second]) for field in ['together', 'together_wins', 'together_draws'])
+        against, wins, losses = int(self.counts['against'][first, second]), int(self.counts['against_wins'][first, second]), int(self.counts['against_wins'][second, first])
+
+        return {
+            "together": {"matches": together, "wins": together_wins, "draws": together_draws, "losses": together - together_wins - together_draws,
+                         "win_pct": round(together_wins * 100 / together, 1) if together else None},
+            "against": {"matches": against, "wins": wins, "draws": against - wins - losses, "losses": losses,
+                        "win_pct": round(wins * 100 / against, 1) if against else None}
+        }
+
+    def matrix(self, player_ids, metric):
+        """One of MATRIX_METRICS for every ordered pair of player_ids, as a nested list (None where there are no games)."""
+        positions = self.positions(player_ids)
+        block = np.ix_(positions, positions)
+
+        if metric in ('together', 'against'):
+            matrix = self.counts[metric][block].tolist()
+            for diagonal in range(len(matrix)):
+                matrix[diagonal][diagonal] = None # a player with themselves
+            return matrix
+
+        games = self.counts[metric.removesuffix('_win_pct')][block]
+        wins = self.counts[metric.removesuffix('_pct') + 's'][block]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            win_pct = np.round(np.where(games > 0, wins * 100 / games, np.nan), 1)
+        np.fill_diagonal(win_pct, np.nan)
+
+        return [[None if np.isnan(value) else value for value in row] for row in win_pct.tolist()]
+
+    def to_arrays(self):
+        return {"player_ids": self.player_ids, "match_count": np.array(self.match_count), **self.counts}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['player_ids'], {field: arrays[field] for field in COUNT_FIELDS}, int(arrays['match_count']))
+
+    def save(self, synergy_path):
+        temp_path = f"{synergy_path}.tmp.npz"
+        np.savez(temp_path, **self.to_arrays())
+        os.replace(temp_path, synergy_path)
+
+    @classmethod
+    def load(cls, synergy_path):
+        with np.load(synergy_path) as saved:
+            return cls.from_arrays(saved)
+
+
+class PlayerSynergy:
+    """SynergyMatrix as a derived artifact of raw_data_processing, saved next to player_stats.csv."""
+
+    def __init__(self, synergy_path):
+        self.synergy_path = synergy_path
+        self.matrix = None
+
+    def paths(self):
+        return [self.synergy_path]
+
+    def load(self):
+        if os.path.exists(self.synergy_path):
+            self.matrix = SynergyMatrix.load(self.synergy_path)
+        return self.matrix
+
+    def match_count(self):
+        matrix = self.matrix if self.matrix is not None else self.load()
+        return matrix.match_count if matrix is not None else None # an empty matrix has len 0, but isn't missing
+
+    def rebuild(self, match_data):
+        matrix = SynergyMatrix.empty().add_matches(match_data)
+        matrix.save(self.synergy_path)
+        self.matrix = matrix # swapped in whole, so readers see either the old or the new counts
+
+    def update(self, new_match_data):
+        matrix = (self.matrix if self.matrix is not None else self.load()).add_matches(new_match_data)
+        matrix.save(self.synergy_path)
+        self.matrix = matrix
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # the app's modules are at the repo root
+
+from benchmarks.synthetic import generate_match_data
+
+
+@pytest.fixture
+def match_history():
+    """(head, tail) of one match history, the tail bringing in players the head never had (an upload of new matches)."""
+    head = generate_match_data(400, n_players=30, seed=1, skill_spread=0.5)
+    tail = generate_match_data(300, n_players=40, seed=2, skill_spread=0.5)
+    tail['Match ID'] += len(head)
+    return head, tail
@@ -0,0 +1,88 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+import http_cache
+from http_cache import HttpCache
+
+
+@pytest.fixture
+def cached_app(tmp_path):
+    """A Flask app with one conditional JSON view, its data fingerprint and view calls kept in dataset."""
+    app = Flask(__name__, root_path=str(tmp_path))
+    cache = HttpCache(min_size=1024)
+    dataset = {"fingerprint": "first", "last_modified": 1_700_000_000.0, "views": 0}
+    cache.init_app(app, lambda: (dataset["fingerprint"], dataset["last_modified"]))
+
+    @app.route('/api/players')
+    @cache.conditional
+    def players():
+        dataset["views"] += 1
+        return jsonify([{"player_id": player_id, "player_name": f"Player {player_id}"} for player_id in range(100)])
+
+    return app.test_client(), dataset
+
+
+def test_matching_etag_gets_304_without_running_the_view(cached_app):
+    client, dataset = cached_app
+    response = client.get('/api/players')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and response.headers['Cache-Control'] == 'no-cache'
+
+    not_modified = client.get('/api/players', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304 and not_modified.headers['ETag'] == etag and not_modified.data == b''
+    assert dataset["views"] == 1
+
+    dataset["fingerprint"] = "recalculated"
+    changed = client.get('/api/players', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert dataset["views"] == 2
+
+
+def test_if_modified_since(cached_app):
+    client, dataset = cached_app
+    last_modified = client.get('/api/players').headers['Last-Modified']
+
+    assert client.get('/api/players', headers={'If-Modified-Since': last_modified}).status_code == 304
+    dataset["last_modified"] += 60
+    assert client.get('/api/players', headers={'If-Modified-Since': last_modified}).status_code == 200
+    assert dataset["views"] == 2
+
+
+def test_gzip_response_has_its_own_etag(cached_app):
+    client, dataset = cached_app
+    identity = client.get('/api/players')
+    compressed = client.get('/api/players', headers={'Accept-Encoding': 'gzip'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip' and 'Accept-Encoding' in compressed.headers['Vary']
+    assert json.loads(gzip.decompress(compressed.data)) == identity.get_json()
+    assert compressed.headers['ETag'] == identity.headers['ETag'][:-1] + '-gzip"'
+    not_modified = client.get('/api/players', headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert not_modified.status_code == 304 and not_modified.headers['ETag'] == compressed.headers['ETag']
+
+
+def test_brotli_preferred_when_installed(cached_app):
+    brotli = pytest.importorskip('brotli')
+    client, dataset = cached_app
+    identity = client.get('/api/players')
+    compressed = client.get('/api/players', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert compressed.headers['Content-Encoding'] == 'br' and compressed.headers['ETag'].endswith('-br"')
+    assert json.loads(brotli.decompress(compressed.data)) == identity.get_json()
+
+
+def test_gzip_when_brotli_is_not_installed(cached_app, monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    client, dataset = cached_app
+    assert client.get('/api/players', headers={'Accept-Encoding': 'gzip, br'}).headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_responses_are_not_compressed(tmp_path):
+    app = Flask(__name__, root_path=str(tmp_path))
+    HttpCache(min_size=1024).init_app(app, lambda: ("fingerprint", 0.0))
+    app.add_url_rule('/small', 'small', lambda: jsonify({"status": "ok"}))
+
+    response = app.test_client().get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers and response.get_json() == {"status": "ok"}
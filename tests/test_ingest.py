@@ -0,0 +1,81 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest
+from error_classes import UploadError
+
+
+def csv_upload(match_data):
+    return io.StringIO(match_data.to_csv(index=False))
+
+
+@pytest.fixture
+def existing_match_data(match_history, tmp_path):
+    """match_data.csv holding the head of the match history, as a previous upload left it."""
+    head, tail = match_history
+    match_data_path = tmp_path / 'match_data.csv'
+    head.to_csv(match_data_path, index=False)
+    return str(match_data_path), head, tail
+
+
+def test_clean_upload_replaces_match_data(existing_match_data):
+    match_data_path, head, tail = existing_match_data
+    assert ingest.ingest_csv(csv_upload(tail), 'match_data', match_data_path, chunk_rows=64) == len(tail)
+    with open(match_data_path) as match_data:
+        assert match_data.read() == tail.to_csv(index=False)
+
+
+def impossible_result(match_data):
+    match_data.loc[250, 'Team 1 Result'] = 2.0
+
+
+def result_against_the_score(match_data):
+    decided = match_data.index[match_data['Team 1 Result'] != 0.5][-1]
+    match_data.loc[decided, ['Team 1 Result', 'Team 2 Result']] = match_data.loc[decided, ['Team 2 Result', 'Team 1 Result']].to_numpy()
+
+
+def match_id_going_back(match_data):
+    match_data.loc[200, 'Match ID'] = 1
+
+
+def match_id_repeated_across_chunks(match_data):
+    match_data.loc[128, 'Match ID'] = match_data.loc[127, 'Match ID'] # the first row of the third 64 row chunk
+
+
+@pytest.mark.parametrize('corrupt, message', [
+    (impossible_result, "Line 252: results must be 1.0, 0.5 or 0.0 and add up to 1"),
+    (result_against_the_score, "results don't match the score"),
+    (match_id_going_back, "Line 202: Match IDs must be unique and increasing"),
+    (match_id_repeated_across_chunks, "Line 130: Match IDs must be unique and increasing"),
+])
+def test_bad_rows_leave_match_data_untouched(corrupt, message, existing_match_data):
+    match_data_path, head, tail = existing_match_data
+    with open(match_data_path) as match_data:
+        original = match_data.read()
+    corrupt(tail)
+
+    with pytest.raises(UploadError, match=message):
+        ingest.ingest_csv(csv_upload(tail), 'match_data', match_data_path, chunk_rows=64)
+
+    with open(match_data_path) as match_data:
+        assert match_data.read() == original
+    assert not os.path.exists(f"{match_data_path}.upload.tmp")
+
+
+def test_append_skips_matches_already_uploaded(existing_match_data):
+    match_data_path, head, tail = existing_match_data
+    match_id_index = ingest.MatchIdIndex(match_data_path)
+    overlapping = pd.concat([head.iloc[-100:], tail]) # a re-export of the league that still has the last 100 known matches
+
+    assert ingest.append_match_data(csv_upload(overlapping), match_data_path, match_id_index, chunk_rows=64) == (len(tail), 100)
+    pd.testing.assert_frame_equal(pd.read_csv(match_data_path), pd.concat([head, tail], ignore_index=True), check_dtype=False)
+    np.testing.assert_array_equal(match_id_index.match_ids, np.arange(1, len(head) + len(tail) + 1))
+    assert match_id_index.file_stamp == match_id_index.stamp() # the appended ids were added in place, the file needn't be re-read
+
+    # uploading the same file again adds nothing
+    assert ingest.append_match_data(csv_upload(overlapping), match_data_path, match_id_index) == (0, len(overlapping))
+    assert len(pd.read_csv(match_data_path)) == len(head) + len(tail)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import luck
+
+
+# Three players over 10 matches each, plus one who hasn't played. League win rate: (8 + 2 + 5) / 30 = 0.5, so a
+# player's wins ~ Binomial(10, 0.5), mean 5 and standard deviation sqrt(10 * 0.5 * 0.5) = sqrt(2.5).
+PLAYER_STATS = pd.DataFrame({"player_id": [1, 2, 3, 4], "total_matches": [10, 10, 10, 0], "total_wins": [8, 2, 5, 0]})
+
+
+def test_luck_z_scores_by_hand():
+    expected = [3 / np.sqrt(2.5), -3 / np.sqrt(2.5), 0.0, 0.0] # 1.897, -1.897, exactly average, no matches
+    np.testing.assert_allclose(luck.luck_z_scores(PLAYER_STATS['total_matches'], PLAYER_STATS['total_wins']), expected)
+
+
+def test_luck_z_scores_without_any_matches_are_zero():
+    np.testing.assert_array_equal(luck.luck_z_scores([0, 0], [0, 0]), [0.0, 0.0])
+
+
+def test_bootstrap_intervals():
+    # every resample of a player who always (or never) wins is the same, so the interval is a single point
+    low, high = luck.bootstrap_win_pct_intervals([12, 12, 0], [12, 0, 0], resamples=500)
+    np.testing.assert_array_equal(low, [100.0, 0.0, 0.0])
+    np.testing.assert_array_equal(high, [100.0, 0.0, 0.0])
+
+    # Binomial(20, 0.5): P(X <= 5) = 0.021 and P(X <= 6) = 0.058, P(X <= 13) = 0.942 and P(X <= 14) = 0.979, so
+    # the 2.5th and 97.5th percentiles of enough resamples are 6 and 14 wins, 30% and 70%
+    low, high = luck.bootstrap_win_pct_intervals([20], [10], resamples=50_000)
+    assert (low[0], high[0]) == (30.0, 70.0)
+
+
+def test_bootstrap_intervals_are_seeded():
+    total_matches, total_wins = [15, 40, 7], [6, 25, 3]
+    first, again = luck.bootstrap_win_pct_intervals(total_matches, total_wins), luck.bootstrap_win_pct_intervals(total_matches, total_wins)
+    np.testing.assert_array_equal(first, again)
+
+
+def test_luck_columns():
+    columns = luck.luck_columns(PLAYER_STATS)
+    assert columns["luck_z"].tolist() == [1.9, -1.9, 0.0, 0.0] # rounded to 2 places: 1.897... -> 1.9
+    assert columns["win_pct_ci_low"][3] == columns["win_pct_ci_high"][3] == 0.0
+    assert (columns["win_pct_ci_low"][:3] <= [80.0, 20.0, 50.0]).all() and (columns["win_pct_ci_high"][:3] >= [80.0, 20.0, 50.0]).all()
+
+
+def test_luck_columns_of_no_players():
+    assert all(len(values) == 0 for values in luck.luck_columns(pd.DataFrame()).values())
+
+
+def test_luck_cache_resamples_a_dataset_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(luck, 'luck_columns', lambda df: calls.append(len(df)) or {column: np.zeros(len(df)) for column in luck.LUCK_COLUMNS})
+    cache = luck.LuckCache(maxsize=1)
+
+    for fingerprint in ['first', 'first', 'second', 'first']:
+        with_luck = cache.with_luck_columns(PLAYER_STATS, fingerprint)
+    assert calls == [4, 4, 4] # 'first' was evicted by 'second'
+    assert list(with_luck.columns) == [*PLAYER_STATS.columns, *luck.LUCK_COLUMNS]
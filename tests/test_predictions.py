@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+import predictions
+from predictions import RatingModel
+
+
+def test_partial_fit_on_top_of_previous_fit_matches_full_fit(match_history):
+    head, tail = match_history
+    updated = RatingModel().partial_fit(head).partial_fit(tail)
+    rebuilt = RatingModel().partial_fit(pd.concat([head, tail], ignore_index=True))
+
+    np.testing.assert_array_equal(updated.player_ids, rebuilt.player_ids)
+    np.testing.assert_allclose(updated.gram, rebuilt.gram)
+    np.testing.assert_allclose(updated.target, rebuilt.target)
+    assert updated.totals == rebuilt.totals
+    np.testing.assert_allclose(list(updated.ratings.values()), list(rebuilt.ratings.values()))
+
+
+def test_partial_fit_chunks_give_the_same_fit(match_history, monkeypatch):
+    head, tail = match_history
+    match_data = pd.concat([head, tail], ignore_index=True)
+    one_chunk = RatingModel().partial_fit(match_data)
+    monkeypatch.setattr(predictions, 'FIT_CHUNK_BYTES', 8 * 41 * 64) # 64 matches per chunk at 40 players + the advantage
+    many_chunks = RatingModel().partial_fit(match_data)
+
+    np.testing.assert_allclose(many_chunks.gram, one_chunk.gram)
+    np.testing.assert_allclose(many_chunks.target, one_chunk.target)
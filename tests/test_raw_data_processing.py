@@ -0,0 +1,106 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import raw_data_processing
+import storage
+from benchmarks.synthetic import generate_player_keys
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline')
+
+
+@pytest.mark.parametrize('dataset', ['league', 'synthetic'])
+def test_full_calculation_matches_recorded_baseline(dataset, tmp_path):
+    # player_stats.csv and player_form_dict.json as the original iterrows implementation wrote them for these matches
+    for file_name in ['match_data.csv', 'player_keys.csv']:
+        shutil.copy(os.path.join(BASELINE_DIR, dataset, file_name), tmp_path / file_name)
+
+    raw_data_processing.cs_player_stats_player_form(str(tmp_path / 'match_data.csv'), str(tmp_path / 'match_count.txt'), str(tmp_path / 'player_keys.csv'),
+                                                    str(tmp_path / 'player_stats.csv'), str(tmp_path / 'player_form_dict.json'))
+
+    for file_name in ['player_stats.csv', 'player_form_dict.json']:
+        with open(tmp_path / file_name, 'rb') as calculated, open(os.path.join(BASELINE_DIR, dataset, file_name), 'rb') as baseline:
+            assert calculated.read() == baseline.read(), file_name
+
+
+def calculated_paths(directory, backend):
+    paths = {name: str(directory / file_name) for name, file_name in [
+        ('match_data', 'match_data.csv'), ('match_count', 'match_count.txt'), ('player_keys', 'player_keys.csv'), ('player_stats', 'player_stats.csv'),
+        ('player_form_dict', 'player_form_dict.json'), ('processing_state', 'processing_state.json')]}
+    paths['storage'] = storage.get_storage(backend, paths['player_stats'], paths['player_form_dict'], str(directory / 'npy'))
+    return paths
+
+
+def full_calculation(paths):
+    return raw_data_processing.cs_player_stats_player_form(paths['match_data'], paths['match_count'], paths['player_keys'], paths['player_stats'],
+                                                           paths['player_form_dict'], paths['processing_state'], paths['storage'])
+
+
+def incremental_calculation(paths):
+    return raw_data_processing.update_player_stats_player_form(paths['match_data'], paths['match_count'], paths['player_keys'], paths['player_stats'],
+                                                               paths['player_form_dict'], paths['processing_state'], calculated_storage=paths['storage'])
+
+
+def assert_same_calculation(calculated, expected):
+    pd.testing.assert_frame_equal(calculated[0], expected[0])
+    assert calculated[1].to_dict() == expected[1].to_dict()
+
+
+@pytest.fixture
+def two_datasets(match_history, tmp_path):
+    """Paths for the same match history calculated two ways, player_keys covering every player."""
+    head, tail = match_history
+    directories = []
+    for name in ['updated', 'rebuilt']:
+        directory = tmp_path / name
+        directory.mkdir()
+        generate_player_keys(40).to_csv(directory / 'player_keys.csv', index=False)
+        directories.append(directory)
+    return head, tail, directories
+
+
+@pytest.mark.parametrize('backend', ['csv', 'npy'])
+def test_incremental_update_matches_full_rebuild(backend, two_datasets, monkeypatch):
+    head, tail, (updated_directory, rebuilt_directory) = two_datasets
+    updated, rebuilt = calculated_paths(updated_directory, backend), calculated_paths(rebuilt_directory, backend)
+
+    head.to_csv(updated['match_data'], index=False)
+    full_calculation(updated)
+    tail.to_csv(updated['match_data'], mode='a', header=False, index=False) # an append upload
+
+    def no_full_rebuild(*args, **kwargs):
+        raise AssertionError("the appended matches should be merged in, not rebuilt")
+    with monkeypatch.context() as patch:
+        patch.setattr(raw_data_processing, 'cs_player_stats_player_form', no_full_rebuild)
+        incremental = incremental_calculation(updated)
+
+    pd.concat([head, tail]).to_csv(rebuilt['match_data'], index=False)
+    assert_same_calculation(incremental, full_calculation(rebuilt))
+    assert_same_calculation(updated['storage'].load(), rebuilt['storage'].load()) # and the same is saved
+
+
+@pytest.mark.parametrize('backend', ['csv', 'npy'])
+def test_edited_earlier_rows_fall_back_to_full_rebuild(backend, two_datasets, monkeypatch):
+    head, tail, (updated_directory, rebuilt_directory) = two_datasets
+    updated, rebuilt = calculated_paths(updated_directory, backend), calculated_paths(rebuilt_directory, backend)
+
+    head.to_csv(updated['match_data'], index=False)
+    full_calculation(updated)
+
+    # a corrected score in an already processed match, the same number of bytes, plus new matches after it
+    edited = pd.concat([head, tail], ignore_index=True)
+    edited.loc[0, ['Team 1 Goals', 'Team 2 Goals', 'Team 1 Result', 'Team 2 Result']] = [edited.loc[0, 'Team 2 Goals'], edited.loc[0, 'Team 1 Goals'],
+                                                                                          edited.loc[0, 'Team 2 Result'], edited.loc[0, 'Team 1 Result']]
+    edited.to_csv(updated['match_data'], index=False)
+    edited.to_csv(rebuilt['match_data'], index=False)
+
+    full_rebuilds = []
+    full_rebuild = raw_data_processing.cs_player_stats_player_form
+    monkeypatch.setattr(raw_data_processing, 'cs_player_stats_player_form', lambda *args, **kwargs: full_rebuilds.append(args) or full_rebuild(*args, **kwargs))
+    incremental = incremental_calculation(updated)
+
+    assert len(full_rebuilds) == 1
+    monkeypatch.undo()
+    assert_same_calculation(incremental, full_calculation(rebuilt))
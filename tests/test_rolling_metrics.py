@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from rolling_metrics import PlayerRollingMetrics, RollingMetrics
+
+
+def test_incremental_update_matches_full_rebuild(match_history):
+    head, tail = match_history
+    updated = RollingMetrics.from_match_data(tail, previous=RollingMetrics.from_match_data(head))
+    rebuilt = RollingMetrics.from_match_data(pd.concat([head, tail], ignore_index=True))
+
+    updated_arrays, rebuilt_arrays = updated.to_arrays(), rebuilt.to_arrays()
+    assert updated_arrays.keys() == rebuilt_arrays.keys()
+    for name in rebuilt_arrays:
+        np.testing.assert_array_equal(updated_arrays[name], rebuilt_arrays[name], err_msg=name)
+
+
+def test_empty_update_keeps_previous(match_history):
+    head, _ = match_history
+    previous = RollingMetrics.from_match_data(head)
+    assert RollingMetrics.from_match_data(head.iloc[:0], previous=previous) is previous
+
+
+def test_empty_metrics_are_not_missing(match_history, tmp_path):
+    head, _ = match_history
+    player_rolling_metrics = PlayerRollingMetrics(str(tmp_path / 'rolling_metrics.npz'))
+    assert player_rolling_metrics.match_count() is None
+
+    player_rolling_metrics.rebuild(head.iloc[:0])
+    assert player_rolling_metrics.match_count() == 0
+    player_rolling_metrics.update(head)
+    assert player_rolling_metrics.match_count() == head['Match ID'].max()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+import synergy
+from raw_data_processing import PLAYER_COLUMNS
+from synergy import COUNT_FIELDS, PlayerSynergy, SynergyMatrix
+
+
+def test_add_matches_to_previous_counts_matches_full_build(match_history):
+    head, tail = match_history
+    updated = SynergyMatrix.empty().add_matches(head).add_matches(tail)
+    rebuilt = SynergyMatrix.empty().add_matches(pd.concat([head, tail], ignore_index=True))
+
+    # the tail's new players have higher ids than the head's, so both put every player in the same position
+    np.testing.assert_array_equal(updated.player_ids, rebuilt.player_ids)
+    assert updated.match_count == rebuilt.match_count
+    for field in COUNT_FIELDS:
+        np.testing.assert_array_equal(updated.counts[field], rebuilt.counts[field], err_msg=field)
+
+
+def test_add_matches_counts_are_the_same_in_any_player_order(match_history):
+    head, tail = match_history
+    # the head's players become 11 to 40, so the tail's players 1 to 10 are new with lower ids: they are added after
+    # the existing players, and the positions differ from a full build but the counts don't
+    head = head.copy()
+    head[PLAYER_COLUMNS] = head[PLAYER_COLUMNS].where(head[PLAYER_COLUMNS] == 0, head[PLAYER_COLUMNS] + 10)
+    updated = SynergyMatrix.empty().add_matches(head).add_matches(tail)
+    rebuilt = SynergyMatrix.empty().add_matches(pd.concat([head, tail], ignore_index=True))
+    assert not np.array_equal(updated.player_ids, rebuilt.player_ids)
+
+    player_ids = np.sort(rebuilt.player_ids)
+    updated_positions, rebuilt_positions = updated.positions(player_ids), rebuilt.positions(player_ids)
+    for field in COUNT_FIELDS:
+        np.testing.assert_array_equal(updated.counts[field][np.ix_(updated_positions, updated_positions)],
+                                      rebuilt.counts[field][np.ix_(rebuilt_positions, rebuilt_positions)], err_msg=field)
+
+
+def test_empty_matrix_is_not_missing(match_history, tmp_path):
+    head, _ = match_history
+    player_synergy = PlayerSynergy(str(tmp_path / 'synergy.npz'))
+    assert player_synergy.match_count() is None
+
+    player_synergy.rebuild(head.iloc[:0])
+    assert player_synergy.match_count() == 0
+    assert PlayerSynergy(player_synergy.synergy_path).match_count() == 0 # loaded from the file too
+
+
+def test_chunks_give_the_same_counts(match_history, monkeypatch):
+    head, tail = match_history
+    match_data = pd.concat([head, tail], ignore_index=True)
+    one_chunk = SynergyMatrix.empty().add_matches(match_data)
+    monkeypatch.setattr(synergy, 'BUILD_CHUNK_BYTES', 9 * 2 * 4 * 40 * 64) # 64 matches per chunk at 40 players
+    many_chunks = SynergyMatrix.empty().add_matches(match_data)
+
+    for field in COUNT_FIELDS:
+        np.testing.assert_array_equal(many_chunks.counts[field], one_chunk.counts[field], err_msg=field)
@@ -0,0 +1,16 @@
+"""
+Production entry point, for a WSGI server with several worker processes:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The data is calculated (or found up to date) once, here in the server's master process with gunicorn's preload_app,
+and published as a shared snapshot that every worker memory-maps (see shared_snapshot.py). After an upload or
+recalculation in any worker the others swap to the new snapshot on their next request.
+"""
+import os
+
+os.environ.setdefault('SHARED_SNAPSHOT_ENABLED', '1') # before config is imported
+
+from app import app, warm_up
+
+warm_up()